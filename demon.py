@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""Unified acquisition daemon for the Pi sensors.
+
+Replaces running swiatlo/swiatlo.py, temp_wilgotnosc_cisnienie/multi.py and
+jakosc_powietrza/gazy.py side by side: one process owns I2C bus 1, polls
+every sensor at its own rate from a single timer wheel and writes into the
+same files the loggers used, so the dashboards keep working.
+"""
+import os
+import signal
+
+from wspolne import czujniki, harmonogram, magazyn, magistrala, profilowanie, zapis
+
+# Repository root, data files are relative to it
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Storage format and write path options (None turns a stage off), see
+# open_sink() in wspolne/magazyn.py
+STORAGE_FORMAT = 'csv'
+BUFFERING = None
+# BUFFERING = {'max_age': 60}
+BACKGROUND = {'capacity': 1024}
+# Rotated files: serie, the dashboards and serwer.py /stats only read the
+# current segment, older rows need wspolne.segmenty.load_range()
+ROTATION = None
+# Simulated sensors and clock instead of bus 1, rows go to sim_<file>;
+# see wspolne/symulacja.py
+SIMULATION = None
+# SIMULATION = {'signal': 'replay', 'speed': 1000}
+# I2C profiling per device, see profile() in wspolne/profilowanie.py; only
+# the bus time is measured, the lock wait between sensors is not
+PROFILE_BUS = None
+# PROFILE_BUS = {'interval': 300, 'retries': 0}
+
+# Wide records (TickRecords in wspolne/magistrala.py): every tick with a
+# reading also becomes one row of 'filename' holding all sensors' columns
+# on the shared grid timestamp. Sensors not read on the tick get empty
+# cells ('fill': 'null') or their last reading until they are due again
+# ('carry'). Per-sensor files are still written; None disables it
+COMBINED = None
+# COMBINED = {'filename': 'combined_readings.csv', 'fill': 'carry'}
+
+# Sensors to poll: driver name, sampling period in seconds and optional
+# driver keyword arguments, e.g. 'options': {'auto_range': True} for the BH1750,
+# and a 'filtering' stage for its values (see wspolne/filtry.py), e.g.
+# 'filtering': {'filters': [{'method': 'hampel', 'window': 7, 'floor': 0.005}]}
+SENSORS = [
+    {'driver': 'bh1750', 'period': 10},
+    {'driver': 'bme280', 'period': 10},
+    {'driver': 'ads1115', 'period': 10},
+]
+
+def main():
+    clock = harmonogram.CLOCK
+    drivers = czujniki.DRIVERS
+    options = {}
+    background = BACKGROUND
+    if SIMULATION:
+        from wspolne import symulacja
+
+        clock = symulacja.SimClock(SIMULATION.get('speed'), SIMULATION.get('start'))
+        bus = symulacja.SimBus()
+        drivers = symulacja.DRIVERS
+        options = {'clock': clock, 'signal': SIMULATION.get('signal', 'synthetic'),
+                   'noise': SIMULATION.get('noise', 1.0), 'seed': SIMULATION.get('seed', 0)}
+        background = symulacja.background_options(BACKGROUND)
+    else:
+        bus = magistrala.SharedBus(1)
+        if PROFILE_BUS is not None:
+            # Inside the shared bus lock
+            bus.device = profilowanie.profile(bus.device, **PROFILE_BUS)
+    router = magazyn.SinkRouter(STORAGE_FORMAT, ROOT, buffering=BUFFERING,
+                                background=background, rotation=ROTATION)
+    daemon = magistrala.Daemon(bus, router, clock=clock)
+
+    for config in SENSORS:
+        try:
+            sensor = drivers[config['driver']](bus, **config.get('options', {}), **options)
+        except Exception as e:
+            print(f"Skipping {config['driver']}: {e}")
+            continue
+        # First read on the wall-clock grid of the period, sensors due on the
+        # same tick overlap their conversions and share the grid timestamp
+        daemon.add(sensor, config['period'], filtering=config.get('filtering'))
+        print(f"Logging {sensor.name} every {config['period']} s to {sensor.filename}")
+    if COMBINED:
+        filename = COMBINED['filename']
+        if SIMULATION:
+            filename = symulacja.output_path(filename)
+        daemon.combine(filename, COMBINED.get('fill', magistrala.NULL))
+        print(f"Logging one row per tick to {filename}")
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: daemon.stop())
+    # SIGUSR1 writes out buffered rows without stopping
+    zapis.install_signal_handlers(terminate=False)
+    print("Press CTRL+C to stop")
+    try:
+        daemon.run()
+    except KeyboardInterrupt:
+        print("\nLogging stopped by user")
+    finally:
+        router.close()
+        bus.close()
+        if BACKGROUND is not None:
+            print(f"Persistence: {router.report()}")
+        if BUFFERING:
+            print(f"Writes: {zapis.report()}")
+        if PROFILE_BUS is not None and not SIMULATION:
+            print(f"Bus: {profilowanie.report()}")
+        print("Data has been saved")
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,8 @@ import plotly.graph_objects as go
 import os
 from datetime import datetime
 
+from wspolne import kolumny, rekordy, serie
+
 # Set page configuration
 st.set_page_config(
     page_title="Dane Środowiskowe",
@@ -49,18 +51,16 @@ TRANSLATIONS = {
 def load_and_prepare_csv(file_path):
     """Load CSV file and prepare data for visualization"""
     try:
-        if os.path.exists(file_path):
+        if (os.path.exists(file_path) or os.path.isdir(kolumny.store_path(file_path))
+                or os.path.exists(rekordy.record_path(file_path))):
+            # Mapped columnar store or shared CSV cache, timestamps are already datetime64
             # For voltage_readings_server.csv, only load 'Timestamp' and 'voltage' columns
             if 'voltage_readings_server.csv' in file_path:
-                df = pd.read_csv(file_path, usecols=['Timestamp', 'voltage'])
+                df = serie.load_frame(file_path, columns=['Timestamp', 'voltage'])
                 # Ensure columns are lowercase for consistency in server data
                 df.columns = df.columns.str.lower()
             else:
-                df = pd.read_csv(file_path)
-
-            # Check for timestamp column (both lowercase and uppercase)
-            timestamp_col = 'timestamp' if 'timestamp' in df.columns else 'Timestamp'
-            df[timestamp_col] = pd.to_datetime(df[timestamp_col])
+                df = serie.load_frame(file_path)
 
             return df
         else:
@@ -1,48 +1,172 @@
-import time
-import board
-import busio
-import adafruit_ads1x15.ads1115 as ADS
-from adafruit_ads1x15.analog_in import AnalogIn
-import csv
-from datetime import datetime
+import sys
 import os
 
-# Initialize I2C and ADS1115
-i2c = busio.I2C(board.SCL, board.SDA)
-ads = ADS.ADS1115(i2c)
-ads.gain = 1
-chan = AnalogIn(ads, ADS.P0)
+# Shared helpers live in ../wspolne
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from wspolne import adaptacja, filtry, harmonogram, magazyn, profilowanie, przesyl, zapis
+
+# Acquisition mode: 'single' reads one conversion per interval, 'continuous'
+# reads every conversion at DATA_RATE and logs their mean/min/max/std
+ACQUISITION_MODE = 'single'
+# ADS1115 data rate in samples per second (8 .. 860)
+DATA_RATE = 860
+# Seconds between logged rows, on the wall-clock grid shared with the
+# other loggers; missed rows are skipped ('skip') or made up ('catch_up')
+INTERVAL = 10
+SCHEDULE_POLICY = harmonogram.SKIP
+# Adaptive sampling period instead of the fixed INTERVAL, see AdaptiveRate
+# in wspolne/adaptacja.py
+ADAPTIVE = None
+# ADAPTIVE = {'periods': [1, 2, 5, 10, 30, 60], 'rate': [0.01], 'std': [0.02], 'patience': 3}
+# ADS1115 driver: 'blinka' (Adafruit CircuitPython stack) or 'smbus2'
+# (register-level driver in wspolne/ads1115.py, faster start, less memory)
+DRIVER = 'blinka'
+# Simulated sensor and clock instead of the I2C hardware, rows go to
+# sim_<file>; see wspolne/symulacja.py (continuous mode still samples in
+# real time)
+SIMULATION = None
+# SIMULATION = {'signal': 'replay', 'speed': 1000}
+# I2C profiling per device, see profile() in wspolne/profilowanie.py
+PROFILE_BUS = None
+# PROFILE_BUS = {'interval': 300, 'retries': 0}
+
+# Initialize I2C and ADS1115 (or the simulation), read_voltage() returns
+# channel P0 in volts
+clock = harmonogram.CLOCK
+if SIMULATION:
+    from wspolne import symulacja
+
+    clock, ads = symulacja.simulate('ads1115', **SIMULATION)
+    read_voltage = lambda: ads.read()[0]
+elif DRIVER == 'smbus2':
+    import smbus2
+    from wspolne.ads1115 import ADS1115
+
+    bus = smbus2.SMBus(1)
+    if PROFILE_BUS is not None:
+        bus = profilowanie.profile(bus, **PROFILE_BUS)
+    ads = ADS1115(bus, gain=1)
+    read_voltage = lambda: ads.voltage(0)
+else:
+    import board
+    import busio
+    import adafruit_ads1x15.ads1115 as ADS
+    from adafruit_ads1x15.analog_in import AnalogIn
+
+    i2c = busio.I2C(board.SCL, board.SDA)
+    if PROFILE_BUS is not None:
+        # Blinka's writeto/readfrom_into calls are timed the same way
+        i2c = profilowanie.profile(i2c, **PROFILE_BUS)
+    ads = ADS.ADS1115(i2c)
+    ads.gain = 1
+    chan = AnalogIn(ads, ADS.P0)
+    read_voltage = lambda: chan.voltage
 
 # CSV file setup
 CSV_FILENAME = 'mq135_readings.csv'
 CSV_HEADERS = ['Timestamp', 'Voltage']
+# Storage format and write path options (None turns a stage off), see
+# open_sink() in wspolne/magazyn.py
+STORAGE_FORMAT = 'csv'
+BUFFERING = None
+# BUFFERING = {'max_age': 60}
+# Rotated files: serie, the dashboards and serwer.py /stats only read the
+# current segment, older rows need wspolne.segmenty.load_range()
+ROTATION = None
+# ROTATION = {'period': 'day', 'max_bytes': 16 * 1024 * 1024}
+BACKGROUND = {'capacity': 1024}
+UPLINK = None
+# UPLINK = {'url': 'http://192.168.1.10:5000', 'series': 'air_quality'}
+FILTERING = None
+# FILTERING = {'filters': [[{'method': 'hampel', 'window': 7, 'floor': 0.005},
+#                           {'method': 'ewma', 'alpha': 0.3}]], 'keep_raw': True}
+
+# Continuous mode keeps the mean in CSV_FILENAME and the full statistics here
+STATS_FILENAME = 'mq135_readings_stats.csv'
+if SIMULATION:
+    # Simulated rows never end up in the recorded files
+    CSV_FILENAME = symulacja.output_path(CSV_FILENAME)
+    STATS_FILENAME = symulacja.output_path(STATS_FILENAME)
+    BACKGROUND = symulacja.background_options(BACKGROUND)
+STATS_HEADERS = ['Timestamp', 'Voltage_mean', 'Voltage_min', 'Voltage_max', 'Voltage_std', 'Samples']
 
-# Check if file exists and create with headers if it doesn't
-if not os.path.exists(CSV_FILENAME):
-    with open(CSV_FILENAME, 'w', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow(CSV_HEADERS)
+# Open the storage sink, CSV files get their headers if they don't exist
+sink = magazyn.open_sink(STORAGE_FORMAT, CSV_FILENAME, CSV_HEADERS, buffering=BUFFERING,
+                         background=BACKGROUND, uplink=UPLINK, rotation=ROTATION,
+                         filtering=FILTERING)
+# SIGTERM/SIGUSR1 flush buffered rows
+zapis.install_signal_handlers()
+stats_sink = None
+sampler = None
+
+if ACQUISITION_MODE == 'continuous':
+    from wspolne.nadprobkowanie import ContinuousSampler
+
+    # In continuous mode the ADS1115 converts back to back and a read
+    # just fetches the latest conversion register
+    if not SIMULATION:
+        ads.data_rate = DATA_RATE
+    if DRIVER == 'smbus2' and not SIMULATION:
+        ads.start_continuous(0)
+    elif not SIMULATION:
+        from adafruit_ads1x15.ads1x15 import Mode
+        ads.mode = Mode.CONTINUOUS
+    stats_sink = magazyn.open_sink(STORAGE_FORMAT, STATS_FILENAME, STATS_HEADERS,
+                                   decimals=[None, None, None, None, 0], buffering=BUFFERING,
+                                   background=BACKGROUND, rotation=ROTATION)
+    # Buffers sized for the longest interval the adaptive mode can pick
+    longest = max(ADAPTIVE['periods']) if ADAPTIVE else INTERVAL
+    sampler = ContinuousSampler(read_voltage, DATA_RATE, longest).start()
+
+scheduler = harmonogram.Scheduler(INTERVAL, SCHEDULE_POLICY, clock=clock)
+adaptive = adaptacja.AdaptiveRate(start=INTERVAL, **ADAPTIVE) if ADAPTIVE else None
 
 try:
-    while True:
-        # Get current timestamp and voltage reading
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        voltage = chan.voltage
+    for now in scheduler:
+        timestamp = now.strftime('%Y-%m-%d %H:%M:%S')
+        if sampler is not None:
+            # The interval up to this grid point is reduced to one row
+            stats = sampler.reduce()
+            voltage = stats['mean']
+            sink.write(now, [voltage])
+            stats_sink.write(now, [stats['mean'], stats['min'], stats['max'], stats['std'], stats['count']])
+            print(f"MQ-135 Voltage: {voltage:.3f}V (min {stats['min']:.3f}, max {stats['max']:.3f}, "
+                  f"std {stats['std']:.4f}, {stats['count']} samples) - Data logged at {timestamp}")
+            if adaptive is not None:
+                scheduler.set_period(adaptive.update(now, [voltage]))
+            continue
+
+        # Get the voltage reading for this grid timestamp
+        voltage = read_voltage()
         
-        # Append data to CSV file
-        with open(CSV_FILENAME, 'a', newline='') as file:
-            writer = csv.writer(file)
-            writer.writerow([timestamp, voltage])
+        # Append data to the storage sink
+        sink.write(now, [voltage])
         
         # Print to console for monitoring
         print(f"MQ-135 Voltage: {voltage:.3f}V - Data logged at {timestamp}")
-        
-        # Wait for 1 second before next reading
-        time.sleep(10)
+        if adaptive is not None:
+            scheduler.set_period(adaptive.update(now, [voltage]))
 
 except KeyboardInterrupt:
     print("\nLogging stopped by user")
 except Exception as e:
     print(f"\nAn error occurred: {str(e)}")
 finally:
+    if sampler is not None:
+        sampler.stop()
+        stats_sink.close()
+    sink.close()
+    if BACKGROUND is not None:
+        print(f"\nPersistence: {sink.report()}")
+    if BUFFERING:
+        print(f"\nWrites: {zapis.report()}")
+    if UPLINK is not None:
+        print(f"\nUplink: {przesyl.report()}")
+    if FILTERING:
+        print(f"\nFiltering: {filtry.report()}")
+    print(f"\nSchedule: {scheduler.report()}")
+    if PROFILE_BUS is not None:
+        print(f"\nBus: {profilowanie.report()}")
+    if adaptive is not None:
+        print(f"Adaptive: {adaptive.events} events, last period {adaptive.period} s")
     print(f"\nData has been saved to {CSV_FILENAME}")
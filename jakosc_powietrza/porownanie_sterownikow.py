@@ -0,0 +1,85 @@
+"""Compare startup time and memory of the Blinka and smbus2 ADS1115 paths.
+
+Each driver is loaded in a fresh interpreter so imports are measured cold:
+
+    python porownanie_sterownikow.py            # imports only
+    python porownanie_sterownikow.py --read     # also open the bus and read P0
+"""
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+RUNS = 5
+
+# Code run in the child, {setup} is the driver specific part
+CHILD = '''
+import json, resource, sys, time
+start = time.perf_counter()
+{imports}
+imported = time.perf_counter()
+voltage = None
+if {read}:
+{setup}
+read = time.perf_counter()
+print(json.dumps({{
+    'import_s': imported - start,
+    'read_s': read - imported,
+    'maxrss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    'voltage': voltage,
+}}))
+'''
+
+DRIVERS = {
+    'blinka': {
+        'imports': ('import board\n'
+                    'import busio\n'
+                    'import adafruit_ads1x15.ads1115 as ADS\n'
+                    'from adafruit_ads1x15.analog_in import AnalogIn'),
+        'setup': ('    ads = ADS.ADS1115(busio.I2C(board.SCL, board.SDA))\n'
+                  '    voltage = AnalogIn(ads, ADS.P0).voltage'),
+    },
+    'smbus2': {
+        'imports': ('sys.path.insert(0, {root!r})\n'
+                    'import smbus2\n'
+                    'from wspolne.ads1115 import ADS1115'),
+        'setup': ('    voltage = ADS1115(smbus2.SMBus(1)).voltage(0)'),
+    },
+}
+
+def measure(driver, read):
+    code = CHILD.format(imports=DRIVERS[driver]['imports'].format(root=ROOT),
+                        setup=DRIVERS[driver]['setup'], read=read)
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True)
+    if result.returncode != 0:
+        error = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'failed'
+        raise RuntimeError(error)
+    return json.loads(result.stdout)
+
+def main():
+    read = '--read' in sys.argv[1:]
+    # Baseline: an interpreter that imports nothing
+    baseline = measure_baseline()
+    print(f"Empty interpreter: {baseline} kB max RSS")
+    for driver in DRIVERS:
+        try:
+            runs = [measure(driver, read) for _ in range(RUNS)]
+        except RuntimeError as e:
+            print(f"{driver:7s} unavailable: {e}")
+            continue
+        import_ms = min(r['import_s'] for r in runs) * 1000
+        read_ms = min(r['read_s'] for r in runs) * 1000
+        rss = max(r['maxrss_kb'] for r in runs)
+        line = f"{driver:7s} import {import_ms:7.1f} ms  max RSS {rss} kB (+{rss - baseline} kB)"
+        if read:
+            line += f"  open+read {read_ms:6.1f} ms  P0 {runs[-1]['voltage']:.3f} V"
+        print(line)
+
+def measure_baseline():
+    code = 'import resource; print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)'
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    return int(result.stdout)
+
+if __name__ == "__main__":
+    main()
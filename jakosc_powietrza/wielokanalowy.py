@@ -0,0 +1,68 @@
+import threading
+import sys
+from datetime import datetime
+import os
+
+# Shared helpers live in ../wspolne
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from wspolne import magazyn, skaner
+
+# Analog channels to scan: series name, ADS1115 address, input P0..P3,
+# gain, data rate (SPS) and sampling interval in seconds
+CHANNELS = [
+    {'series': 'MQ-135', 'address': 0x48, 'channel': 0, 'gain': 1, 'data_rate': 128, 'interval': 10},
+    {'series': 'MQ-2', 'address': 0x48, 'channel': 1, 'gain': 1, 'data_rate': 128, 'interval': 10},
+    {'series': 'MQ-7', 'address': 0x48, 'channel': 2, 'gain': 1, 'data_rate': 128, 'interval': 10},
+    {'series': 'MQ-4', 'address': 0x48, 'channel': 3, 'gain': 1, 'data_rate': 128, 'interval': 10},
+    # Second ADS1115 with ADDR tied to VDD
+    {'series': 'MQ-9', 'address': 0x49, 'channel': 0, 'gain': 1, 'data_rate': 128, 'interval': 30},
+]
+
+# ADS1115 driver: 'smbus2' (register-level driver in wspolne/ads1115.py,
+# faster start, less memory, conversions on both devices overlap) or
+# 'blinka' (Adafruit CircuitPython stack, blocking reads one after another)
+DRIVER = 'smbus2'
+
+# All channels share one long-format stream, one row per reading
+CSV_FILENAME = 'gas_readings.csv'
+CSV_HEADERS = ['Timestamp', 'Series', 'Voltage']
+
+def main():
+    if DRIVER == 'smbus2':
+        import smbus2
+        bus = smbus2.SMBus(1)
+        adc_class = skaner.SmbusADC
+    else:
+        import board
+        import busio
+        bus = busio.I2C(board.SCL, board.SDA)
+        adc_class = skaner.BlinkaADC
+    devices = {}
+    for address in sorted({c['address'] for c in CHANNELS}):
+        devices[address] = adc_class(bus, address)
+    scanner = skaner.ChannelScanner(devices, CHANNELS)
+
+    sink = magazyn.open_sink('csv', CSV_FILENAME, CSV_HEADERS)
+
+    def log_batch(results):
+        now = datetime.now()
+        for series, voltage in results:
+            sink.write(now, [series, voltage])
+            print(f"{series} Voltage: {voltage:.3f}V")
+        if scanner.failed:
+            # One line per pass, not one per failed read
+            print("Read errors: " + ', '.join(f"{series} ({e})" for series, e in scanner.failed.items()))
+
+    print(f"Scanning {len(CHANNELS)} channels on {len(devices)} ADS1115, logging to {CSV_FILENAME}")
+    print("Press CTRL+C to stop")
+    stop_event = threading.Event()
+    try:
+        scanner.run(log_batch, stop_event)
+    except KeyboardInterrupt:
+        print("\nLogging stopped by user")
+    finally:
+        sink.close()
+        print(f"\n{scanner.report()}, data has been saved to {CSV_FILENAME}")
+
+if __name__ == "__main__":
+    main()
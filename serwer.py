@@ -1,14 +1,46 @@
 from flask import Flask, request, jsonify
 from datetime import datetime
+import atexit
 import csv
+import glob
+import gzip
+import json
 import os
+import threading
 from pathlib import Path
 
+import numpy as np
+
+from wspolne import indeks, magazyn, serie, zapis
+
 app = Flask(__name__)
 
 # CSV file configuration
 CSV_FILE = 'voltage_readings_server.csv'
 CSV_HEADERS = ['timestamp', 'device_id', 'raw_value', 'voltage']
+# Storage format: 'csv', 'gorilla', 'kolumny' or 'rekordy' (one file/store per device)
+STORAGE_FORMAT = 'csv'
+
+# Series exposed through /stats, name -> data file (CSV or columnar store)
+STATS_SERIES = {
+    'voltage': CSV_FILE,
+    'environment': 'temp_wilgotnosc_cisnienie/environmental_data.csv',
+    'light': 'swiatlo/light_readings.csv',
+    'air_quality': 'jakosc_powietrza/mq135_readings.csv',
+    # Wide rows of demon.py (COMBINED), all sensors' columns in one file
+    'combined': 'combined_readings.csv',
+}
+
+# Open per-device sinks of the non-CSV formats
+device_sinks = {}
+sinks_lock = threading.Lock()
+
+# Rows forwarded by the Pi loggers (wspolne/przesyl.py), one CSV per
+# source and series with the sequence number as the last column
+INGEST_DIR = 'ingest'
+# (source, series) -> last stored sequence number
+ingest_cursors = {}
+ingest_lock = threading.Lock()
 
 def init_csv():
     """Initialize the CSV file if it doesn't exist"""
@@ -17,6 +49,41 @@ def init_csv():
             writer = csv.writer(f)
             writer.writerow(CSV_HEADERS)
 
+def safe_name(value):
+    """File name safe version of a device, source or series name"""
+    return ''.join(c if c.isalnum() or c in '-_' else '_' for c in str(value))
+
+def device_path(device_id):
+    """Per-device file used by the compressed storage formats"""
+    base, ext = os.path.splitext(CSV_FILE)
+    return f"{base}_{safe_name(device_id)}{ext}"
+
+def append_to_store(data):
+    """Append a new reading to the configured storage format"""
+    if STORAGE_FORMAT == 'csv':
+        append_to_csv(data)
+        return
+    with sinks_lock:
+        sink = device_sinks.get(data['device_id'])
+        if sink is None:
+            sink = magazyn.open_sink(
+                STORAGE_FORMAT,
+                device_path(data['device_id']),
+                ['timestamp', 'raw_value', 'voltage'],
+                decimals=[0, 3],
+                timestamp_format=None
+            )
+            device_sinks[data['device_id']] = sink
+        sink.write(datetime.now(), [float(data['raw_value']), float(data['voltage'])])
+
+@atexit.register
+def close_sinks():
+    """Flush buffered blocks of the compressed storage formats"""
+    with sinks_lock:
+        for sink in device_sinks.values():
+            sink.close()
+        device_sinks.clear()
+
 def append_to_csv(data):
     """Append a new reading to the CSV file"""
     timestamp = datetime.now().isoformat()
@@ -26,25 +93,145 @@ def append_to_csv(data):
         data['raw_value'],
         data['voltage']
     ]
-    with open(CSV_FILE, 'a', newline='') as f:
+    # Retention compaction swaps the file, see wspolne/zapis.py append_lock
+    with zapis.append_lock(CSV_FILE), open(CSV_FILE, 'a', newline='') as f:
         writer = csv.writer(f)
         writer.writerow(row)
 
+def ingest_path(source, series):
+    return os.path.join(INGEST_DIR, safe_name(source), f"{safe_name(series)}.csv")
+
+def ingest_cursor(source, series):
+    """Last stored sequence number, recovered from the file after a restart"""
+    key = (source, series)
+    if key not in ingest_cursors:
+        cursor = 0
+        path = ingest_path(source, series)
+        if os.path.exists(path):
+            size = os.path.getsize(path)
+            start = max(0, size - 4096)
+            with zapis.append_lock(path), open(path, 'rb+') as f:
+                f.seek(start)
+                data = f.read()
+                # Only rows ending in a newline are complete; a torn last
+                # row was never acknowledged and the client resends it
+                end = data.rfind(b'\n') + 1
+                if start + end < size:
+                    f.truncate(start + end)
+            lines = [l for l in data[:end].split(b'\n') if l.strip()]
+            for line in reversed(lines):
+                try:
+                    cursor = int(line.rsplit(b',', 1)[1])
+                    break
+                except (IndexError, ValueError):
+                    continue
+        ingest_cursors[key] = cursor
+    return ingest_cursors[key]
+
+def store_ingested(payload):
+    """Append forwarded records in sequence, return (status, cursor)"""
+    source, series = payload['source'], payload['series']
+    with ingest_lock:
+        cursor = ingest_cursor(source, series)
+        rows = []
+        refused = False
+        for record in payload['records']:
+            seq = record[0]
+            if seq <= cursor:
+                # Already stored, the ack got lost
+                continue
+            if seq != cursor + 1 and not payload.get('allow_gap'):
+                # Missing rows, the client has to resend from the cursor
+                refused = True
+                break
+            if seq != cursor + 1:
+                print(f"Ingest gap {source}/{series}: {cursor + 1}..{seq - 1} missing")
+            rows.append(record[1:] + [seq])
+            cursor = seq
+        if rows:
+            path = ingest_path(source, series)
+            new_file = not os.path.exists(path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Retention expires old rows, see wspolne/zapis.py append_lock
+            with zapis.append_lock(path), open(path, 'a', newline='') as f:
+                writer = csv.writer(f)
+                if new_file:
+                    writer.writerow(list(payload['headers']) + ['seq'])
+                writer.writerows(rows)
+                # The 200 acks these rows, the client then deletes them
+                f.flush()
+                os.fsync(f.fileno())
+            ingest_cursors[(source, series)] = cursor
+        return (409 if refused else 200), cursor
+
+def load_device_file(path):
+    """Timestamps (ISO strings) and values from one per-device store"""
+    if STORAGE_FORMAT == 'gorilla':
+        from wspolne import gorilla
+        timestamps, values = gorilla.read(path)
+        stamps = [datetime.fromtimestamp(t / 1e6).isoformat() for t in timestamps]
+    elif STORAGE_FORMAT == 'rekordy':
+        from wspolne import rekordy
+        timestamps, values = rekordy.open_columns(path)
+        stamps = np.datetime_as_string(timestamps.view('datetime64[ns]'), unit='us')
+    else:
+        from wspolne import kolumny
+        timestamps, values = kolumny.open_columns(path)
+        stamps = np.datetime_as_string(timestamps.view('datetime64[ns]'), unit='us')
+    return stamps, values
+
+def read_device_data(device_id=None, limit=100):
+    """Read data from the per-device files of the compressed storage formats"""
+    extension = {'gorilla': '.gor', 'rekordy': '.rec'}.get(STORAGE_FORMAT, '.cols')
+    with sinks_lock:
+        # Make buffered samples visible to readers
+        for sink in device_sinks.values():
+            if hasattr(sink.writer, 'flush'):
+                sink.writer.flush()
+
+    if device_id is not None:
+        paths = {device_id: os.path.splitext(device_path(device_id))[0] + extension}
+    else:
+        prefix = os.path.splitext(CSV_FILE)[0] + '_'
+        paths = {p[len(prefix):-len(extension)]: p for p in glob.glob(prefix + '*' + extension)}
+
+    readings = []
+    for device, path in paths.items():
+        if not os.path.exists(path):
+            continue
+        stamps, values = load_device_file(path)
+        for i in range(max(0, len(stamps) - limit), len(stamps)):
+            readings.append({
+                'timestamp': str(stamps[i]),
+                'device_id': device,
+                'raw_value': float(values['raw_value'][i]),
+                'voltage': float(values['voltage'][i])
+            })
+    readings.sort(key=lambda x: x['timestamp'], reverse=True)
+    return readings[:limit]
+
 def read_csv_data(device_id=None, limit=100):
     """Read data from CSV file with optional device_id filter"""
-    readings = []
+    if STORAGE_FORMAT != 'csv':
+        return read_device_data(device_id, limit)
     try:
-        with open(CSV_FILE, 'r') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                if device_id is None or row['device_id'] == device_id:
-                    readings.append(row)
+        # Shared columnar cache, only rows appended since the last request get parsed
+        series = serie.get_series(CSV_FILE)
     except FileNotFoundError:
         return []
-    
+    timestamps, values = series.view()
+
+    if device_id is None:
+        selected = np.arange(len(timestamps))
+    else:
+        labels = series.labels('device_id')
+        if device_id not in labels:
+            return []
+        selected = np.flatnonzero(values['device_id'] == labels.index(device_id))
+
     # Sort by timestamp in descending order and apply limit
-    readings.sort(key=lambda x: x['timestamp'], reverse=True)
-    return readings[:limit]
+    order = np.argsort(timestamps[selected], kind='stable')[::-1][:limit]
+    return series.rows(selected[order])
 
 @app.before_first_request
 def setup():
@@ -62,8 +249,8 @@ def receive_voltage():
         if not all(field in data for field in required_fields):
             return jsonify({'error': 'Missing required fields'}), 400
         
-        # Store in CSV
-        append_to_csv(data)
+        # Store in the configured format
+        append_to_store(data)
         
         return jsonify({
             'status': 'success',
@@ -104,6 +291,55 @@ def get_latest_readings():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/stats/<series>/<column>', methods=['GET'])
+def get_range_stats(series, column):
+    """count/mean/var/std/min/max of a column between ?start= and ?end= (ISO timestamps)"""
+    try:
+        if series not in STATS_SERIES:
+            return jsonify({'error': f"Unknown series '{series}'"}), 404
+        start = request.args.get('start')
+        end = request.args.get('end')
+        stats = indeks.range_stats(
+            STATS_SERIES[series],
+            column,
+            datetime.fromisoformat(start) if start else None,
+            datetime.fromisoformat(end) if end else None
+        )
+        return jsonify(stats)
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/ingest', methods=['POST'])
+def ingest():
+    """Store a batch of rows forwarded by a Pi logger (gzip JSON, see wspolne/przesyl.py)"""
+    try:
+        body = request.get_data()
+        if request.headers.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        payload = json.loads(body)
+        if not all(field in payload for field in ['source', 'series', 'headers', 'records']):
+            return jsonify({'error': 'Missing required fields'}), 400
+        status, cursor = store_ingested(payload)
+        return jsonify({'cursor': cursor}), status
+
+    except (OSError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/ingest/cursor', methods=['GET'])
+def get_ingest_cursor():
+    """Last stored sequence number of ?source= and ?series="""
+    source = request.args.get('source')
+    series = request.args.get('series')
+    if not source or not series:
+        return jsonify({'error': 'source and series are required'}), 400
+    with ingest_lock:
+        return jsonify({'cursor': ingest_cursor(source, series)})
+
 @app.route('/voltage/download', methods=['GET'])
 def download_csv():
     """Download the entire CSV file"""
@@ -4,6 +4,8 @@ import plotly.express as px
 import os
 from datetime import datetime
 
+from wspolne import kolumny, rekordy, serie
+
 # Set page configuration
 st.set_page_config(
     page_title="Dane Środowiskowe",
@@ -40,11 +42,10 @@ TRANSLATIONS = {
 def load_and_prepare_csv(file_path):
     """Load CSV file and prepare data for visualization"""
     try:
-        if os.path.exists(file_path):
-            df = pd.read_csv(file_path)
-            # Convert timestamp to datetime
-            df['Timestamp'] = pd.to_datetime(df['Timestamp'])
-            return df
+        if (os.path.exists(file_path) or os.path.isdir(kolumny.store_path(file_path))
+                or os.path.exists(rekordy.record_path(file_path))):
+            # Mapped columnar store if the logger writes one, otherwise the shared CSV cache
+            return serie.load_frame(file_path)
         else:
             st.error(f"{TRANSLATIONS['file_not_found']}: {file_path}")
             return None
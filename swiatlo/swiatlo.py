@@ -14,12 +14,15 @@
 # Date   : [Current date]
 #
 #---------------------------------------------------------------------
-import smbus
 import time
-import csv
+import sys
 from datetime import datetime
 import os
 
+# Shared helpers live in ../wspolne
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from wspolne import adaptacja, filtry, harmonogram, magazyn, profilowanie, przesyl, zapis
+
 # Define some constants from the datasheet
 DEVICE     = 0x23 # Default device I2C address
 POWER_DOWN = 0x00 # No active state
@@ -45,9 +48,47 @@ ONE_TIME_LOW_RES_MODE = 0x23
 # CSV Configuration
 CSV_FILENAME = 'light_readings.csv'
 CSV_HEADERS = ['Timestamp', 'Light_Level_lx']
+# Storage format and write path options (None turns a stage off), see
+# open_sink() in wspolne/magazyn.py
+STORAGE_FORMAT = 'csv'
+BUFFERING = None
+# BUFFERING = {'max_age': 60}
+# Rotated files: serie, the dashboards and serwer.py /stats only read the
+# current segment, older rows need wspolne.segmenty.load_range()
+ROTATION = None
+# ROTATION = {'period': 'day', 'max_bytes': 16 * 1024 * 1024}
+BACKGROUND = {'capacity': 1024}
+UPLINK = None
+# UPLINK = {'url': 'http://192.168.1.10:5000', 'series': 'light'}
+COMPRESSION = None
+# COMPRESSION = {'method': 'swinging_door', 'error': [1.0], 'heartbeat': 600}
+FILTERING = None
+# FILTERING = {'filters': [{'method': 'hampel', 'window': 7}], 'keep_raw': True}
+# Auto-ranging: continuous mode with MTreg and resolution picked from the
+# last reading (see BH1750Range in wspolne/czujniki.py), needs smbus2
+AUTO_RANGE = False
+# Seconds between readings, on the wall-clock grid shared with the other
+# loggers; missed readings are skipped ('skip') or made up ('catch_up')
+INTERVAL = 10
+SCHEDULE_POLICY = harmonogram.SKIP
+# Adaptive sampling period instead of the fixed INTERVAL, see AdaptiveRate
+# in wspolne/adaptacja.py
+ADAPTIVE = None
+# ADAPTIVE = {'periods': [1, 2, 5, 10, 30, 60], 'rate': [5], 'std': [10], 'patience': 3}
+# Simulated sensor and clock instead of the I2C hardware, rows go to
+# sim_<file>; see wspolne/symulacja.py
+SIMULATION = None
+# SIMULATION = {'signal': 'replay', 'speed': 1000}
+# I2C profiling per device, see profile() in wspolne/profilowanie.py
+PROFILE_BUS = None
+# PROFILE_BUS = {'interval': 300, 'retries': 0}
 
-#bus = smbus.SMBus(0) # Rev 1 Pi uses 0
-bus = smbus.SMBus(1)  # Rev 2 Pi uses 1
+sink = None
+sensor = None
+# Simulated BH1750 when SIMULATION is set
+simulated = None
+# Opened on the first reading, so the script also starts off the Pi
+bus = None
 
 def convertToNumber(data):
     # Simple function to convert 2 bytes of data
@@ -57,47 +98,97 @@ def convertToNumber(data):
 
 def readLight(addr=DEVICE):
     # Read data from I2C interface
+    global bus
+    if simulated is not None:
+        return simulated.read()[0]
+    if bus is None:
+        import smbus
+        #bus = smbus.SMBus(0) # Rev 1 Pi uses 0
+        bus = smbus.SMBus(1)  # Rev 2 Pi uses 1
+        if PROFILE_BUS is not None:
+            bus = profilowanie.profile(bus, **PROFILE_BUS)
     data = bus.read_i2c_block_data(addr,ONE_TIME_HIGH_RES_MODE_1)
     return convertToNumber(data)
 
+def readLightAutoRange():
+    # Continuous auto-ranged reading, the first one waits for a conversion
+    global sensor
+    if sensor is None:
+        from smbus2 import SMBus
+        from wspolne import czujniki
+        handle = SMBus(1)
+        if PROFILE_BUS is not None:
+            handle = profilowanie.profile(handle, **PROFILE_BUS)
+        sensor = czujniki.BH1750(handle, DEVICE, auto_range=True)
+    time.sleep(sensor.start())
+    return sensor.collect()[0]
+
 def setup_csv():
-    # Create CSV file with headers if it doesn't exist
-    if not os.path.exists(CSV_FILENAME):
-        with open(CSV_FILENAME, 'w', newline='') as file:
-            writer = csv.writer(file)
-            writer.writerow(CSV_HEADERS)
+    # Open the storage sink, CSV files get their headers if they don't exist
+    global sink
+    sink = magazyn.open_sink(STORAGE_FORMAT, CSV_FILENAME, CSV_HEADERS, decimals=[2],
+                             compression=COMPRESSION, buffering=BUFFERING,
+                             background=BACKGROUND, uplink=UPLINK,
+                             rotation=ROTATION, filtering=FILTERING)
 
-def log_reading(light_level):
-    # Get current timestamp
-    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    
-    # Append data to CSV file
-    with open(CSV_FILENAME, 'a', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow([timestamp, f"{light_level:.2f}"])
+def log_reading(light_level, timestamp=None):
+    # Append the reading with its grid timestamp (or the current time)
+    sink.write(timestamp or datetime.now(), [light_level])
 
 def main():
+    global CSV_FILENAME, BACKGROUND, simulated
+    clock = harmonogram.CLOCK
+    if SIMULATION:
+        from wspolne import symulacja
+        clock, simulated = symulacja.simulate('bh1750', **SIMULATION)
+        CSV_FILENAME = symulacja.output_path(CSV_FILENAME)
+        BACKGROUND = symulacja.background_options(BACKGROUND)
+        print(f"Simulated BH1750: {SIMULATION}")
     print(f"Logging light sensor data to {CSV_FILENAME}")
     print("Press CTRL+C to stop")
     
-    # Setup CSV file
+    # Setup CSV file, SIGTERM/SIGUSR1 flush buffered rows
     setup_csv()
+    zapis.install_signal_handlers()
+    scheduler = harmonogram.Scheduler(INTERVAL, SCHEDULE_POLICY, clock=clock)
+    adaptive = adaptacja.AdaptiveRate(start=INTERVAL, **ADAPTIVE) if ADAPTIVE else None
     
     try:
-        while True:
-            lightLevel = readLight()
-            # Print to console
-            print(f"Light Level : {lightLevel:.2f} lx")
+        for timestamp in scheduler:
+            if AUTO_RANGE and simulated is None:
+                lightLevel = readLightAutoRange()
+                # Print to console with the range used for the next reading
+                print(f"Light Level : {lightLevel:.2f} lx "
+                      f"(next: {sensor.range.mode}, MTreg {sensor.range.mtreg})")
+            else:
+                lightLevel = readLight()
+                # Print to console
+                print(f"Light Level : {lightLevel:.2f} lx")
             # Log to CSV
-            log_reading(lightLevel)
-            # Wait before next reading
-            time.sleep(10)
+            log_reading(lightLevel, timestamp)
+            if adaptive is not None:
+                scheduler.set_period(adaptive.update(timestamp, [lightLevel]))
             
     except KeyboardInterrupt:
         print("\nLogging stopped by user")
     except Exception as e:
         print(f"\nAn error occurred: {str(e)}")
     finally:
+        if sink is not None:
+            sink.close()
+            if BACKGROUND is not None:
+                print(f"\nPersistence: {sink.report()}")
+            if BUFFERING:
+                print(f"\nWrites: {zapis.report()}")
+            if UPLINK is not None:
+                print(f"\nUplink: {przesyl.report()}")
+            if FILTERING:
+                print(f"\nFiltering: {filtry.report()}")
+        print(f"\nSchedule: {scheduler.report()}")
+        if PROFILE_BUS is not None:
+            print(f"\nBus: {profilowanie.report()}")
+        if adaptive is not None:
+            print(f"Adaptive: {adaptive.events} events, last period {adaptive.period} s")
         print(f"\nData has been saved to {CSV_FILENAME}")
 
 if __name__=="__main__":
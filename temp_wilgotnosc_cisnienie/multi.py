@@ -1,91 +1,158 @@
-import time
-import smbus2
-import bme280
-import csv
+import sys
 from datetime import datetime
 import os
 
+# Shared helpers live in ../wspolne
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from wspolne import adaptacja, czujniki, filtry, harmonogram, magazyn, profilowanie, przesyl, zapis
+
 # BME280 sensor address (default address)
 address = 0x76
-# Initialize I2C bus
-bus = smbus2.SMBus(1)
-# Load calibration parameters
-calibration_params = bme280.load_calibration_params(bus, address)
+# Oversampling of temperature, pressure and humidity (1, 2, 4, 8 or 16, 0
+# skips pressure/humidity): more samples mean less noise, longer conversions
+OVERSAMPLING = (1, 1, 1)
+# IIR filter coefficient: 0 (off), 2, 4, 8 or 16
+IIR_FILTER = 0
+# 'forced' converts once per reading and sleeps in between (least power),
+# 'normal' free-runs with STANDBY_MS between conversions
+MODE = 'forced'
+STANDBY_MS = 1000
+
+# Opened in main(), see open_sensor()
+sensor = None
+clock = harmonogram.CLOCK
 
 # CSV Configuration
 CSV_FILENAME = 'environmental_data.csv'
 CSV_HEADERS = ['Timestamp', 'Temperature_C', 'Temperature_F', 'Pressure_hPa', 'Humidity_%']
+# Storage format and write path options (None turns a stage off), see
+# open_sink() in wspolne/magazyn.py
+STORAGE_FORMAT = 'csv'
+BUFFERING = None
+# BUFFERING = {'max_age': 60}
+# Rotated files: serie, the dashboards and serwer.py /stats only read the
+# current segment, older rows need wspolne.segmenty.load_range()
+ROTATION = None
+# ROTATION = {'period': 'day', 'max_bytes': 16 * 1024 * 1024}
+BACKGROUND = {'capacity': 1024}
+UPLINK = None
+# UPLINK = {'url': 'http://192.168.1.10:5000', 'series': 'environment'}
+COMPRESSION = None
+# Temperature_F follows Temperature_C, so it doesn't need its own error
+# COMPRESSION = {'method': 'swinging_door', 'error': [0.1, None, 0.1, 0.5], 'heartbeat': 600}
+# Kalman smoothing, readings stay in environmental_data.csv and the
+# smoothed rows go to environmental_data_filtered.csv; history, from the
+# repository root: python -m wspolne.filtry kalman
+#     temp_wilgotnosc_cisnienie/environmental_data.csv bme280 2
+FILTERING = None
+# FILTERING = {'filters': filtry.BME280_KALMAN, 'separate': True}
+# Seconds between readings, on the wall-clock grid shared with the other
+# loggers; missed readings are skipped ('skip') or made up ('catch_up')
+INTERVAL = 10
+SCHEDULE_POLICY = harmonogram.SKIP
+# Adaptive sampling period instead of the fixed INTERVAL, see AdaptiveRate
+# in wspolne/adaptacja.py
+ADAPTIVE = None
+# ADAPTIVE = {'periods': [2, 5, 10, 30, 60], 'rate': [0.05, None, 0.05, 0.2],
+#             'std': [0.2, None, 0.3, 1.0], 'patience': 3}
+# Simulated sensor and clock instead of the I2C hardware, rows go to
+# sim_<file>; see wspolne/symulacja.py
+SIMULATION = None
+# SIMULATION = {'signal': 'replay', 'speed': 1000}
+# I2C profiling per device, see profile() in wspolne/profilowanie.py
+PROFILE_BUS = None
+# PROFILE_BUS = {'interval': 300, 'retries': 0}
 
-def celsius_to_fahrenheit(celsius):
-    return (celsius * 9/5) + 32
+sink = None
+
+def open_sensor():
+    # Initialize I2C bus and the sensor (or its simulation), calibration
+    # comes from the on-disk cache after the first start
+    global sensor, clock, CSV_FILENAME, BACKGROUND
+    if SIMULATION:
+        from wspolne import symulacja
+        clock, sensor = symulacja.simulate('bme280', **SIMULATION)
+        CSV_FILENAME = symulacja.output_path(CSV_FILENAME)
+        BACKGROUND = symulacja.background_options(BACKGROUND)
+        print(f"Simulated BME280: {SIMULATION}")
+        return
+    import smbus2
+    bus = smbus2.SMBus(1)
+    if PROFILE_BUS is not None:
+        bus = profilowanie.profile(bus, **PROFILE_BUS)
+    sensor = czujniki.BME280(bus, address, OVERSAMPLING, IIR_FILTER, MODE, STANDBY_MS)
 
 def setup_csv():
-    # Create CSV file with headers if it doesn't exist
-    if not os.path.exists(CSV_FILENAME):
-        with open(CSV_FILENAME, 'w', newline='') as file:
-            writer = csv.writer(file)
-            writer.writerow(CSV_HEADERS)
+    # Open the storage sink, CSV files get their headers if they don't exist
+    global sink
+    sink = magazyn.open_sink(STORAGE_FORMAT, CSV_FILENAME, CSV_HEADERS, decimals=[2, 2, 2, 2],
+                             compression=COMPRESSION, buffering=BUFFERING,
+                             background=BACKGROUND, uplink=UPLINK,
+                             rotation=ROTATION, filtering=FILTERING)
 
-def log_reading(temp_c, temp_f, pressure, humidity):
-    # Get current timestamp
-    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    
-    # Append data to CSV file
-    with open(CSV_FILENAME, 'a', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow([
-            timestamp,
-            f"{temp_c:.2f}",
-            f"{temp_f:.2f}",
-            f"{pressure:.2f}",
-            f"{humidity:.2f}"
-        ])
+def log_reading(temp_c, temp_f, pressure, humidity, timestamp=None):
+    # Append the readings with their grid timestamp (or the current time)
+    sink.write(timestamp or datetime.now(), [temp_c, temp_f, pressure, humidity])
 
 def main():
-    # Setup CSV file
+    # Setup the sensor and CSV file, SIGTERM/SIGUSR1 flush buffered rows
+    open_sensor()
     setup_csv()
+    zapis.install_signal_handlers()
     
     print(f"Logging environmental data to {CSV_FILENAME}")
+    print(f"BME280 {MODE} mode, oversampling {OVERSAMPLING}, IIR {IIR_FILTER}, "
+          f"conversion up to {sensor.conversion_time() * 1000:.1f} ms")
     print("Press CTRL+C to stop")
     
-    while True:
-        try:
-            # Read sensor data
-            data = bme280.sample(bus, address, calibration_params)
-            
-            # Extract temperature, pressure, and humidity
-            temperature_celsius = data.temperature
-            pressure = data.pressure
-            humidity = data.humidity
-            
-            # Convert temperature to Fahrenheit
-            temperature_fahrenheit = celsius_to_fahrenheit(temperature_celsius)
+    scheduler = harmonogram.Scheduler(INTERVAL, SCHEDULE_POLICY, clock=clock)
+    adaptive = adaptacja.AdaptiveRate(start=INTERVAL, **ADAPTIVE) if ADAPTIVE else None
+    try:
+        for timestamp in scheduler:
+            # Read sensor data, waiting for the conversion to finish
+            clock.sleep(sensor.start())
+            temperature_celsius, temperature_fahrenheit, pressure, humidity = sensor.collect()
             
             # Print the readings
             print("\nCurrent Readings:")
             print("Temperature: {:.2f} °C, {:.2f} °F".format(
                 temperature_celsius, temperature_fahrenheit))
-            print("Pressure: {:.2f} hPa".format(pressure))
-            print("Humidity: {:.2f} %".format(humidity))
+            if pressure is not None:
+                print("Pressure: {:.2f} hPa".format(pressure))
+            if humidity is not None:
+                print("Humidity: {:.2f} %".format(humidity))
             
-            # Log the readings to CSV
+            # Log the readings to CSV under the grid timestamp
             log_reading(
                 temperature_celsius,
                 temperature_fahrenheit,
                 pressure,
-                humidity
+                humidity,
+                timestamp
             )
+            if adaptive is not None:
+                scheduler.set_period(adaptive.update(timestamp, [
+                    temperature_celsius, temperature_fahrenheit, pressure, humidity]))
             
-            # Wait for a few seconds before the next reading
-            time.sleep(10)
-            
-        except KeyboardInterrupt:
-            print('\nProgram stopped by user')
-            break
-        except Exception as e:
-            print('\nAn unexpected error occurred:', str(e))
-            break
+    except KeyboardInterrupt:
+        print('\nProgram stopped by user')
+    except Exception as e:
+        print('\nAn unexpected error occurred:', str(e))
     
+    print(f"Schedule: {scheduler.report()}")
+    if PROFILE_BUS is not None:
+        print(f"Bus: {profilowanie.report()}")
+    if adaptive is not None:
+        print(f"Adaptive: {adaptive.events} events, last period {adaptive.period} s")
+    sink.close()
+    if BACKGROUND is not None:
+        print(f"Persistence: {sink.report()}")
+    if BUFFERING:
+        print(f"Writes: {zapis.report()}")
+    if UPLINK is not None:
+        print(f"Uplink: {przesyl.report()}")
+    if FILTERING:
+        print(f"Filtering: {filtry.report()}")
     print(f"Data has been saved to {CSV_FILENAME}")
 
 if __name__ == "__main__":
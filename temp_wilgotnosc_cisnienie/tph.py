@@ -1,31 +1,29 @@
 import time
 import smbus2
-import bme280
+import sys
+import os
+
+# Shared helpers live in ../wspolne
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from wspolne import czujniki
 
 # BME280 sensor address (default address)
 address = 0x76
+# Oversampling (temperature, pressure, humidity), IIR filter and mode,
+# see temp_wilgotnosc_cisnienie/multi.py
+OVERSAMPLING = (1, 1, 1)
+IIR_FILTER = 0
+MODE = 'forced'
 
-# Initialize I2C bus
+# Initialize I2C bus and the sensor, calibration is cached on disk
 bus = smbus2.SMBus(1)
-
-# Load calibration parameters
-calibration_params = bme280.load_calibration_params(bus, address)
-
-def celsius_to_fahrenheit(celsius):
-    return (celsius * 9/5) + 32
+sensor = czujniki.BME280(bus, address, OVERSAMPLING, IIR_FILTER, MODE)
 
 while True:
     try:
-        # Read sensor data
-        data = bme280.sample(bus, address, calibration_params)
-
-        # Extract temperature, pressure, and humidity
-        temperature_celsius = data.temperature
-        pressure = data.pressure
-        humidity = data.humidity
-
-        # Convert temperature to Fahrenheit
-        temperature_fahrenheit = celsius_to_fahrenheit(temperature_celsius)
+        # Read sensor data, waiting for the conversion to finish
+        time.sleep(sensor.start())
+        temperature_celsius, temperature_fahrenheit, pressure, humidity = sensor.collect()
 
         # Print the readings
         print("Temperature: {:.2f} °C, {:.2f} °F".format(temperature_celsius, temperature_fahrenheit))
@@ -0,0 +1,50 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from wspolne.adaptacja import AdaptiveRate
+
+START = datetime(2024, 11, 14, 20, 0, 0)
+
+
+def feed(rate, values):
+    """Sample at the period the controller asks for, return the periods used"""
+    t = START
+    periods = []
+    for value in values:
+        period = rate.update(t, [value])
+        periods.append(period)
+        t += timedelta(seconds=period)
+    return periods
+
+
+def test_flat_signal_backs_off_one_rung_per_patience():
+    rate = AdaptiveRate(periods=[1, 2, 5, 10], rate=[5.0], patience=3)
+    assert feed(rate, [100.0] * 12) == [1, 1, 2, 2, 2, 5, 5, 5, 10, 10, 10, 10]
+    assert rate.events == 0
+
+
+def test_fast_change_drops_to_the_fastest_rung():
+    rate = AdaptiveRate(periods=[1, 2, 5, 10], rate=[5.0], patience=1, start=10)
+    # 10 s later, +40 lx is 4 lx/s: quiet; then a light switches on
+    periods = feed(rate, [100.0, 140.0, 140.0, 900.0, 900.0])
+    assert periods == [10, 10, 10, 1, 2]
+    assert rate.events == 1
+
+
+def test_noisy_window_counts_as_an_event():
+    rate = AdaptiveRate(periods=[1, 10], std=[0.5], patience=1, start=10)
+    assert feed(rate, [21.0, 21.1, 21.0]) == [10, 10, 10]
+    assert feed(rate, [23.0]) == [1]
+
+
+def test_missing_values_are_ignored():
+    rate = AdaptiveRate(periods=[1, 10], rate=[1.0], patience=1)
+    assert feed(rate, [None, 5.0, None, 5.0]) == [10, 10, 10, 10]
+
+
+def test_periods_must_ascend():
+    with pytest.raises(ValueError):
+        AdaptiveRate(periods=[10, 1])
+    with pytest.raises(ValueError):
+        AdaptiveRate(periods=[])
@@ -0,0 +1,68 @@
+import pytest
+
+from wspolne import ads1115
+
+
+class FakeBus:
+    """smbus2 stand-in for one ADS1115, the conversion is done after `busy` config reads"""
+
+    def __init__(self, raw, busy=2):
+        self.raw = raw
+        self.busy = busy
+        self.polls = 0
+        self.config = None
+
+    def write_i2c_block_data(self, address, register, data):
+        assert register == ads1115.REG_CONFIG
+        self.config = (data[0] << 8) | data[1]
+        self.polls = 0
+
+    def read_i2c_block_data(self, address, register, length):
+        if register == ads1115.REG_CONFIG:
+            self.polls += 1
+            done = 0x80 if self.polls > self.busy else 0x00
+            return [done | (self.config >> 8) & 0x7F, self.config & 0xFF]
+        value = self.raw & 0xFFFF
+        return [value >> 8, value & 0xFF]
+
+
+def test_config_word_of_a_single_shot_read():
+    bus = FakeBus(0)
+    adc = ads1115.ADS1115(bus, gain=2, data_rate=860)
+    assert adc.start(3) == pytest.approx(1 / 860)
+    # OS=1, MUX=111 (AIN3 vs GND), PGA=010, MODE=1, DR=111, comparator off
+    assert bus.config == 0b1_111_010_1_111_00011
+
+
+@pytest.mark.parametrize('raw, gain, volts', [
+    (16384, 1, 16384 * 4.096 / 32767),
+    (32767, 2 / 3, 6.144),
+    (-32768, 16, -32768 * 0.256 / 32767),
+])
+def test_voltage_matches_analog_in(raw, gain, volts):
+    adc = ads1115.ADS1115(FakeBus(raw), gain=gain, data_rate=860)
+    assert adc.voltage(0) == pytest.approx(volts)
+    assert adc.mux == 0
+
+
+def test_collect_waits_for_the_conversion():
+    bus = FakeBus(1000, busy=3)
+    adc = ads1115.ADS1115(bus, data_rate=860)
+    adc.start(1)
+    adc.collect()
+    assert bus.polls == 4
+
+
+def test_conversion_timeout(monkeypatch):
+    monkeypatch.setattr(ads1115, 'CONVERSION_TIMEOUT', 0.01)
+    adc = ads1115.ADS1115(FakeBus(0, busy=10 ** 9), data_rate=860)
+    adc.start(0)
+    with pytest.raises(TimeoutError):
+        adc.collect()
+
+
+def test_rejects_unknown_gain_and_rate():
+    with pytest.raises(ValueError):
+        ads1115.ADS1115(FakeBus(0), gain=3)
+    with pytest.raises(ValueError):
+        ads1115.ADS1115(FakeBus(0), data_rate=100)
@@ -0,0 +1,171 @@
+import struct
+
+import pytest
+
+from wspolne import czujniki
+from wspolne.czujniki import BH1750Range, bh1750_lux
+
+
+def test_lux_scales_with_mode_and_mtreg():
+    assert bh1750_lux(1200) == pytest.approx(1000)
+    # Twice the measurement time, twice the counts for the same light
+    assert bh1750_lux(2400, 'high', 138) == pytest.approx(1000)
+    assert bh1750_lux(2400, 'high2') == pytest.approx(1000)
+
+
+def test_dark_scene_gets_high_res_2_and_a_long_measurement():
+    rng = BH1750Range()
+    assert rng.update(6)  # 5 lx at the defaults
+    assert rng.mode == 'high2'
+    assert rng.mtreg == czujniki.BH1750_MTREG_MAX
+    assert rng.conversion_time() == pytest.approx(0.18 * 254 / 69)
+
+
+def test_bright_scene_gets_low_res_and_a_short_measurement():
+    rng = BH1750Range()
+    assert rng.update(int(50_000 * 1.2))
+    assert rng.mode == 'low'
+    # Expected count for 50 klx stays under the target
+    assert bh1750_lux(1, 'low', rng.mtreg) * czujniki.BH1750_TARGET_COUNTS >= 50_000
+    assert rng.mtreg < czujniki.BH1750_MTREG_DEFAULT
+
+
+def test_saturated_count_goes_to_the_least_sensitive_setting():
+    rng = BH1750Range()
+    assert rng.update(czujniki.BH1750_SATURATED)
+    assert (rng.mode, rng.mtreg) == ('low', czujniki.BH1750_MTREG_MIN)
+
+
+def counts(lux, rng):
+    return int(lux * 1.2 * czujniki.BH1750_MODES[rng.mode]['divider'] * rng.mtreg / 69)
+
+
+def test_settings_hold_for_steady_light():
+    rng = BH1750Range()
+    assert rng.update(counts(500, rng))
+    assert rng.mode == 'high'
+    settings = (rng.mode, rng.mtreg)
+    for _ in range(3):
+        assert not rng.update(counts(500, rng))
+    assert (rng.mode, rng.mtreg) == settings
+
+
+def test_mode_changes_only_past_the_hysteresis():
+    rng = BH1750Range()
+    rng.update(counts(5000, rng))
+    assert rng.mode == 'low'
+    # Back under 1000 lx, but not under 800
+    rng.update(counts(900, rng))
+    assert rng.mode == 'low'
+    rng.update(counts(700, rng))
+    assert rng.mode == 'high'
+
+
+# Example of the BMP280/BME280 datasheets (section 3.11.3 of the BMP280 one):
+# adc_T 519888 -> 25.08 degC, adc_P 415148 -> 100653.27 Pa
+DATASHEET = {
+    'T1': 27504, 'T2': 26435, 'T3': -1000,
+    'P1': 36477, 'P2': -10685, 'P3': 3024, 'P4': 2855, 'P5': 140, 'P6': -7,
+    'P7': 15500, 'P8': -14600, 'P9': 6000,
+    'H1': 75, 'H2': 362, 'H3': 0, 'H4': 313, 'H5': 50, 'H6': 30,
+}
+
+
+def compensate_int(c, adc_t, adc_p, adc_h):
+    """Fixed-point reference formulas of the datasheet (section 4.2.3 / 8.2)"""
+    var1 = (((adc_t >> 3) - (c['T1'] << 1)) * c['T2']) >> 11
+    var2 = (((((adc_t >> 4) - c['T1']) * ((adc_t >> 4) - c['T1'])) >> 12) * c['T3']) >> 14
+    t_fine = var1 + var2
+    temperature = ((t_fine * 5 + 128) >> 8) / 100
+
+    var1 = t_fine - 128000
+    var2 = var1 * var1 * c['P6']
+    var2 = var2 + ((var1 * c['P5']) << 17)
+    var2 = var2 + (c['P4'] << 35)
+    var1 = ((var1 * var1 * c['P3']) >> 8) + ((var1 * c['P2']) << 12)
+    var1 = (((1 << 47) + var1) * c['P1']) >> 33
+    p = 1048576 - adc_p
+    p = (((p << 31) - var2) * 3125) // var1
+    var1 = (c['P9'] * (p >> 13) * (p >> 13)) >> 25
+    var2 = (c['P8'] * p) >> 19
+    pressure = (((p + var1 + var2) >> 8) + (c['P7'] << 4)) / 256
+
+    v = t_fine - 76800
+    v = (((((adc_h << 14) - (c['H4'] << 20) - (c['H5'] * v)) + 16384) >> 15)
+         * (((((((v * c['H6']) >> 10) * (((v * c['H3']) >> 11) + 32768)) >> 10) + 2097152)
+             * c['H2'] + 8192) >> 14))
+    v = v - (((((v >> 15) * (v >> 15)) >> 7) * c['H1']) >> 4)
+    v = min(max(v, 0), 419430400)
+    return temperature, pressure, (v >> 12) / 1024
+
+
+class CalibrationBus:
+    """Calibration registers laid out like the chip's, counts the reads"""
+
+    def __init__(self, c):
+        self.reads = 0
+        self.block_1 = struct.pack('<HhhHhhhhhhhh', *[c[k] for k in
+                                   ['T1', 'T2', 'T3', 'P1', 'P2', 'P3', 'P4', 'P5', 'P6', 'P7', 'P8', 'P9']])
+        self.block_1 += bytes([0, c['H1']])
+        h4, h5 = c['H4'] & 0xFFF, c['H5'] & 0xFFF
+        self.block_2 = struct.pack('<hB', c['H2'], c['H3']) + bytes(
+            [h4 >> 4, (h4 & 0x0F) | ((h5 & 0x0F) << 4), h5 >> 4]) + struct.pack('<b', c['H6'])
+        self.writes = []
+
+    def read_i2c_block_data(self, address, register, length):
+        self.reads += 1
+        block = self.block_1 if register == czujniki.BME280_CALIBRATION_1 else self.block_2
+        return list(block[:length])
+
+    def write_byte_data(self, address, register, value):
+        self.writes.append((register, value))
+
+
+def test_bme280_compensation_matches_the_datasheet(tmp_path):
+    sensor = czujniki.BME280(CalibrationBus(DATASHEET), calibration_cache=None)
+    assert sensor.calibration == DATASHEET
+
+    temperature, pressure, humidity = sensor.compensate(519888, 415148, 27000)
+    assert temperature == pytest.approx(25.08, abs=0.005)
+    assert pressure * 100 == pytest.approx(100653.27, abs=0.05)
+
+    reference = compensate_int(DATASHEET, 519888, 415148, 27000)
+    assert temperature == pytest.approx(reference[0], abs=0.01)
+    assert pressure == pytest.approx(reference[1] / 100, abs=0.01)
+    assert humidity == pytest.approx(reference[2], abs=0.01)
+
+
+@pytest.mark.parametrize('adc_t, adc_p, adc_h', [
+    (480000, 300000, 20000), (519888, 415148, 31000), (550000, 500000, 40000),
+])
+def test_bme280_float_and_fixed_point_formulas_agree(adc_t, adc_p, adc_h):
+    sensor = czujniki.BME280(CalibrationBus(DATASHEET), calibration_cache=None)
+    temperature, pressure, humidity = sensor.compensate(adc_t, adc_p, adc_h)
+    reference = compensate_int(DATASHEET, adc_t, adc_p, adc_h)
+    assert temperature == pytest.approx(reference[0], abs=0.01)
+    assert pressure == pytest.approx(reference[1] / 100, abs=0.01)
+    assert humidity == pytest.approx(reference[2], abs=0.02)
+
+
+def test_bme280_calibration_is_cached(tmp_path):
+    bus = CalibrationBus(DATASHEET)
+    czujniki.BME280(bus, calibration_cache=str(tmp_path))
+    assert bus.reads == 2
+    sensor = czujniki.BME280(bus, calibration_cache=str(tmp_path))
+    assert bus.reads == 2
+    assert sensor.calibration == DATASHEET
+
+
+def test_bme280_forced_mode_registers():
+    bus = CalibrationBus(DATASHEET)
+    sensor = czujniki.BME280(bus, oversampling=(2, 16, 1), iir_filter=4, calibration_cache=None)
+    # Datasheet appendix 9.1: 1.25 + 2.3 * (2 + 16 + 1) + 2 * 0.575 ms
+    assert sensor.start() == pytest.approx(0.0461)
+    assert bus.writes == [
+        (czujniki.BME280_CTRL_MEAS, 0b010_101_00),
+        (czujniki.BME280_CONFIG, (5 << 5) | (2 << 2)),
+        (czujniki.BME280_CTRL_HUM, 0b001),
+        (czujniki.BME280_CTRL_MEAS, 0b010_101_01),
+    ]
+    sensor.start()
+    assert bus.writes[-1] == (czujniki.BME280_CTRL_MEAS, 0b010_101_01)
@@ -0,0 +1,138 @@
+import statistics
+from datetime import datetime, timedelta
+
+import pytest
+
+from wspolne import filtry, magazyn
+
+
+def stored_values(path):
+    with open(path) as f:
+        return [line.split(',')[1].strip() for line in f][1:]
+
+
+class Recorder:
+    def __init__(self):
+        self.rows = []
+
+    def write(self, timestamp, values):
+        self.rows.append(list(values))
+
+    def close(self):
+        pass
+
+
+def test_window_median_and_mad_match_statistics():
+    samples = [5.0, 1.0, 9.0, 3.0, 3.0, 7.0, 2.0, 8.0, 6.0, 4.0]
+    window = filtry.Window(4)
+    for i, value in enumerate(samples):
+        window.add(value)
+        last = samples[max(0, i - 3):i + 1]
+        median = statistics.median(last)
+        assert window.median() == median
+        assert window.mad(median) == statistics.median(abs(v - median) for v in last)
+
+
+def test_hampel_replaces_spikes_and_follows_steps():
+    hampel = filtry.Hampel(window=5, threshold=3.0)
+    noise = [0.1, -0.1, 0.05, -0.05, 0.0]
+    signal = [20 + noise[i % 5] for i in range(10)] + [80.0] + \
+             [20 + noise[i % 5] for i in range(5)] + [30 + noise[i % 5] for i in range(10)]
+    out = [hampel.update(i, value) for i, value in enumerate(signal)]
+
+    assert out[10] == pytest.approx(20, abs=0.2)
+    # The first two samples of a step look like spikes, from the third
+    # (the window's majority) on it passes unchanged
+    assert out[16:18] == [pytest.approx(20, abs=0.2)] * 2
+    assert out[18:] == signal[18:]
+    assert hampel.replaced == 3
+
+
+def test_hampel_floor_keeps_quantised_steps():
+    steps = [0.2, 0.2, 0.2, 0.2, 0.2001, 0.2, 0.2]
+    plain = filtry.Hampel(window=5)
+    floored = filtry.Hampel(window=5, floor=0.001)
+    assert [plain.update(i, v) for i, v in enumerate(steps)][4] == 0.2
+    assert [floored.update(i, v) for i, v in enumerate(steps)] == steps
+
+
+def test_ewma_time_constant_uses_the_elapsed_time():
+    fixed = filtry.Ewma(alpha=0.5)
+    assert [fixed.update(t, v) for t, v in [(0, 0.0), (1, 10.0), (2, 10.0)]] == [0.0, 5.0, 7.5]
+
+    timed = filtry.Ewma(time_constant=10.0)
+    timed.update(0, 0.0)
+    assert timed.update(10, 1.0) == pytest.approx(1 - 1 / 2.718281828, abs=1e-6)
+    with pytest.raises(ValueError):
+        filtry.Ewma()
+
+
+def test_sink_filters_per_column_and_keeps_raw():
+    stored, raw = Recorder(), Recorder()
+    sink = filtry.FilteringSink(stored, [{'method': 'median', 'window': 3}, None], raw_sink=raw)
+    start = datetime(2024, 11, 14, 8, 0, 0)
+    rows = [[1.0, 1.0], [9.0, 2.0], [None, 3.0], [2.0, 4.0], [3.0, 5.0]]
+    for i, values in enumerate(rows):
+        sink.write(start + timedelta(seconds=10 * i), values)
+
+    assert raw.rows == rows
+    # A missing reading is stored missing and not added to the window
+    assert stored.rows == [[1.0, 1.0], [5.0, 2.0], [None, 3.0], [2.0, 4.0], [3.0, 5.0]]
+    assert sink.report() == '5 rows filtered, 0 outliers replaced'
+
+
+def test_open_sink_keep_raw(tmp_path):
+    path = str(tmp_path / 'light_readings.csv')
+    sink = magazyn.open_sink('csv', path, ['Timestamp', 'Light_Level_lx'], decimals=[2],
+                             filtering={'filters': [{'method': 'hampel', 'window': 5}],
+                                        'keep_raw': True})
+    start = datetime(2024, 11, 14, 8, 0, 0)
+    for i, value in enumerate([100.0, 101.0, 100.0, 5000.0, 101.0]):
+        sink.write(start + timedelta(seconds=i), [value])
+    sink.close()
+
+    assert stored_values(path) == ['100.00', '101.00', '100.00', '100.50', '101.00']
+    with open(filtry.raw_path(path)) as f:
+        assert '5000.00' in f.read()
+
+
+def test_streaming_kalman_matches_the_batch():
+    import numpy as np
+
+    rng = np.random.default_rng(1)
+    # Irregular periods, a repeated timestamp and missing readings
+    times = np.cumsum(rng.choice([0.0, 5.0, 10.0, 30.0], size=200, p=[0.05, 0.3, 0.5, 0.15]))
+    truth = np.column_stack([20 + 0.001 * times, 1005 - 0.0005 * times])
+    values = truth + rng.normal(0, [0.05, 0.1], truth.shape)
+    values[rng.random(values.shape) < 0.1] = np.nan
+    process_noise, measurement_noise = [1e-5, 2e-5], [0.05, 0.1]
+
+    batch = filtry.kalman_batch(times, values, process_noise, measurement_noise)
+    for column in range(2):
+        kalman = filtry.Kalman(process_noise[column], measurement_noise[column])
+        streamed = [np.nan if np.isnan(v) else kalman.update(t, v)
+                    for t, v in zip(times, values[:, column])]
+        np.testing.assert_allclose(batch[:, column], streamed, rtol=1e-12, atol=1e-9)
+
+    smoothed = filtry.kalman_batch(times, values, process_noise, measurement_noise, smooth=True)
+    tracked = ~np.isnan(values)
+    tracked[:5] = False
+    errors = [np.abs(result - truth)[tracked].mean() for result in (smoothed, batch, values)]
+    assert errors == sorted(errors)
+
+
+def test_open_sink_separate_keeps_the_readings(tmp_path):
+    path = str(tmp_path / 'environmental_data.csv')
+    headers = ['Timestamp', 'Temperature_C']
+    filtering = {'filters': [{'method': 'median', 'window': 3}], 'separate': True}
+    sink = magazyn.open_sink('csv', path, headers, decimals=[2], filtering=filtering)
+    start = datetime(2024, 11, 14, 8, 0, 0)
+    for i, value in enumerate([20.0, 25.0, 21.0]):
+        sink.write(start + timedelta(seconds=i), [value])
+    sink.close()
+
+    assert stored_values(path) == ['20.00', '25.00', '21.00']
+    assert stored_values(filtry.filtered_path(path)) == ['20.00', '22.50', '21.00']
+
+    with pytest.raises(ValueError):
+        magazyn.open_sink('csv', path, headers, filtering=dict(filtering, keep_raw=True))
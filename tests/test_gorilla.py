@@ -0,0 +1,86 @@
+import numpy as np
+
+from wspolne import gorilla
+
+START_US = 1_700_000_000 * 1_000_000
+
+
+def random_walk(n, seed=0):
+    rng = np.random.default_rng(seed)
+    # Mostly 10 s apart with some jitter, like the loggers
+    steps = rng.choice([10, 10, 10, 9, 11, 20], size=n)
+    timestamps = START_US + np.cumsum(steps) * 1_000_000
+    values = 20 + np.cumsum(rng.normal(0, 0.05, size=n))
+    return timestamps, values
+
+
+def write(path, timestamps, columns, **options):
+    writer = gorilla.GorillaWriter(str(path), list(columns), **options)
+    for i, t in enumerate(timestamps):
+        writer.write(t, [columns[name][i] for name in columns])
+    writer.close()
+
+
+def test_round_trip_is_exact(tmp_path):
+    timestamps, values = random_walk(1000)
+    columns = {'a': values, 'b': -values * 1e6, 'c': np.zeros(1000)}
+    path = tmp_path / 'x.gor'
+    write(path, timestamps, columns, block_size=128)
+
+    read_timestamps, read_columns = gorilla.read(str(path))
+    np.testing.assert_array_equal(read_timestamps, timestamps)
+    for name, expected in columns.items():
+        np.testing.assert_array_equal(read_columns[name], expected)
+
+
+def test_missing_values_and_decimals(tmp_path):
+    timestamps, values = random_walk(300, seed=1)
+    values = np.round(values, 2)
+    stored = [None if i % 7 == 0 else v for i, v in enumerate(values)]
+    path = tmp_path / 'x.gor'
+    writer = gorilla.GorillaWriter(str(path), ['v'], decimals=[2], block_size=64)
+    for t, v in zip(timestamps, stored):
+        writer.write(t, [v])
+    writer.close()
+
+    _, columns = gorilla.read(str(path))
+    expected = np.array([np.nan if v is None else v for v in stored])
+    np.testing.assert_allclose(columns['v'], expected, rtol=0, atol=1e-9)
+
+
+def test_time_range_and_reopen(tmp_path):
+    timestamps, values = random_walk(500, seed=2)
+    path = tmp_path / 'x.gor'
+    write(path, timestamps[:250], {'v': values[:250]}, block_size=32)
+    # A second writer appends to the existing file
+    write(path, timestamps[250:], {'v': values[250:]}, block_size=32)
+
+    start, end = timestamps[100], timestamps[400]
+    read_timestamps, columns = gorilla.read(str(path), start, end)
+    selected = (timestamps >= start) & (timestamps <= end)
+    np.testing.assert_array_equal(read_timestamps, timestamps[selected])
+    np.testing.assert_array_equal(columns['v'], values[selected])
+
+
+def test_partial_block_is_written_after_max_age(tmp_path, monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr(gorilla.time, 'monotonic', lambda: clock[0])
+    timestamps, values = random_walk(5)
+    path = tmp_path / 'x.gor'
+    writer = gorilla.GorillaWriter(str(path), ['a'], block_size=128, max_age=60)
+
+    for t, v in zip(timestamps[:3], values[:3]):
+        writer.write(t, [v])
+        clock[0] += 10
+    assert len(gorilla.read(str(path))[0]) == 0
+
+    clock[0] += 40
+    writer.write(timestamps[3], [values[3]])
+    read_timestamps, _ = gorilla.read(str(path))
+    assert read_timestamps.tolist() == timestamps[:4].tolist()
+
+    # The next block starts its own clock
+    writer.write(timestamps[4], [values[4]])
+    assert len(gorilla.read(str(path))[0]) == 4
+    writer.close()
+    assert len(gorilla.read(str(path))[0]) == 5
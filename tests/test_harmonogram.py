@@ -0,0 +1,84 @@
+from datetime import datetime
+
+import pytest
+
+from wspolne.harmonogram import CATCH_UP, SKIP, Histogram, Scheduler, grid_delay
+from wspolne.symulacja import SimClock
+
+# 2024-11-14 08:46:03.25 local time, off the 10 s grid
+START = datetime(2024, 11, 14, 8, 46, 3, 250000)
+
+
+def test_grid_delay():
+    assert grid_delay(10, 1000.0) == 10
+    assert grid_delay(10, 1003.5) == pytest.approx(6.5)
+    # Float error just below a multiple counts as on the grid
+    assert grid_delay(0.1, 0.30000000000000004) == pytest.approx(0.1)
+
+
+def test_ticks_stay_on_the_grid_whatever_the_work_takes():
+    clock = SimClock(start=START)
+    scheduler = Scheduler(10, clock=clock)
+    stamps = []
+    for i, timestamp in enumerate(scheduler):
+        stamps.append(timestamp)
+        # Reads and writes take 0.1 .. 0.9 s, a sleep(10) loop would drift
+        clock.sleep(0.1 + 0.1 * (i % 9))
+        if len(stamps) == 1000:
+            break
+
+    assert stamps[0] == datetime(2024, 11, 14, 8, 46, 10)
+    assert all((b - a).total_seconds() == 10 for a, b in zip(stamps, stamps[1:]))
+    assert stamps[-1] == datetime(2024, 11, 14, 11, 32, 40)
+    # Released on the deadline every time
+    assert scheduler.lateness.max == pytest.approx(0, abs=1e-6)
+    assert scheduler.skipped == 0
+
+
+@pytest.mark.parametrize('policy, expected', [
+    (SKIP, [10, 20, 40, 50]),
+    (CATCH_UP, [10, 20, 30, 40]),
+])
+def test_missed_deadlines(policy, expected):
+    clock = SimClock(start=datetime(2024, 11, 14, 8, 46, 0, 1))
+    scheduler = Scheduler(10, policy=policy, clock=clock)
+    seconds = []
+    for i in range(4):
+        seconds.append(scheduler.wait().second)
+        if i == 1:
+            # A read that hangs for 25 s
+            clock.sleep(25)
+    assert seconds == expected
+    # Fired once, late, for the :40 deadline; :30 is dropped
+    assert scheduler.skipped == (1 if policy == SKIP else 0)
+
+
+def test_resyncs_when_the_wall_clock_steps():
+    clock = SimClock(start=datetime(2024, 11, 14, 8, 46, 0, 1))
+    scheduler = Scheduler(10, clock=clock)
+    assert scheduler.wait().second == 10
+    # NTP steps the wall clock 4.5 s ahead
+    clock.start += 4.5
+    assert scheduler.wait().second == 30
+    assert scheduler.resyncs == 1
+
+
+def test_set_period_keeps_the_grid():
+    clock = SimClock(start=datetime(2024, 11, 14, 8, 46, 0, 1))
+    scheduler = Scheduler(10, clock=clock)
+    stamps = [scheduler.wait() for _ in range(2)]
+    scheduler.set_period(30)
+    stamps += [scheduler.wait() for _ in range(2)]
+    scheduler.set_period(1)
+    stamps += [scheduler.wait() for _ in range(2)]
+    assert [s.strftime('%M:%S') for s in stamps] == ['46:10', '46:20', '46:30', '47:00', '47:01', '47:02']
+
+
+def test_histogram_percentiles():
+    histogram = Histogram()
+    for ms in [0.05] * 90 + [3] * 9 + [700]:
+        histogram.add(ms / 1000)
+    assert histogram.percentile(50) == pytest.approx(0.0001)
+    assert histogram.percentile(99) == pytest.approx(0.005)
+    assert histogram.percentile(100) == pytest.approx(0.7)
+    assert histogram.count == 100
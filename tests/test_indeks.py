@@ -0,0 +1,123 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from wspolne import indeks
+
+START = datetime(2024, 11, 14, 8, 0, 0)
+
+
+def append_rows(path, values, first):
+    with open(path, 'a') as f:
+        for i, row in enumerate(values, start=first):
+            stamp = START + timedelta(seconds=10 * i)
+            cells = ['' if np.isnan(v) else f"{v:.4f}" for v in row]
+            f.write(f"{stamp:%Y-%m-%d %H:%M:%S}," + ','.join(cells) + '\n')
+
+
+def expected(values, lo, hi):
+    # What the CSV holds, at the precision of the index source (float32 cache)
+    window = np.round(values[lo:hi + 1], 4).astype(np.float32).astype(np.float64)
+    window = window[~np.isnan(window)]
+    return window
+
+
+def check(path, values, rng, queries=200):
+    n = len(values)
+    for _ in range(queries):
+        lo, hi = sorted(int(i) for i in rng.integers(0, n, size=2))
+        start = START + timedelta(seconds=10 * lo)
+        end = START + timedelta(seconds=10 * hi)
+        for column, name in enumerate(['a', 'b']):
+            stats = indeks.range_stats(str(path), name, start, end)
+            window = expected(values[:, column], lo, hi)
+            assert stats['count'] == len(window)
+            if len(window) == 0:
+                continue
+            assert stats['min'] == window.min()
+            assert stats['max'] == window.max()
+            assert np.isclose(stats['mean'], window.mean(), rtol=1e-9, atol=1e-6)
+            assert np.isclose(stats['var'], window.var(), rtol=1e-6, atol=1e-6)
+
+
+def test_range_stats_match_numpy_as_the_file_grows(tmp_path):
+    rng = np.random.default_rng(0)
+    values = np.column_stack([
+        20 + np.cumsum(rng.normal(0, 0.1, size=3000)),
+        rng.normal(1000, 5, size=3000),
+    ])
+    values[rng.random(values.shape) < 0.02] = np.nan
+    path = tmp_path / 'data.csv'
+    path.write_text('Timestamp,a,b\n')
+
+    # Built in several increments, each followed by queries over everything so far
+    for first, last in [(0, 1), (1, 700), (700, 701), (701, 3000)]:
+        append_rows(path, values[first:last], first)
+        check(path, values[:last], rng, queries=50)
+
+
+def test_range_outside_the_data(tmp_path):
+    path = tmp_path / 'data.csv'
+    path.write_text('Timestamp,a,b\n')
+    append_rows(path, np.ones((10, 2)), 0)
+    stats = indeks.range_stats(str(path), 'a', START - timedelta(days=2), START - timedelta(days=1))
+    assert stats['count'] == 0 and stats['mean'] is None
+    stats = indeks.range_stats(str(path), 'a')
+    assert stats['count'] == 10 and stats['min'] == stats['max'] == 1.0
+
+
+def whole_range(path, values):
+    stats = indeks.range_stats(str(path), 'a')
+    window = expected(values[:, 0], 0, len(values) - 1)
+    assert stats['count'] == len(window)
+    assert stats['min'] == window.min() and stats['max'] == window.max()
+    assert np.isclose(stats['mean'], window.mean(), rtol=1e-9, atol=1e-6)
+
+
+def test_rebuilds_after_retention_compaction(tmp_path):
+    from wspolne import retencja
+
+    rng = np.random.default_rng(1)
+    values = rng.normal(0, 1, size=(5000, 2))
+    path = tmp_path / 'data.csv'
+    path.write_text('Timestamp,a,b\n')
+    append_rows(path, values[:2000], 0)
+    whole_range(path, values[:2000])
+
+    # Expire the first 1500 rows, then append more than were ever indexed
+    with open(path, 'rb') as f:
+        lines = f.readlines()
+    header_len = len(lines[0])
+    retencja._compact(str(path), header_len, header_len + sum(len(l) for l in lines[1:1501]))
+    append_rows(path, values[2000:], 2000)
+    whole_range(path, values[1500:])
+
+
+def test_rebuilds_after_a_rewrite_in_place(tmp_path):
+    path = tmp_path / 'data.csv'
+    path.write_text('Timestamp,a,b\n')
+    append_rows(path, np.ones((100, 2)), 0)
+    whole_range(path, np.ones((100, 2)))
+
+    # Same inode, different rows
+    with open(path, 'w') as f:
+        f.write('Timestamp,a,b\n')
+    append_rows(path, np.full((300, 2), 2.0), 50)
+    whole_range(path, np.full((300, 2), 2.0))
+
+
+def test_reads_only_the_appended_bytes(tmp_path, monkeypatch):
+    path = tmp_path / 'data.csv'
+    path.write_text('Timestamp,a,b\n')
+    append_rows(path, np.ones((100, 2)), 0)
+    indeks.get_index(str(path))
+    size = path.stat().st_size
+
+    positions = []
+    read = indeks._csv_rows
+    monkeypatch.setattr(indeks, '_csv_rows', lambda p, position: positions.append(position) or read(p, position))
+    indeks._indexes.clear()
+    append_rows(path, np.full((10, 2), 3.0), 100)
+    stats = indeks.range_stats(str(path), 'a')
+    assert positions == [size]
+    assert stats['count'] == 110 and stats['max'] == 3.0
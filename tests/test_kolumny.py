@@ -0,0 +1,88 @@
+import os
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from wspolne import kolumny
+
+
+@pytest.fixture
+def warsaw(monkeypatch):
+    # Local time with a DST switch, 2024-03-31 02:00 -> 03:00
+    monkeypatch.setenv('TZ', 'Europe/Warsaw')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+STAMPS = [datetime(2024, 3, 31, 1, 0) + timedelta(minutes=30 * i) for i in range(2)] + \
+         [datetime(2024, 3, 31, 3, 0) + timedelta(minutes=30 * i) for i in range(3)]
+
+
+def test_stores_epoch_and_maps_wall_clock(tmp_path, warsaw):
+    path = str(tmp_path / 'environmental_data.csv')
+    writer = kolumny.ColumnWriter(path, ['Temperature_C', 'Humidity_%'])
+    for i, stamp in enumerate(STAMPS):
+        writer.write(stamp, [20.0 + i, None])
+    writer.close()
+
+    assert kolumny.read_meta(path)['timestamp'] == 'int64 epoch ns'
+    raw = np.fromfile(os.path.join(kolumny.store_path(path), kolumny.TIMESTAMP_FILE), dtype='<i8')
+    assert raw.tolist() == [int(s.timestamp()) * 1_000_000_000 for s in STAMPS]
+    # Half an hour apart in real time across the switch
+    assert np.diff(raw).tolist() == [1_800_000_000_000] * 4
+
+    timestamps, values = kolumny.open_columns(path)
+    assert timestamps.tolist() == pd.to_datetime(STAMPS).astype('datetime64[ns]').asi8.tolist()
+    assert values['Temperature_C'].tolist() == [20.0, 21.0, 22.0, 23.0, 24.0]
+    assert np.isnan(values['Humidity_%']).all()
+
+    df = kolumny.frame(path, ['Temperature_C'])
+    assert list(df.columns) == ['Timestamp', 'Temperature_C']
+    assert df['Timestamp'].tolist() == STAMPS
+
+
+def test_import_csv_matches_the_parsed_csv(tmp_path, warsaw):
+    source = tmp_path / 'light_readings.csv'
+    source.write_text('Timestamp,Light_Level_lx\n' + ''.join(
+        f"{stamp:%Y-%m-%d %H:%M:%S},{i}.50\n" for i, stamp in enumerate(STAMPS)))
+
+    kolumny.import_csv(str(source))
+
+    timestamps, values = kolumny.open_columns(str(source))
+    df = pd.read_csv(source, parse_dates=['Timestamp'])
+    assert timestamps.tolist() == df['Timestamp'].astype('datetime64[ns]').astype('int64').tolist()
+    assert values['Light_Level_lx'].tolist() == df['Light_Level_lx'].tolist()
+
+
+def test_partial_row_is_dropped(tmp_path):
+    path = str(tmp_path / 'light_readings.csv')
+    writer = kolumny.ColumnWriter(path, ['Light_Level_lx'])
+    writer.write(STAMPS[0], [1.5])
+    writer.close()
+    # Value written, timestamp (the commit) never was
+    with open(os.path.join(kolumny.store_path(path), 'c0.f32'), 'ab') as f:
+        f.write(np.float32(2.5).tobytes())
+    assert len(kolumny.open_columns(path)[0]) == 1
+
+    writer = kolumny.ColumnWriter(path, ['Light_Level_lx'])
+    writer.write(STAMPS[1], [3.5])
+    writer.close()
+    assert kolumny.open_columns(path)[1]['Light_Level_lx'].tolist() == [1.5, 3.5]
+
+
+def test_range_stats_take_wall_clock_bounds(tmp_path, warsaw):
+    from wspolne import indeks
+
+    path = str(tmp_path / 'environmental_data.csv')
+    writer = kolumny.ColumnWriter(path, ['Temperature_C'])
+    for i, stamp in enumerate(STAMPS):
+        writer.write(stamp, [20.0 + i])
+    writer.close()
+
+    stats = indeks.range_stats(path, 'Temperature_C', STAMPS[1], STAMPS[3])
+    assert (stats['count'], stats['min'], stats['max']) == (3, 21.0, 23.0)
@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from wspolne import kompresja
+
+
+class ListSink:
+    def __init__(self):
+        self.rows = []
+
+    def write(self, timestamp, values):
+        self.rows.append((timestamp, list(values)))
+
+    def close(self):
+        pass
+
+
+def compress(values, **options):
+    sink = ListSink()
+    compressing = kompresja.CompressingSink(sink, **options)
+    start = datetime(2024, 11, 14)
+    times = [start + timedelta(seconds=10 * i) for i in range(len(values))]
+    for t, v in zip(times, values):
+        compressing.write(t, [v])
+    compressing.close()
+    seconds = np.array([t.timestamp() for t in times])
+    stored_t = np.array([t.timestamp() for t, _ in sink.rows])
+    stored_v = np.array([v[0] for _, v in sink.rows])
+    return seconds, stored_t, stored_v
+
+
+def signal(n=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    trend = np.cumsum(rng.normal(0, 0.02, size=n))
+    return 20 + trend + np.where(rng.random(n) < 0.01, rng.normal(0, 1, size=n), 0)
+
+
+@pytest.mark.parametrize('method, reconstruct', [
+    (kompresja.SWINGING_DOOR, 'linear'),
+    (kompresja.DEADBAND, 'hold'),
+])
+@pytest.mark.parametrize('error', [0.01, 0.1, 0.5])
+def test_reconstruction_stays_within_error(method, reconstruct, error):
+    values = signal()
+    seconds, stored_t, stored_v = compress(values, method=method, error=[error])
+    assert len(stored_t) < len(values)
+    rebuilt = kompresja.reconstruct(stored_t, stored_v, seconds, method=reconstruct)
+    assert np.max(np.abs(rebuilt - values)) <= error + 1e-9
+
+
+@pytest.mark.parametrize('method', [kompresja.SWINGING_DOOR, kompresja.DEADBAND])
+def test_heartbeat_on_a_flat_signal(method):
+    seconds, stored_t, _ = compress(np.full(500, 20.0), method=method, error=[0.1], heartbeat=600)
+    assert stored_t[0] == seconds[0] and stored_t[-1] <= seconds[-1]
+    assert np.max(np.diff(stored_t)) <= 600
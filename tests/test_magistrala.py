@@ -0,0 +1,165 @@
+import pytest
+
+from wspolne.magistrala import TimerWheel
+
+
+def fire_ticks(period, slots=128, tick=0.1, advances=1000):
+    wheel = TimerWheel(tick=tick, slots=slots)
+    fired = []
+    wheel.schedule(period, lambda: fired.append(wheel.ticks), delay=0)
+    for _ in range(advances):
+        wheel.advance()
+    return fired
+
+
+@pytest.mark.parametrize('turns', [1, 2, 3])
+def test_period_of_whole_turns(turns):
+    # 12.8 s on 128 x 0.1 s used to fire at 0, 256, 512
+    period_ticks = turns * 128
+    fired = fire_ticks(period_ticks * 0.1)
+    assert fired == list(range(0, 1000, period_ticks))
+
+
+@pytest.mark.parametrize('period_ticks', [1, 5, 127, 129, 130, 300])
+def test_period_not_a_multiple_of_the_wheel(period_ticks):
+    fired = fire_ticks(period_ticks * 0.1)
+    assert fired == list(range(0, 1000, period_ticks))
+
+
+def test_delay_of_whole_turns():
+    wheel = TimerWheel(tick=0.1, slots=16)
+    fired = []
+    wheel.schedule(1.0, lambda: fired.append(wheel.ticks), delay=3.2)
+    for _ in range(100):
+        wheel.advance()
+    assert fired[:3] == [32, 42, 52]
+
+
+class Recorder:
+    """Sink router stand-in keeping the written rows per series"""
+
+    def __init__(self):
+        self.rows = {}
+
+    def register(self, series, path, headers, decimals=None, **options):
+        self.rows[series] = []
+
+    def write(self, series, timestamp, values):
+        self.rows[series].append((timestamp, values))
+
+
+class Converting:
+    """Sensor whose conversion takes `conversion` seconds of the clock"""
+
+    def __init__(self, name, conversion, clock, log):
+        self.name = name
+        self.filename = f"{name}.csv"
+        self.headers = ['Timestamp', f"{name}_value"]
+        self.decimals = [2]
+        self.conversion = conversion
+        self.clock = clock
+        self.log = log
+
+    def start(self):
+        self.started = self.clock.monotonic()
+        return self.conversion
+
+    def collect(self):
+        assert self.clock.monotonic() >= self.started + self.conversion
+        self.log.append(self.name)
+        return [self.conversion]
+
+
+def test_conversions_overlap():
+    from wspolne.magistrala import Daemon, SharedBus
+    from wspolne.symulacja import SimClock
+
+    clock = SimClock(start=1_700_000_000)
+    router = Recorder()
+    daemon = Daemon(SharedBus(device=object()), router, clock=clock)
+    collected = []
+    for name, conversion in [('bme280', 0.04), ('bh1750', 0.18), ('ads1115', 0.008)]:
+        daemon.add(Converting(name, conversion, clock, collected), 10, delay=0)
+
+    daemon.wheel.anchor()
+    daemon.wheel.advance()
+    daemon.sample_due()
+
+    # One slowest conversion, not the sum, and collected as each is ready
+    assert daemon.last_batch_time == pytest.approx(0.18)
+    assert collected == ['ads1115', 'bme280', 'bh1750']
+    stamps = {rows[0][0] for rows in router.rows.values()}
+    assert len(stamps) == 1
+
+
+class Named:
+    def __init__(self, name, headers, decimals):
+        self.name = name
+        self.headers = headers
+        self.decimals = decimals
+
+
+LIGHT = Named('light', ['Timestamp', 'Light_Level_lx'], [2])
+ENVIRONMENT = Named('environment', ['Timestamp', 'Temperature_C', 'Humidity_%'], [2, 2])
+AIR = Named('air_quality', ['Timestamp', 'Humidity_%'], [None])
+
+
+def test_tick_records_headers_prefix_clashes_only():
+    from wspolne.magistrala import TickRecords
+
+    records = TickRecords()
+    for sensor in (LIGHT, ENVIRONMENT, AIR):
+        records.add(sensor, 1)
+    assert records.headers() == ['Timestamp', 'Light_Level_lx', 'Temperature_C',
+                                 'environment_Humidity_%', 'air_quality_Humidity_%']
+    assert records.decimals() == [2, 2, 2, None]
+    with pytest.raises(ValueError):
+        TickRecords('previous')
+
+
+@pytest.mark.parametrize('fill, expected', [
+    ('null', [[1.0, 20.0, 40.0], [2.0, None, None], [3.0, None, None],
+              [4.0, 21.0, 41.0], [5.0, None, None], [6.0, None, None], [7.0, None, None]]),
+    # Repeated until the next scheduled read, a failed one (tick 6) stays empty
+    ('carry', [[1.0, 20.0, 40.0], [2.0, 20.0, 40.0], [3.0, 20.0, 40.0],
+               [4.0, 21.0, 41.0], [5.0, 21.0, 41.0], [6.0, 21.0, 41.0], [7.0, None, None]]),
+])
+def test_tick_records_fill(fill, expected):
+    from wspolne.magistrala import TickRecords
+
+    records = TickRecords(fill)
+    records.add(LIGHT, 1)
+    records.add(ENVIRONMENT, 3)
+    rows = []
+    for tick in range(7):
+        readings = {'light': [float(tick + 1)]}
+        if tick in (0, 3):
+            readings['environment'] = [20.0 + tick // 3, 40.0 + tick // 3]
+        rows.append(records.row(tick, readings))
+    assert rows == expected
+
+
+class Failing(Converting):
+    def collect(self):
+        raise OSError(121, 'Remote I/O error')
+
+
+def test_daemon_writes_one_combined_row_per_tick():
+    from wspolne.magistrala import COMBINED, CARRY, Daemon, SharedBus
+    from wspolne.symulacja import SimClock
+
+    clock = SimClock(start=1_700_000_000)
+    router = Recorder()
+    daemon = Daemon(SharedBus(device=object()), router, clock=clock)
+    daemon.add(Converting('bme280', 0.04, clock, []), 10, delay=0)
+    daemon.add(Failing('bh1750', 0.18, clock, []), 10, delay=0)
+    daemon.combine('combined_readings.csv', CARRY)
+
+    daemon.wheel.anchor()
+    daemon.wheel.advance()
+    daemon.sample_due()
+
+    assert daemon.errors == {'bme280': 0, 'bh1750': 1}
+    (timestamp, values), = router.rows[COMBINED]
+    assert values == [0.04, None]
+    assert timestamp == router.rows['bme280'][0][0]
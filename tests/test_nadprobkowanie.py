@@ -0,0 +1,44 @@
+import time
+
+import numpy as np
+
+from wspolne.bufor import RingBuffer, summarize
+from wspolne.nadprobkowanie import ContinuousSampler
+
+
+def test_ring_buffer_keeps_the_newest_samples_in_order():
+    ring = RingBuffer(4)
+    for value in range(6):
+        ring.append(value)
+    assert len(ring) == 4
+    assert ring.values().tolist() == [2, 3, 4, 5]
+    ring.clear()
+    assert ring.overwritten == 2 and len(ring) == 0
+
+
+def test_summarize():
+    stats = summarize(np.array([1.0, 2.0, 3.0, 6.0]))
+    assert stats == {'mean': 3.0, 'min': 1.0, 'max': 6.0, 'std': np.std([1, 2, 3, 6]), 'count': 4}
+    assert summarize(np.empty(0))['count'] == 0
+
+
+def test_reduce_summarises_every_conversion_of_the_interval():
+    samples = iter(range(1_000_000))
+
+    def read():
+        value = next(samples)
+        if value % 10 == 9:
+            raise OSError('I2C error')
+        return float(value % 10)
+
+    sampler = ContinuousSampler(read, rate=2000, interval=0.05).start()
+    time.sleep(0.04)
+    sampler.stop()
+    first = sampler.reduce()
+    second = sampler.reduce()
+
+    # Nine good conversions out of ten, values 0..8
+    assert first['count'] > 10
+    assert sampler.errors * 9 >= first['count'] - 9
+    assert (first['min'], first['max']) == (0.0, 8.0)
+    assert second['count'] == 0
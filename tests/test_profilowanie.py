@@ -0,0 +1,84 @@
+import threading
+import time
+
+import pytest
+
+from wspolne import profilowanie
+
+
+class FlakyDevice:
+    """smbus-like handle whose reads fail `failures` times in a row"""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.lock = threading.Lock()
+
+    def read_byte_data(self, address, register):
+        with self.lock:
+            if self.failures:
+                self.failures -= 1
+                raise OSError(121, 'Remote I/O error')
+        return register
+
+    def close(self):
+        pass
+
+
+def test_retries_and_counts_failed_attempts():
+    bus = profilowanie.ProfiledBus(FlakyDevice(failures=2), retries=2, retry_delay=0)
+    assert bus.read_byte_data(0x23, 7) == 7
+    stats = bus.stats[(0x23, 'read_byte_data')]
+    assert (stats['errors'], stats['retries'], stats['latency'].count) == (2, 2, 3)
+
+    bus.device.failures = 1
+    bus.retries = 0
+    with pytest.raises(OSError):
+        bus.read_byte_data(0x23, 7)
+    assert (stats['errors'], stats['retries']) == (3, 2)
+    assert '0x23 read_byte_data' in bus.report()
+
+
+def test_error_counts_from_many_threads():
+    device = FlakyDevice(failures=4000)
+    bus = profilowanie.ProfiledBus(device, retries=10 ** 6, retry_delay=0)
+    threads = [threading.Thread(target=lambda: [bus.read_byte_data(0x76, 1) for _ in range(10)])
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = bus.stats[(0x76, 'read_byte_data')]
+    assert stats['errors'] == stats['retries'] == 4000
+    assert stats['latency'].count == 4000 + 80
+
+
+@pytest.fixture
+def reporter(monkeypatch):
+    buses = []
+    monkeypatch.setattr(profilowanie, '_buses', buses)
+    monkeypatch.setattr(profilowanie, '_reporter', None)
+    monkeypatch.setattr(profilowanie, 'install_signal_handler', lambda: None)
+    yield
+    # The reporter thread stays, without buses it goes quiet
+    buses.clear()
+    profilowanie._wakeup.set()
+
+
+def test_every_bus_keeps_its_own_interval(reporter, capsys):
+    slow = profilowanie.profile(FlakyDevice(), interval=60)
+    quiet = profilowanie.profile(FlakyDevice(), interval=None)
+    fast = profilowanie.profile(FlakyDevice(), interval=0.05)
+    slow.read_byte_data(0x23, 1)
+    quiet.read_byte_data(0x76, 1)
+    fast.read_byte_data(0x48, 1)
+
+    time.sleep(0.3)
+    out = capsys.readouterr().out
+    # The later, shorter interval took effect; no report without one
+    assert out.count('ads1115 0x48') >= 3
+    assert 'bh1750' not in out and 'bme280' not in out
+
+    profilowanie.request_report()
+    time.sleep(0.1)
+    out = capsys.readouterr().out
+    assert 'bh1750 0x23' in out and 'bme280 0x76' in out
@@ -0,0 +1,95 @@
+import csv
+import gzip
+import json
+import os
+
+import pytest
+
+from wspolne import przesyl
+
+
+def records(spool):
+    return [record[0] for record in spool.read(100)]
+
+
+def test_spool_replays_from_the_acked_cursor(tmp_path):
+    spool = przesyl.Spool(str(tmp_path), 'light', ['Timestamp', 'Light_Level_lx'])
+    for i in range(5):
+        spool.append([f'2024-01-01 00:00:0{i}', f'{i}.00'])
+    # Batched, nothing reaches the file until the forwarder reads
+    assert os.path.getsize(spool.segments[0][1]) == 0
+    assert records(spool) == [1, 2, 3, 4, 5]
+
+    spool.ack(3)
+    assert spool.pending() == 2
+    assert records(spool) == [4, 5]
+    spool.close()
+
+    # After a restart only the unacknowledged rows go out again
+    spool = przesyl.Spool(str(tmp_path), 'light', ['Timestamp', 'Light_Level_lx'])
+    assert spool.acked == 3
+    assert records(spool) == [4, 5]
+    spool.append(['2024-01-01 00:00:05', '5.00'])
+    assert spool.read(100)[-1] == [6, '2024-01-01 00:00:05', '5.00']
+    spool.close()
+
+
+def test_spool_drops_acknowledged_segments(tmp_path, monkeypatch):
+    monkeypatch.setattr(przesyl, 'SEGMENT_RECORDS', 2)
+    spool = przesyl.Spool(str(tmp_path), 'light', ['Timestamp', 'Light_Level_lx'])
+    for i in range(5):
+        spool.append([str(i), '1.00'])
+    assert len(spool.segments) == 3
+
+    spool.ack(4)
+    assert [first for first, _ in spool.segments] == [5]
+    assert sorted(os.listdir(tmp_path)) == ['000000000005.log', 'cursor']
+    assert records(spool) == [5]
+    spool.close()
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    serwer = pytest.importorskip('serwer')
+    # The first request creates the voltage CSV in the working directory
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(serwer, 'INGEST_DIR', str(tmp_path))
+    monkeypatch.setattr(serwer, 'ingest_cursors', {})
+    return serwer
+
+
+def post(client, records, allow_gap=False):
+    payload = {'source': 'pi', 'series': 'light', 'headers': ['Timestamp', 'Light_Level_lx'],
+               'allow_gap': allow_gap, 'records': records}
+    body = gzip.compress(json.dumps(payload).encode('utf-8'))
+    response = client.post('/ingest', data=body, headers={
+        'Content-Type': 'application/json', 'Content-Encoding': 'gzip'})
+    return response.status_code, response.get_json()['cursor']
+
+
+def test_ingest_refuses_gaps_and_skips_duplicates(server):
+    client = server.app.test_client()
+    rows = {seq: [seq, f'2024-01-01 00:00:{seq:02d}', f'{seq}.00'] for seq in range(1, 7)}
+
+    assert post(client, [rows[1], rows[2], rows[3]]) == (200, 3)
+    # Row 4 is missing, the client has to resend from the cursor
+    assert post(client, [rows[5]]) == (409, 3)
+    # Lost ack: 2 and 3 again, only 4 and 5 are new
+    assert post(client, [rows[2], rows[3], rows[4], rows[5]]) == (200, 5)
+    assert client.get('/ingest/cursor?source=pi&series=light').get_json() == {'cursor': 5}
+
+    with open(server.ingest_path('pi', 'light'), newline='') as f:
+        stored = list(csv.reader(f))
+    assert stored[0] == ['Timestamp', 'Light_Level_lx', 'seq']
+    assert [row[-1] for row in stored[1:]] == ['1', '2', '3', '4', '5']
+
+    # The cursor survives a restart, read back from the file
+    server.ingest_cursors.clear()
+    assert post(client, [rows[6]]) == (200, 6)
+
+
+def test_ingest_records_a_gap_the_spool_cannot_fill(server, capsys):
+    client = server.app.test_client()
+    assert post(client, [[1, 't1', '1.00']]) == (200, 1)
+    assert post(client, [[4, 't4', '4.00']], allow_gap=True) == (200, 4)
+    assert 'Ingest gap pi/light: 2..3 missing' in capsys.readouterr().out
@@ -0,0 +1,84 @@
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from wspolne import rekordy
+
+CSV = """Timestamp,Temperature_C,Temperature_F,Pressure_hPa,Humidity_%
+2024-11-14 08:46:07,22.02,71.64,1004.99,42.24
+2024-11-14 08:46:17,22.03,71.65,1004.98,42.31
+2024-11-14 08:46:27,22.05,71.69,1005.01,
+2024-11-14 08:46:37,21.99,71.58,1004.97,42.18
+"""
+
+
+def test_csv_round_trip(tmp_path):
+    source = tmp_path / 'environmental_data.csv'
+    source.write_text(CSV)
+
+    log = rekordy.import_csv(str(source))
+    header, records = rekordy.open_records(str(source))
+    assert header['channels'] == CSV.splitlines()[0].split(',')[1:]
+    assert len(records) == 4
+    assert np.isnan(records['c3'][2])
+
+    exported = rekordy.export_csv(log, str(tmp_path / 'exported.csv'))
+    with open(exported) as f:
+        assert f.read().replace('\r\n', '\n') == CSV
+
+
+def test_partial_record_is_ignored_and_dropped(tmp_path):
+    source = tmp_path / 'light_readings.csv'
+    source.write_text("Timestamp,Light_Level_lx\n2024-11-14 08:46:07,120.50\n")
+    log = rekordy.import_csv(str(source))
+    with open(log, 'ab') as f:
+        f.write(b'\x01\x02\x03')
+    _, records = rekordy.open_records(str(source))
+    assert len(records) == 1
+
+    writer = rekordy.RecordWriter(str(source), ['Light_Level_lx'])
+    writer.write(datetime(2024, 11, 14, 8, 46, 17), [1.5])
+    writer.close()
+    _, records = rekordy.open_records(str(source))
+    assert records['c0'].tolist() == [120.5, 1.5]
+
+
+@pytest.fixture
+def warsaw(monkeypatch):
+    # Local time with a DST switch, 2024-03-31 02:00 -> 03:00
+    monkeypatch.setenv('TZ', 'Europe/Warsaw')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+STAMPS = [datetime(2024, 3, 31, 1, 0) + timedelta(minutes=30 * i) for i in range(2)] + \
+         [datetime(2024, 3, 31, 3, 0) + timedelta(minutes=30 * i) for i in range(3)]
+
+
+def test_stores_epoch_and_maps_wall_clock(tmp_path, warsaw):
+    path = str(tmp_path / 'environmental_data.csv')
+    writer = rekordy.RecordWriter(path, ['Temperature_C'])
+    for i, stamp in enumerate(STAMPS):
+        writer.write(stamp, [20.0 + i])
+    writer.close()
+
+    header, records = rekordy.open_records(path)
+    assert header['timestamp'] == 'int64 epoch us'
+    assert records['t'].tolist() == [int(s.timestamp()) * 1_000_000 for s in STAMPS]
+    # Half an hour apart in real time across the switch
+    assert np.diff(records['t']).tolist() == [1_800_000_000] * 4
+
+    timestamps, _ = rekordy.open_columns(path)
+    assert timestamps.tolist() == pd.to_datetime(STAMPS).astype('datetime64[ns]').asi8.tolist()
+    assert rekordy.frame(path)['Timestamp'].tolist() == STAMPS
+    assert rekordy.find(path, STAMPS[2]) == 2
+
+    # The CSV round trip keeps the wall-clock stamps
+    exported = rekordy.export_csv(path, str(tmp_path / 'exported.csv'))
+    rekordy.import_csv(exported)
+    assert rekordy.open_records(exported)[1]['t'].tolist() == records['t'].tolist()
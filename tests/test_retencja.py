@@ -0,0 +1,108 @@
+import csv
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from wspolne import gorilla, kolumny, rekordy, retencja
+
+NOW = datetime(2024, 11, 30, 12, 0, 0)
+POLICY = {'raw_days': 30, 'rollups': [(retencja.HOUR, None)]}
+
+
+@pytest.fixture(autouse=True)
+def compact_at_once(monkeypatch):
+    monkeypatch.setattr(retencja, 'COMPACT_MIN_BYTES', 0)
+    monkeypatch.setattr(retencja, 'COMPACT_MIN_FRACTION', 0.0)
+
+
+def write_csv(path, start, hours, step=timedelta(minutes=30), header=('Timestamp', 'Light_Level_lx')):
+    new_file = not path.exists()
+    with open(path, 'a', newline='') as f:
+        writer = csv.writer(f)
+        if new_file:
+            writer.writerow(header)
+        t = start
+        while t < start + timedelta(hours=hours):
+            writer.writerow([t.strftime('%Y-%m-%d %H:%M:%S'), '1.00'])
+            t += step
+
+
+def read_rows(path):
+    with open(path, newline='') as f:
+        return list(csv.reader(f))
+
+
+def test_expires_raw_rows_after_rolling_them_up(tmp_path):
+    path = tmp_path / 'light_readings.csv'
+    write_csv(path, NOW - timedelta(days=40), 40 * 24)
+
+    retencja.enforce(str(path), POLICY, NOW)
+
+    rows = read_rows(path)
+    assert rows[0] == ['Timestamp', 'Light_Level_lx']
+    first = datetime.fromisoformat(rows[1][0])
+    assert NOW - timedelta(days=30) <= first < NOW - timedelta(days=30) + timedelta(hours=1)
+    hourly = read_rows(retencja.rollup_path(str(path), retencja.HOUR))
+    # Every closed hour of the 40 days, two samples each; the last one is still open
+    assert len(hourly) - 1 == 40 * 24 - 1
+    assert {row[1] for row in hourly[1:]} == {'2'}
+
+    # Incremental: only the new rows are read, the open hour carries over
+    write_csv(path, NOW, 2)
+    retencja.enforce(str(path), POLICY, NOW)
+    hourly = read_rows(retencja.rollup_path(str(path), retencja.HOUR))
+    assert len(hourly) - 1 == 40 * 24 + 1
+    assert {row[1] for row in hourly[1:]} == {'2'}
+
+
+def test_keeps_the_newest_row(tmp_path):
+    root = tmp_path
+    path = root / 'ingest' / 'pi' / 'light.csv'
+    path.parent.mkdir(parents=True)
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Timestamp', 'Light_Level_lx', 'seq'])
+        for seq in range(1, 101):
+            stamp = NOW - timedelta(days=60) + timedelta(minutes=seq)
+            writer.writerow([stamp.isoformat(), '1.00', seq])
+
+    retencja.enforce_all({'ingest/*/*.csv': {'raw_days': 30, 'rollups': []}}, str(root), NOW)
+
+    rows = read_rows(path)
+    assert rows[0] == ['Timestamp', 'Light_Level_lx', 'seq']
+    assert [row[-1] for row in rows[1:]] == ['100']
+
+
+def test_expires_binary_stores(tmp_path):
+    path = tmp_path / 'environmental_data.csv'
+    stamps = [NOW - timedelta(days=40) + timedelta(hours=i) for i in range(40 * 24)]
+    cutoff = NOW - timedelta(days=30)
+    kept = sum(t >= cutoff for t in stamps)
+
+    records = rekordy.RecordWriter(str(path), ['Temperature_C'])
+    columns = kolumny.ColumnWriter(str(path), ['Temperature_C'])
+    blocks = gorilla.GorillaWriter(gorilla.block_path(str(path)), ['Temperature_C'], block_size=24)
+    for i, t in enumerate(stamps):
+        records.write(t, [float(i)])
+        columns.write(t, [float(i)])
+        blocks.write(int(t.timestamp() * 1_000_000), [float(i)])
+    blocks.close()
+
+    retencja.enforce(str(path), POLICY, NOW)
+
+    # The open writers follow the swapped files
+    records.write(NOW, [-1.0])
+    columns.write(NOW, [-1.0])
+    records.close()
+    columns.close()
+
+    _, mapped = rekordy.open_records(str(path))
+    assert mapped['c0'].tolist() == list(range(len(stamps) - kept, len(stamps))) + [-1.0]
+    _, values = kolumny.open_columns(str(path))
+    assert values['Temperature_C'].tolist() == mapped['c0'].tolist()
+    # Whole blocks of a day go, the one holding the cutoff stays
+    timestamps, values = gorilla.read(gorilla.block_path(str(path)))
+    assert values['Temperature_C'][0] == len(stamps) - kept - (len(stamps) - kept) % 24
+    assert np.all(np.diff(timestamps) > 0)
+    assert values['Temperature_C'][-1] == len(stamps) - 1
@@ -0,0 +1,61 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from wspolne import magazyn, segmenty, zapis
+
+HEADERS = ['Timestamp', 'Light_Level_lx']
+START = datetime(2024, 11, 14, 22, 0, 0)
+
+
+def write_days(path, days, compress=False):
+    sink = segmenty.RotatingSink(magazyn.CsvSink, path, HEADERS, period='day', compress=compress)
+    for hour in range(days * 24):
+        sink.write(START + timedelta(hours=hour), [float(hour)])
+    sink.close()
+    return sink
+
+
+def test_rotates_per_day_and_loads_a_range(tmp_path):
+    path = str(tmp_path / 'light_readings.csv')
+    sink = write_days(path, 3)
+
+    closed = segmenty.read_manifest(path)['segments']
+    assert sink.rotations == 3
+    assert [segment['file'] for segment in closed] == [
+        '2024-11-14_220000.csv', '2024-11-15_000000.csv', '2024-11-16_000000.csv']
+    with open(path) as f:
+        assert f.readline().strip() == ','.join(HEADERS)
+        assert f.readline().startswith('2024-11-17 00:00:00')
+
+    segmenty.compress_segment(path, closed[1]['file'])
+    closed = segmenty.read_manifest(path)['segments']
+    assert closed[1]['file'] == '2024-11-15_000000.csv.gz'
+
+    start, end = datetime(2024, 11, 15, 23, 0), datetime(2024, 11, 16, 1, 0)
+    assert [os.path.basename(name) for name in segmenty.segments(path, start, end)] == [
+        '2024-11-15_000000.csv.gz', '2024-11-16_000000.csv', 'light_readings.csv']
+    data = segmenty.load_range(path, start, end)
+    assert data['Light_Level_lx'].tolist() == [25.0, 26.0, 27.0]
+
+
+def test_expire_waits_for_the_manifest_lock(tmp_path):
+    path = str(tmp_path / 'light_readings.csv')
+    write_days(path, 3)
+    removed = []
+
+    with zapis.append_lock(segmenty.manifest_path(path), exclusive=True):
+        # Another process rewriting the manifest, expire() must not interleave
+        thread = threading.Thread(target=lambda: removed.append(
+            segmenty.expire(path, datetime(2024, 11, 16))))
+        thread.start()
+        time.sleep(0.2)
+        assert removed == []
+    thread.join()
+
+    assert removed[0] > 0
+    assert [segment['file'] for segment in segmenty.read_manifest(path)['segments']] == [
+        '2024-11-16_000000.csv']
+    assert sorted(os.listdir(segmenty.segments_dir(path))) == [
+        '2024-11-16_000000.csv', 'manifest.json', 'manifest.json.lock']
@@ -0,0 +1,57 @@
+import numpy as np
+
+from wspolne import serie
+
+HEADER = 'timestamp,device_id,raw_value,voltage\n'
+
+
+def device_rows(series, device_id):
+    # Same lookup as serwer.read_csv_data
+    timestamps, values = series.view()
+    labels = series.labels('device_id')
+    if device_id not in labels:
+        return []
+    return series.rows(np.flatnonzero(values['device_id'] == labels.index(device_id)))
+
+
+def test_header_only_file_then_numeric_device_ids(tmp_path):
+    # serwer.init_csv writes the header alone before the first reading
+    path = tmp_path / 'voltage_readings_server.csv'
+    path.write_text(HEADER)
+    assert serie.get_series(str(path)).count == 0
+
+    with open(path, 'a') as f:
+        f.write('2024-11-14T08:46:07,1,17000,2.125\n')
+        f.write('2024-11-14T08:46:17,2,17100,2.137\n')
+        f.write('2024-11-14T08:46:27,1,17200,2.150\n')
+    series = serie.get_series(str(path))
+    assert 'device_id' in series.text_columns
+    assert [row['raw_value'] for row in device_rows(series, '1')] == ['17000', '17200']
+    assert [row['voltage'] for row in device_rows(series, '2')] == ['2.137']
+    assert device_rows(series, '3') == []
+
+
+def test_numeric_column_turning_text_is_parsed_again(tmp_path):
+    path = tmp_path / 'data.csv'
+    path.write_text('Timestamp,label,value\n2024-11-14 08:46:07,10,1.5\n')
+    series = serie.get_series(str(path))
+    assert 'label' not in series.text_columns
+
+    with open(path, 'a') as f:
+        f.write('2024-11-14 08:46:17,kitchen,2.5\n')
+    series = serie.get_series(str(path))
+    assert 'label' in series.text_columns
+    rows = series.rows(np.arange(series.count))
+    assert [row['label'] for row in rows] == ['10', 'kitchen']
+    assert [row['value'] for row in rows] == ['1.5', '2.5']
+
+
+def test_partial_last_row_waits_for_its_newline(tmp_path):
+    path = tmp_path / 'data.csv'
+    path.write_text('Timestamp,value\n2024-11-14 08:46:07,1.5\n2024-11-14 08:46')
+    assert serie.get_series(str(path)).count == 1
+    with open(path, 'a') as f:
+        f.write(':17,2.5\n')
+    series = serie.get_series(str(path))
+    assert series.count == 2
+    assert series.rows([1])[0]['value'] == '2.5'
@@ -0,0 +1,91 @@
+import time
+
+import pytest
+
+from wspolne import skaner
+
+CONVERSION = 0.02
+
+
+class FakeADC:
+    """Converter whose results are ready CONVERSION seconds after start()"""
+
+    def __init__(self, address, log, failing=()):
+        self.address = address
+        self.log = log
+        self.failing = failing
+        self.mux = None
+
+    def start(self, channel, gain, data_rate):
+        self.mux = channel
+        self.started = time.monotonic()
+        self.log.append(('start', self.address, channel))
+        return CONVERSION
+
+    def collect(self):
+        assert time.monotonic() >= self.started + CONVERSION
+        self.log.append(('collect', self.address, self.mux))
+        if self.mux in self.failing:
+            raise OSError(f"No ACK from 0x{self.address:02x}")
+        return self.address + self.mux / 10
+
+
+def channels(*specs):
+    return [{'series': f"{address:x}/{channel}", 'address': address, 'channel': channel, 'interval': 10}
+            for address, channel in specs]
+
+
+def test_devices_convert_at_the_same_time():
+    log = []
+    devices = {0x48: FakeADC(0x48, log), 0x49: FakeADC(0x49, log)}
+    scanner = skaner.ChannelScanner(devices, channels((0x48, 0), (0x48, 1), (0x49, 0)))
+
+    started = time.monotonic()
+    results = scanner.scan()
+
+    # Two rounds: both devices, then the second channel of the first one
+    assert [entry[0] for entry in log] == ['start', 'start', 'collect', 'collect', 'start', 'collect']
+    assert time.monotonic() - started < 2.5 * CONVERSION
+    assert sorted(results) == [('48/0', 0x48), ('48/1', 0x48 + 0.1), ('49/0', 0x49)]
+
+
+def test_stays_on_the_current_mux_input():
+    log = []
+    device = FakeADC(0x48, log)
+    device.mux = 2
+    scanner = skaner.ChannelScanner({0x48: device}, channels((0x48, 0), (0x48, 2)))
+    scanner.scan()
+    assert [entry[2] for entry in log if entry[0] == 'start'] == [2, 0]
+
+
+def test_failed_reads_are_counted_per_channel(capsys):
+    log = []
+    devices = {0x48: FakeADC(0x48, log, failing=(1,))}
+    scanner = skaner.ChannelScanner(devices, channels((0x48, 0), (0x48, 1)))
+
+    now = time.monotonic()
+    for i in range(3):
+        results = scanner.scan(now + 10 * i)
+        assert results == [('48/0', 0x48)]
+        assert scanner.failed == {'48/1': 'No ACK from 0x48'}
+
+    assert capsys.readouterr().out == ''
+    assert (scanner.reads, scanner.errors) == (3, 3)
+    assert scanner.report() == '3 readings, 3 errors (48/1 3)'
+
+
+def test_only_due_channels_are_read():
+    log = []
+    specs = channels((0x48, 0), (0x48, 1))
+    specs[1]['interval'] = 30
+    scanner = skaner.ChannelScanner({0x48: FakeADC(0x48, log)}, specs)
+    now = time.monotonic()
+    counts = [len(scanner.scan(now + 10 * i)) for i in range(6)]
+    assert counts == [2, 1, 1, 2, 1, 1]
+
+
+def test_rejects_unknown_devices_and_inputs():
+    with pytest.raises(ValueError):
+        skaner.ChannelScanner({}, channels((0x48, 0)))
+    with pytest.raises(ValueError):
+        skaner.ChannelScanner({0x48: None}, channels((0x48, 4)))
@@ -0,0 +1,40 @@
+from datetime import datetime
+
+import pytest
+
+from wspolne import symulacja
+
+START = datetime(2024, 11, 14, 12, 0, 0)
+
+
+def readings(driver, count=20, **options):
+    clock, sensor = symulacja.simulate(driver, start=START, **options)
+    rows = []
+    for _ in range(count):
+        rows.append((clock.time(), sensor.read()))
+        clock.sleep(10)
+    return rows
+
+
+def test_same_seed_same_rows():
+    assert readings('bme280', seed=3) == readings('bme280', seed=3)
+    assert readings('bme280', seed=3) != readings('bme280', seed=4)
+
+
+def test_noise_scales_the_synthetic_signal():
+    clean = [values for _, values in readings('bme280', noise=0, jitter=0)]
+    noisy = [values for _, values in readings('bme280', noise=10, jitter=0)]
+    # Without noise the sine is the same whatever the seed
+    assert clean == [values for _, values in readings('bme280', noise=0, jitter=0, seed=9)]
+    spread = max(abs(a[0] - b[0]) for a, b in zip(clean, noisy))
+    assert 0 < spread < 5 * 10 * symulacja.SYNTHETIC['bme280']['noise'][0]
+
+
+def test_rejects_options_the_real_driver_lacks():
+    # Options of the real driver are taken and ignored
+    symulacja.SimBME280(None, oversampling=(16, 16, 16), iir_filter=4)
+    symulacja.SimBH1750(None, auto_range=True)
+    with pytest.raises(TypeError, match='oversampling'):
+        symulacja.SimBH1750(None, oversampling=(1, 1, 1))
+    with pytest.raises(TypeError, match='nosie'):
+        symulacja.simulate('ads1115', nosie=2.0)
@@ -0,0 +1,78 @@
+import threading
+from datetime import datetime
+
+import pytest
+
+from wspolne.bufor import SpscRing
+from wspolne.utrwalanie import BLOCK, DROP, BackgroundSink
+
+NOW = datetime(2024, 11, 14, 8, 46, 0)
+
+
+class StallingSink:
+    """Sink whose writes wait until `release` is set, like a stalled SD card"""
+
+    def __init__(self):
+        self.rows = []
+        self.release = threading.Event()
+        self.closed = False
+
+    def write(self, timestamp, values):
+        self.release.wait()
+        self.rows.append(values[0])
+
+    def close(self):
+        self.closed = True
+
+
+def test_spsc_ring_drops_when_full():
+    ring = SpscRing(2)
+    assert ring.push(1) and ring.push(2)
+    assert ring.full() and not ring.push(3)
+    assert ring.pop_batch() == [1, 2]
+    assert (ring.pushed, ring.dropped, ring.high_water) == (2, 1, 2)
+
+
+def test_every_row_is_written_in_order():
+    sink = StallingSink()
+    sink.release.set()
+    background = BackgroundSink(sink, capacity=8, batch=3, poll_interval=0.01)
+    for i in range(100):
+        background.write(NOW, [i])
+    background.close()
+    assert sink.rows == list(range(100))
+    assert sink.closed
+    assert background.written == 100 and background.ring.dropped == 0
+
+
+def test_full_ring_drops_rows_with_drop(capsys):
+    sink = StallingSink()
+    background = BackgroundSink(sink, capacity=4, batch=1, poll_interval=0.01, when_full=DROP)
+    results = [background.write(NOW, [i]) for i in range(20)]
+    sink.release.set()
+    background.close()
+
+    # The thread may hold one row out of the ring while it stalls
+    assert results.count(False) == background.ring.dropped >= 15
+    assert len(sink.rows) == 20 - background.ring.dropped
+    assert capsys.readouterr().out.count('dropping rows') == 1
+
+
+def test_full_ring_makes_the_producer_wait_with_block():
+    sink = StallingSink()
+    background = BackgroundSink(sink, capacity=4, batch=1, poll_interval=0.01, when_full=BLOCK)
+    timer = threading.Timer(0.1, sink.release.set)
+    timer.start()
+    results = [background.write(NOW, [i]) for i in range(20)]
+    background.close()
+    timer.join()
+
+    assert all(results)
+    assert sink.rows == list(range(20))
+    assert background.waits >= 1 and background.wait_time > 0.05
+    assert 'waits for room' in background.report()
+
+
+def test_rejects_unknown_policy():
+    with pytest.raises(ValueError):
+        BackgroundSink(StallingSink(), when_full='later')
@@ -0,0 +1,90 @@
+import os
+import threading
+import time
+
+import pytest
+
+from wspolne import zapis
+
+
+@pytest.fixture
+def writer(tmp_path):
+    writers = []
+
+    def open_writer(**options):
+        w = zapis.BufferedWriter(str(tmp_path / 'data.csv'), **options)
+        writers.append(w)
+        return w
+    yield open_writer
+    for w in writers:
+        w.close()
+
+
+def test_rows_wait_in_memory_until_max_bytes(writer, tmp_path):
+    w = writer(max_bytes=100, max_age=3600, block_size=64)
+    for i in range(9):
+        w.append(b'%09d\n' % i)
+    assert os.path.getsize(tmp_path / 'data.csv') == 0
+
+    w.append(b'%09d\n' % 9)
+    # 100 bytes buffered, written up to the 64 byte block boundary
+    assert os.path.getsize(tmp_path / 'data.csv') == 64
+    w.close()
+    assert (tmp_path / 'data.csv').read_bytes() == b''.join(b'%09d\n' % i for i in range(10))
+    assert (w.rows, w.writes) == (10, 2)
+
+
+def test_rows_go_out_after_max_age(writer, tmp_path, monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr(zapis.time, 'monotonic', lambda: clock[0])
+    w = writer(max_age=60)
+    w.append(b'a\n')
+    clock[0] = 30
+    w.append(b'b\n')
+    assert not w.due()
+    clock[0] = 60
+    assert w.due()
+    w.flush()
+    assert (tmp_path / 'data.csv').read_bytes() == b'a\nb\n'
+    assert not w.due()
+
+
+def test_follows_the_file_swapped_by_compaction(writer, tmp_path):
+    path = tmp_path / 'data.csv'
+    w = writer(max_age=3600)
+    w.append(b'old\n')
+    w.flush()
+    with zapis.append_lock(str(path), exclusive=True):
+        (tmp_path / 'new.csv').write_bytes(b'kept\n')
+        os.replace(tmp_path / 'new.csv', path)
+    w.append(b'new\n')
+    w.flush()
+    assert path.read_bytes() == b'kept\nnew\n'
+    assert w.reopens == 1
+
+
+def test_exclusive_lock_waits_for_appends(tmp_path):
+    path = str(tmp_path / 'data.csv')
+    events = []
+    appending = threading.Event()
+
+    def append():
+        with zapis.append_lock(path):
+            appending.set()
+            time.sleep(0.05)
+            events.append('append done')
+
+    thread = threading.Thread(target=append)
+    thread.start()
+    appending.wait()
+    with zapis.append_lock(path, exclusive=True):
+        events.append('compaction')
+    thread.join()
+    assert events == ['append done', 'compaction']
+
+
+def test_report(writer):
+    w = writer(max_age=3600)
+    w.append(b'row\n')
+    w.flush()
+    assert w.report().endswith('data.csv: 1 rows in 1 writes, 4 bytes, 0 reopens, flush latency ' + w.latency.summary())
@@ -0,0 +1,80 @@
+"""Adaptive sampling period driven by how fast the signal changes.
+
+A flat signal (light at night, stable temperature) backs off one rung of a
+period ladder after every few quiet samples, up to the slowest rung. A fast
+change or a noisy window drops straight back to the fastest rung, so events
+like a light switching on or a gas spike are sampled densely while quiet
+hours cost a fraction of the rows.
+
+The ladder rungs are wall-clock grid periods (1, 2, 5, 10, 30, 60 s ...),
+so the timestamps stay joinable with the fixed-rate loggers; feed the
+period into Scheduler.set_period() from wspolne.harmonogram.
+"""
+import statistics
+from collections import deque
+
+DEFAULT_PERIODS = [1, 2, 5, 10, 30, 60]
+# Quiet samples before backing off one rung
+DEFAULT_PATIENCE = 3
+# Recent samples used for the noise check
+DEFAULT_WINDOW = 5
+
+
+class AdaptiveRate:
+    """Picks the next sampling period from the latest values
+
+    periods  ladder of periods in seconds, fastest first
+    rate     per value: change per second that counts as an event, or None
+    std      per value: standard deviation over the window that counts as
+             an event, or None
+    """
+
+    def __init__(self, periods=DEFAULT_PERIODS, rate=None, std=None, patience=DEFAULT_PATIENCE,
+                 window=DEFAULT_WINDOW, start=None):
+        if not periods or sorted(periods) != list(periods):
+            raise ValueError("Periods must be a non-empty ascending list")
+        self.periods = list(periods)
+        self.rate = rate
+        self.std = std
+        self.patience = patience
+        self.history = deque(maxlen=window)
+        # Start on the rung closest to the fixed-rate period
+        self.rung = self.periods.index(start) if start in self.periods else 0
+        self.quiet = 0
+        self.events = 0
+
+    @property
+    def period(self):
+        return self.periods[self.rung]
+
+    def _changing(self, seconds, values):
+        if not self.history:
+            return False
+        last_seconds, last_values = self.history[-1]
+        dt = seconds - last_seconds
+        for i, value in enumerate(values):
+            if value is None or last_values[i] is None:
+                continue
+            if self.rate and self.rate[i] is not None and dt > 0:
+                if abs(value - last_values[i]) / dt > self.rate[i]:
+                    return True
+            if self.std and self.std[i] is not None and len(self.history) >= 2:
+                window = [v[i] for _, v in self.history if v[i] is not None] + [value]
+                if len(window) >= 2 and statistics.pstdev(window) > self.std[i]:
+                    return True
+        return False
+
+    def update(self, timestamp, values):
+        """Record a sample taken at `timestamp` (datetime), return the next period"""
+        seconds = timestamp.timestamp()
+        if self._changing(seconds, values):
+            self.events += 1
+            self.quiet = 0
+            self.rung = 0
+        else:
+            self.quiet += 1
+            if self.quiet >= self.patience and self.rung < len(self.periods) - 1:
+                self.quiet = 0
+                self.rung += 1
+        self.history.append((seconds, list(values)))
+        return self.period
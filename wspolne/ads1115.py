@@ -0,0 +1,107 @@
+"""Minimal ADS1115 driver on smbus2.
+
+Drop-in for the Blinka path (board/busio/adafruit_ads1x15) when all we need
+is a 16-bit register read: it only imports smbus2, starts in milliseconds
+and produces the same voltages (raw * full scale / 32767, as AnalogIn does).
+"""
+import time
+
+DEFAULT_ADDRESS = 0x48
+
+REG_CONVERSION = 0x00
+REG_CONFIG = 0x01
+
+OS_SINGLE = 0x8000
+MUX_SINGLE_ENDED = 0x4000
+MODE_SINGLE = 0x0100
+MODE_CONTINUOUS = 0x0000
+COMP_QUE_DISABLE = 0x0003
+
+# Full-scale range in volts per gain, same table as adafruit_ads1x15
+PGA_RANGE = {2/3: 6.144, 1: 4.096, 2: 2.048, 4: 1.024, 8: 0.512, 16: 0.256}
+GAIN_CONFIG = {2/3: 0x0000, 1: 0x0200, 2: 0x0400, 4: 0x0600, 8: 0x0800, 16: 0x0A00}
+DATA_RATE_CONFIG = {
+    8: 0x0000, 16: 0x0020, 32: 0x0040, 64: 0x0060,
+    128: 0x0080, 250: 0x00A0, 475: 0x00C0, 860: 0x00E0,
+}
+
+# Give up on a conversion that takes this much longer than 1 / data rate
+CONVERSION_TIMEOUT = 0.1
+# Pause between ready() checks once the nominal conversion time is over
+# (the internal oscillator is up to 10 % slow)
+POLL_INTERVAL = 0.0005
+
+
+class ADS1115:
+    def __init__(self, bus, address=DEFAULT_ADDRESS, gain=1, data_rate=128):
+        if gain not in PGA_RANGE:
+            raise ValueError(f"Gain must be one of {sorted(PGA_RANGE)}")
+        if data_rate not in DATA_RATE_CONFIG:
+            raise ValueError(f"Data rate must be one of {sorted(DATA_RATE_CONFIG)}")
+        self.bus = bus
+        self.address = address
+        self.gain = gain
+        self.data_rate = data_rate
+        # Input currently selected by the mux, None until the first conversion
+        self.mux = None
+        self.continuous = False
+        # Monotonic time the last single-shot conversion was started
+        self.started = None
+
+    def _write_config(self, channel, mode):
+        config = (MUX_SINGLE_ENDED | (channel << 12) | GAIN_CONFIG[self.gain]
+                  | DATA_RATE_CONFIG[self.data_rate] | mode | COMP_QUE_DISABLE)
+        if mode == MODE_SINGLE:
+            config |= OS_SINGLE
+        self.bus.write_i2c_block_data(self.address, REG_CONFIG, [config >> 8, config & 0xFF])
+        self.mux = channel
+
+    def start(self, channel=0):
+        """Start a single-shot conversion, return seconds until it is ready"""
+        self._write_config(channel, MODE_SINGLE)
+        self.continuous = False
+        self.started = time.monotonic()
+        return 1.0 / self.data_rate
+
+    def ready(self):
+        """True once the single-shot conversion has finished"""
+        data = self.bus.read_i2c_block_data(self.address, REG_CONFIG, 2)
+        return bool(data[0] & 0x80)
+
+    def read_raw(self):
+        """Signed 16-bit value of the conversion register"""
+        data = self.bus.read_i2c_block_data(self.address, REG_CONVERSION, 2)
+        value = (data[0] << 8) | data[1]
+        return value - 0x10000 if value & 0x8000 else value
+
+    def to_voltage(self, raw):
+        return raw * PGA_RANGE[self.gain] / 32767
+
+    def collect(self):
+        """Voltage of a conversion started with start()"""
+        conversion = 1.0 / self.data_rate
+        started = self.started if self.started is not None else time.monotonic()
+        # Sleep through what is left of the conversion, then poll gently
+        remaining = started + conversion - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+        deadline = started + conversion + CONVERSION_TIMEOUT
+        while not self.ready():
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"ADS1115 at 0x{self.address:02x} did not finish a conversion")
+            time.sleep(POLL_INTERVAL)
+        return self.to_voltage(self.read_raw())
+
+    def voltage(self, channel=0):
+        """Blocking single-shot read, like AnalogIn(ads, P<channel>).voltage"""
+        if self.continuous and self.mux == channel:
+            return self.to_voltage(self.read_raw())
+        time.sleep(self.start(channel))
+        return self.collect()
+
+    def start_continuous(self, channel=0):
+        """Convert back to back, voltage(channel) then returns the latest result"""
+        self._write_config(channel, MODE_CONTINUOUS)
+        self.continuous = True
+        # First result is ready after one conversion period
+        time.sleep(1.0 / self.data_rate)
@@ -0,0 +1,97 @@
+"""Preallocated ring buffers for high-rate sampling and thread hand-off."""
+import numpy as np
+
+
+class RingBuffer:
+    """Fixed-size float buffer, the oldest samples are overwritten when full"""
+
+    def __init__(self, capacity, dtype=np.float64):
+        self.data = np.empty(capacity, dtype=dtype)
+        self.capacity = capacity
+        self.count = 0
+        self.overwritten = 0
+
+    def append(self, value):
+        self.data[self.count % self.capacity] = value
+        self.count += 1
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def values(self):
+        """Samples in arrival order (a view unless the buffer has wrapped)"""
+        if self.count <= self.capacity:
+            return self.data[:self.count]
+        split = self.count % self.capacity
+        return np.concatenate([self.data[split:], self.data[:split]])
+
+    def clear(self):
+        self.overwritten += max(0, self.count - self.capacity)
+        self.count = 0
+
+
+class SpscRing:
+    """Single-producer/single-consumer queue with preallocated slots
+
+    No locks: the producer only moves `head`, the consumer only moves
+    `tail`, and each publishes its index after touching the slots (index
+    assignments are atomic under the GIL). A full ring drops the new item
+    and counts it instead of blocking the producer; a producer that would
+    rather wait checks full() first.
+    """
+
+    def __init__(self, capacity):
+        self.slots = [None] * capacity
+        self.capacity = capacity
+        self.head = 0
+        self.tail = 0
+        # Producer side counters
+        self.pushed = 0
+        self.dropped = 0
+        self.high_water = 0
+
+    def __len__(self):
+        return self.head - self.tail
+
+    def full(self):
+        return self.head - self.tail >= self.capacity
+
+    def push(self, item):
+        """Producer: queue an item, False if the ring is full"""
+        head = self.head
+        used = head - self.tail
+        if used >= self.capacity:
+            self.dropped += 1
+            return False
+        self.slots[head % self.capacity] = item
+        self.head = head + 1
+        self.pushed += 1
+        self.high_water = max(self.high_water, used + 1)
+        return True
+
+    def pop_batch(self, limit=None):
+        """Consumer: take up to `limit` items in arrival order"""
+        tail = self.tail
+        count = self.head - tail
+        if limit is not None:
+            count = min(count, limit)
+        batch = []
+        for i in range(tail, tail + count):
+            index = i % self.capacity
+            batch.append(self.slots[index])
+            self.slots[index] = None
+        self.tail = tail + count
+        return batch
+
+
+def summarize(values):
+    """mean/min/max/std of a block of samples (NaN when empty)"""
+    if len(values) == 0:
+        return {'mean': np.nan, 'min': np.nan, 'max': np.nan, 'std': np.nan, 'count': 0}
+    return {
+        'mean': float(np.mean(values)),
+        'min': float(np.min(values)),
+        'max': float(np.max(values)),
+        'std': float(np.std(values)),
+        'count': len(values),
+    }
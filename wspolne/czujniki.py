@@ -0,0 +1,410 @@
+"""Sensor drivers used by the acquisition daemon.
+
+Every driver reads through the shared bus (see wspolne.magistrala) and
+exposes the CSV layout of the logger it replaces:
+
+    name      series name
+    filename  data file, relative to the repository root
+    headers   CSV headers, the first one is the timestamp
+    decimals  decimals kept per value column
+
+Reads are split in two so conversions on different sensors overlap:
+
+    start()   trigger a conversion, return seconds until the result is ready
+    collect() fetch the result, list of values one per value column
+"""
+import contextlib
+import json
+import os
+import struct
+
+# BH1750 constants from the datasheet, see swiatlo/swiatlo.py
+BH1750_ADDRESS = 0x23
+ONE_TIME_HIGH_RES_MODE_1 = 0x20
+# Typically 120 ms, 180 ms at most
+BH1750_HIGH_RES_TIME = 0.18
+# Measurement time register: 31 .. 254, 69 by default. Sensitivity and
+# conversion time both scale with MTreg / 69
+BH1750_MTREG_MIN = 31
+BH1750_MTREG_MAX = 254
+BH1750_MTREG_DEFAULT = 69
+BH1750_MTREG_HIGH = 0x40
+BH1750_MTREG_LOW = 0x60
+# Continuous modes: command, worst case conversion time at MTreg 69 and
+# counts per step (high-res 2 reports half-lux steps)
+BH1750_MODES = {
+    'low': {'command': 0x13, 'time': 0.024, 'divider': 1},
+    'high': {'command': 0x10, 'time': 0.18, 'divider': 1},
+    'high2': {'command': 0x11, 'time': 0.18, 'divider': 2},
+}
+# Auto-ranging thresholds in lux: high-res 2 below DARK, low-res above BRIGHT
+BH1750_DARK = 10
+BH1750_BRIGHT = 1000
+BH1750_HYSTERESIS = 0.2
+# Keep the raw count around half of the 16-bit range, MTreg is left alone
+# while the count stays inside the band
+BH1750_TARGET_COUNTS = 32768
+BH1750_COUNTS_BAND = (4096, 58000)
+BH1750_SATURATED = 65535
+
+BME280_ADDRESS = 0x76
+BME280_CALIBRATION_1 = 0x88
+BME280_CALIBRATION_2 = 0xE1
+BME280_CTRL_HUM = 0xF2
+BME280_CTRL_MEAS = 0xF4
+BME280_CONFIG = 0xF5
+BME280_DATA = 0xF7
+BME280_MODES = {'sleep': 0x00, 'forced': 0x01, 'normal': 0x03}
+# Oversampling register values: skipped, x1 .. x16
+BME280_OVERSAMPLING = {0: 0, 1: 1, 2: 2, 4: 3, 8: 4, 16: 5}
+# IIR filter coefficient register values: off, 2 .. 16
+BME280_FILTER = {0: 0, 2: 1, 4: 2, 8: 3, 16: 4}
+# Normal mode standby time in ms between conversions
+BME280_STANDBY = {0.5: 0, 62.5: 1, 125: 2, 250: 3, 500: 4, 1000: 5, 10: 6, 20: 7}
+# Calibration words are fixed per chip, cached as bme280_0x76.json etc.
+BME280_CALIBRATION_CACHE = os.path.join(os.path.expanduser('~'), '.cache', 'bme280')
+
+ADS1115_ADDRESS = 0x48
+
+
+def celsius_to_fahrenheit(celsius):
+    return (celsius * 9/5) + 32
+
+
+class Sensor:
+    """Blocking read() for drivers that can't split trigger and collect"""
+
+    def start(self):
+        return 0.0
+
+    def collect(self):
+        return self.read()
+
+    def read(self):
+        raise NotImplementedError
+
+
+def bh1750_lux(raw, mode='high', mtreg=BH1750_MTREG_DEFAULT):
+    """Lux from a raw count measured in `mode` with measurement time `mtreg`"""
+    return raw / 1.2 * (BH1750_MTREG_DEFAULT / mtreg) / BH1750_MODES[mode]['divider']
+
+
+class BH1750Range:
+    """Picks the BH1750 mode and MTreg for the next reading from the last one
+
+    Dark scenes get high-res 2 with a long measurement time, bright ones the
+    16 ms low-res mode with a short one so the count doesn't saturate.
+    """
+
+    def __init__(self):
+        self.mode = 'high'
+        self.mtreg = BH1750_MTREG_DEFAULT
+
+    def conversion_time(self):
+        return BH1750_MODES[self.mode]['time'] * self.mtreg / BH1750_MTREG_DEFAULT
+
+    def _pick_mode(self, lux):
+        # Leave the current mode only once clearly past its threshold
+        low, high = BH1750_DARK, BH1750_BRIGHT
+        if self.mode == 'high2':
+            low *= 1 + BH1750_HYSTERESIS
+        elif self.mode == 'low':
+            high *= 1 - BH1750_HYSTERESIS
+        else:
+            low *= 1 - BH1750_HYSTERESIS
+            high *= 1 + BH1750_HYSTERESIS
+        if lux < low:
+            return 'high2'
+        if lux > high:
+            return 'low'
+        return 'high'
+
+    def update(self, raw):
+        """Adjust to the raw count just read, True if the settings changed"""
+        previous = (self.mode, self.mtreg)
+        if raw >= BH1750_SATURATED:
+            # Out of range, the lux value is unknown: least sensitive setting
+            self.mode, self.mtreg = 'low', BH1750_MTREG_MIN
+            return (self.mode, self.mtreg) != previous
+        lux = bh1750_lux(raw, self.mode, self.mtreg)
+        self.mode = self._pick_mode(lux)
+        if self.mode == previous[0] and BH1750_COUNTS_BAND[0] <= raw <= BH1750_COUNTS_BAND[1]:
+            return False
+        # Most sensitive MTreg that keeps the expected count under the target
+        counts_per_lux = 1.2 * BH1750_MODES[self.mode]['divider'] / BH1750_MTREG_DEFAULT
+        if lux > 0:
+            mtreg = int(BH1750_TARGET_COUNTS / (lux * counts_per_lux))
+        else:
+            mtreg = BH1750_MTREG_MAX
+        self.mtreg = min(max(mtreg, BH1750_MTREG_MIN), BH1750_MTREG_MAX)
+        return (self.mode, self.mtreg) != previous
+
+
+class BH1750(Sensor):
+    name = 'light'
+    filename = 'swiatlo/light_readings.csv'
+    headers = ['Timestamp', 'Light_Level_lx']
+    decimals = [2]
+
+    def __init__(self, bus, address=BH1750_ADDRESS, auto_range=False):
+        self.bus = bus
+        self.address = address
+        # Auto-ranging runs the sensor in continuous mode, see BH1750Range
+        self.range = BH1750Range() if auto_range else None
+        self.configured = False
+
+    def _configure(self):
+        mtreg = self.range.mtreg
+        self.bus.write_byte(self.address, BH1750_MTREG_HIGH | (mtreg >> 5))
+        self.bus.write_byte(self.address, BH1750_MTREG_LOW | (mtreg & 0x1F))
+        self.bus.write_byte(self.address, BH1750_MODES[self.range.mode]['command'])
+        self.configured = True
+
+    def start(self):
+        if self.range is None:
+            self.bus.write_byte(self.address, ONE_TIME_HIGH_RES_MODE_1)
+            return BH1750_HIGH_RES_TIME
+        if self.configured:
+            # Continuous mode, the data register already holds a fresh result
+            return 0.0
+        self._configure()
+        return self.range.conversion_time()
+
+    def read_raw(self):
+        # Plain 2-byte read, a command byte would start another measurement
+        from smbus2 import i2c_msg
+
+        msg = i2c_msg.read(self.address, 2)
+        self.bus.i2c_rdwr(msg)
+        data = list(msg)
+        return data[1] + (256 * data[0])
+
+    def collect(self):
+        raw = self.read_raw()
+        if self.range is None:
+            return [bh1750_lux(raw)]
+        lux = bh1750_lux(raw, self.range.mode, self.range.mtreg)
+        if self.range.update(raw):
+            # New settings are sent on the next start()
+            self.configured = False
+        return [lux]
+
+
+class BME280(Sensor):
+    """Register-level BME280 driver (datasheet section 3.3)
+
+    oversampling  temperature, pressure, humidity: 1 .. 16 (0 skips pressure
+                  or humidity), more means less noise but a longer conversion
+    iir_filter    0 (off) or 2 .. 16, smooths pressure/temperature steps
+    mode          'forced' converts once per start() and sleeps in between,
+                  'normal' free-runs with `standby` ms between conversions
+    """
+    name = 'environment'
+    filename = 'temp_wilgotnosc_cisnienie/environmental_data.csv'
+    headers = ['Timestamp', 'Temperature_C', 'Temperature_F', 'Pressure_hPa', 'Humidity_%']
+    decimals = [2, 2, 2, 2]
+
+    def __init__(self, bus, address=BME280_ADDRESS, oversampling=(1, 1, 1), iir_filter=0,
+                 mode='forced', standby=1000, calibration_cache=BME280_CALIBRATION_CACHE):
+        for value in oversampling:
+            if value not in BME280_OVERSAMPLING:
+                raise ValueError(f"Oversampling must be one of {sorted(BME280_OVERSAMPLING)}")
+        if not oversampling[0]:
+            # Pressure and humidity compensation need the temperature
+            raise ValueError("Temperature oversampling can't be skipped")
+        if iir_filter not in BME280_FILTER:
+            raise ValueError(f"IIR filter must be one of {sorted(BME280_FILTER)}")
+        if mode not in ('forced', 'normal'):
+            raise ValueError("Mode must be 'forced' or 'normal'")
+        if standby not in BME280_STANDBY:
+            raise ValueError(f"Standby must be one of {sorted(BME280_STANDBY)} ms")
+        self.bus = bus
+        self.address = address
+        # Oversampling of temperature, pressure and humidity
+        self.oversampling = oversampling
+        self.iir_filter = iir_filter
+        self.mode = mode
+        self.standby = standby
+        self.configured = False
+        # Plain smbus2 handles have no lock, only the daemon's shared bus does
+        with getattr(bus, 'lock', contextlib.nullcontext()):
+            self.calibration = self.cached_calibration(calibration_cache)
+
+    def cached_calibration(self, directory):
+        """Calibration from the cache, read from the chip and stored on a miss"""
+        if directory is None:
+            return self.load_calibration()
+        path = os.path.join(directory, f'bme280_0x{self.address:02x}.json')
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass
+        calibration = self.load_calibration()
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with open(path + '.tmp', 'w') as f:
+                json.dump(calibration, f)
+            os.replace(path + '.tmp', path)
+        except OSError as e:
+            print(f"Could not cache BME280 calibration in {path}: {e}")
+        return calibration
+
+    def load_calibration(self):
+        block = bytes(self.bus.read_i2c_block_data(self.address, BME280_CALIBRATION_1, 26))
+        cal = dict(zip(
+            ['T1', 'T2', 'T3', 'P1', 'P2', 'P3', 'P4', 'P5', 'P6', 'P7', 'P8', 'P9'],
+            struct.unpack('<HhhHhhhhhhhh', block[:24])
+        ))
+        cal['H1'] = block[25]
+        block = bytes(self.bus.read_i2c_block_data(self.address, BME280_CALIBRATION_2, 7))
+        cal['H2'], cal['H3'] = struct.unpack('<hB', block[:3])
+        h4 = (block[3] << 4) | (block[4] & 0x0F)
+        h5 = (block[5] << 4) | (block[4] >> 4)
+        cal['H4'] = h4 - 4096 if h4 > 2047 else h4
+        cal['H5'] = h5 - 4096 if h5 > 2047 else h5
+        cal['H6'] = struct.unpack('<b', block[6:7])[0]
+        return cal
+
+    def conversion_time(self):
+        """Maximum measurement time in seconds (datasheet appendix 9.1)"""
+        os_t, os_p, os_h = self.oversampling
+        ms = 1.25 + 2.3 * os_t
+        if os_p:
+            ms += 2.3 * os_p + 0.575
+        if os_h:
+            ms += 2.3 * os_h + 0.575
+        return ms / 1000
+
+    def output_rate(self):
+        """Conversions per second in normal mode"""
+        return 1 / (self.conversion_time() + self.standby / 1000)
+
+    def _ctrl_meas(self, mode):
+        os_t, os_p, _ = (BME280_OVERSAMPLING[o] for o in self.oversampling)
+        return (os_t << 5) | (os_p << 2) | BME280_MODES[mode]
+
+    def configure(self):
+        """Write filter, standby and oversampling, starts normal mode running"""
+        # The config register is only written reliably in sleep mode, and
+        # ctrl_hum only takes effect after the following ctrl_meas write
+        self.bus.write_byte_data(self.address, BME280_CTRL_MEAS, self._ctrl_meas('sleep'))
+        config = (BME280_STANDBY[self.standby] << 5) | (BME280_FILTER[self.iir_filter] << 2)
+        self.bus.write_byte_data(self.address, BME280_CONFIG, config)
+        self.bus.write_byte_data(self.address, BME280_CTRL_HUM, BME280_OVERSAMPLING[self.oversampling[2]])
+        self.bus.write_byte_data(self.address, BME280_CTRL_MEAS, self._ctrl_meas(self.mode))
+        self.configured = True
+
+    def start(self):
+        if not self.configured:
+            self.configure()
+            # Forced mode is already converting, normal mode needs one cycle
+            return self.conversion_time()
+        if self.mode == 'normal':
+            # Free running, the data registers hold the latest conversion
+            return 0.0
+        self.bus.write_byte_data(self.address, BME280_CTRL_MEAS, self._ctrl_meas('forced'))
+        return self.conversion_time()
+
+    def collect(self):
+        data = self.bus.read_i2c_block_data(self.address, BME280_DATA, 8)
+        adc_p = (data[0] << 12) | (data[1] << 4) | (data[2] >> 4)
+        adc_t = (data[3] << 12) | (data[4] << 4) | (data[5] >> 4)
+        adc_h = (data[6] << 8) | data[7]
+        temperature, pressure, humidity = self.compensate(adc_t, adc_p, adc_h)
+        # Skipped measurements read back as the reset value
+        if not self.oversampling[1]:
+            pressure = None
+        if not self.oversampling[2]:
+            humidity = None
+        return [temperature, celsius_to_fahrenheit(temperature), pressure, humidity]
+
+    def compensate(self, adc_t, adc_p, adc_h):
+        """Floating point compensation formulas from the datasheet (section 8.1)"""
+        c = self.calibration
+        var1 = (adc_t / 16384.0 - c['T1'] / 1024.0) * c['T2']
+        var2 = ((adc_t / 131072.0 - c['T1'] / 8192.0) ** 2) * c['T3']
+        t_fine = var1 + var2
+        temperature = t_fine / 5120.0
+
+        var1 = t_fine / 2.0 - 64000.0
+        var2 = var1 * var1 * c['P6'] / 32768.0
+        var2 = var2 + var1 * c['P5'] * 2.0
+        var2 = var2 / 4.0 + c['P4'] * 65536.0
+        var1 = (c['P3'] * var1 * var1 / 524288.0 + c['P2'] * var1) / 524288.0
+        var1 = (1.0 + var1 / 32768.0) * c['P1']
+        if var1 == 0:
+            pressure = 0.0
+        else:
+            p = 1048576.0 - adc_p
+            p = (p - var2 / 4096.0) * 6250.0 / var1
+            var1 = c['P9'] * p * p / 2147483648.0
+            var2 = p * c['P8'] / 32768.0
+            pressure = (p + (var1 + var2 + c['P7']) / 16.0) / 100.0
+
+        h = t_fine - 76800.0
+        h = (adc_h - (c['H4'] * 64.0 + c['H5'] / 16384.0 * h)) * (
+            c['H2'] / 65536.0 * (1.0 + c['H6'] / 67108864.0 * h * (1.0 + c['H3'] / 67108864.0 * h)))
+        h = h * (1.0 - c['H1'] * h / 524288.0)
+        humidity = min(max(h, 0.0), 100.0)
+        return temperature, pressure, humidity
+
+
+class ADS1115(Sensor):
+    """MQ-135 on channel P0 through the smbus2 driver in wspolne/ads1115.py
+
+    Same voltages as the Blinka path in jakosc_powietrza/gazy.py, but the
+    conversion is started and collected like the other sensors and all
+    traffic goes through the shared bus handle.
+    """
+    name = 'air_quality'
+    filename = 'jakosc_powietrza/mq135_readings.csv'
+    headers = ['Timestamp', 'Voltage']
+    decimals = [None]
+
+    def __init__(self, bus, address=ADS1115_ADDRESS, gain=1, data_rate=128):
+        from wspolne import ads1115
+
+        self.adc = ads1115.ADS1115(bus, address, gain, data_rate)
+
+    def start(self):
+        return self.adc.start(0)
+
+    def collect(self):
+        return [self.adc.collect()]
+
+
+class BlinkaADS1115(Sensor):
+    """MQ-135 on channel P0 through the Blinka driver
+
+    Blinka only offers a blocking single-shot read (about 8 ms at 128 SPS),
+    it runs while the slower BH1750/BME280 conversions are in flight.
+    """
+    name = ADS1115.name
+    filename = ADS1115.filename
+    headers = ADS1115.headers
+    decimals = ADS1115.decimals
+
+    def __init__(self, bus, address=ADS1115_ADDRESS, gain=1):
+        import board
+        import busio
+        import adafruit_ads1x15.ads1115 as ADS
+        from adafruit_ads1x15.analog_in import AnalogIn
+
+        # Blinka opens its own handle on the same bus, reads are still
+        # serialised by the shared bus lock
+        i2c = busio.I2C(board.SCL, board.SDA)
+        self.ads = ADS.ADS1115(i2c, address=address)
+        self.ads.gain = gain
+        self.chan = AnalogIn(self.ads, ADS.P0)
+
+    def read(self):
+        return [self.chan.voltage]
+
+
+DRIVERS = {
+    'bh1750': BH1750,
+    'bme280': BME280,
+    'ads1115': ADS1115,
+    'ads1115_blinka': BlinkaADS1115,
+}
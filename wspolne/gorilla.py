@@ -0,0 +1,395 @@
+"""Gorilla-style block codec for sensor time series.
+
+Timestamps are stored as delta-of-delta and values as XOR against the
+previous float, in blocks of a fixed number of samples. A small index file
+next to the data file lets readers skip blocks outside a time range.
+
+File layout:
+    <name>.gor      b'GOR1', u32 header length, JSON header, then blocks of
+                    (u32 payload length, u32 sample count, payload)
+    <name>.gor.idx  one record per block: first/last timestamp, offset, count
+
+Blocks are appended under wspolne.zapis.append_lock, expire() rewrites
+both files under it exclusively.
+"""
+import json
+import os
+import struct
+import time
+
+import numpy as np
+
+from wspolne.zapis import append_lock
+
+MAGIC = b'GOR1'
+EXTENSION = '.gor'
+DEFAULT_BLOCK_SIZE = 128
+
+# Timestamps are integers in units of `resolution` microseconds
+SECONDS = 1_000_000
+MICROSECONDS = 1
+
+_BLOCK_HEADER = struct.Struct('<II')
+_INDEX_RECORD = struct.Struct('<qqQI')
+
+
+def block_path(path):
+    """Block file for a CSV path ('x.csv' -> 'x.gor')"""
+    if path.endswith(EXTENSION):
+        return path
+    return os.path.splitext(path)[0] + EXTENSION
+
+
+class BitWriter:
+    def __init__(self):
+        self.buffer = bytearray()
+        self.acc = 0
+        self.nbits = 0
+
+    def write(self, value, nbits):
+        self.acc = (self.acc << nbits) | (value & ((1 << nbits) - 1))
+        self.nbits += nbits
+        while self.nbits >= 8:
+            self.nbits -= 8
+            self.buffer.append((self.acc >> self.nbits) & 0xFF)
+        self.acc &= (1 << self.nbits) - 1
+
+    def getvalue(self):
+        if self.nbits:
+            return bytes(self.buffer) + bytes([(self.acc << (8 - self.nbits)) & 0xFF])
+        return bytes(self.buffer)
+
+
+class BitReader:
+    def __init__(self, data):
+        self.value = int.from_bytes(data, 'big')
+        self.total = len(data) * 8
+        self.pos = 0
+
+    def read(self, nbits):
+        self.pos += nbits
+        return (self.value >> (self.total - self.pos)) & ((1 << nbits) - 1)
+
+    def read_signed(self, nbits):
+        value = self.read(nbits)
+        if value >= 1 << (nbits - 1):
+            value -= 1 << nbits
+        return value
+
+
+# Delta-of-delta buckets: (control bits, control length, value bits)
+_DOD_BUCKETS = [
+    (0b10, 2, 7),
+    (0b110, 3, 9),
+    (0b1110, 4, 12),
+]
+
+
+def _write_dod(writer, dod):
+    if dod == 0:
+        writer.write(0, 1)
+        return
+    for control, length, nbits in _DOD_BUCKETS:
+        if -(1 << (nbits - 1)) <= dod < (1 << (nbits - 1)):
+            writer.write(control, length)
+            writer.write(dod, nbits)
+            return
+    writer.write(0b1111, 4)
+    writer.write(dod, 64)
+
+
+def _read_dod(reader):
+    if reader.read(1) == 0:
+        return 0
+    for _, length, nbits in _DOD_BUCKETS:
+        if reader.read(1) == 0:
+            return reader.read_signed(nbits)
+    return reader.read_signed(64)
+
+
+def _float_bits(value):
+    return struct.unpack('<Q', struct.pack('<d', value))[0]
+
+
+def _bits_float(bits):
+    return struct.unpack('<d', struct.pack('<Q', bits))[0]
+
+
+def _leading_zeros(value):
+    return 64 - value.bit_length()
+
+
+def _trailing_zeros(value):
+    return (value & -value).bit_length() - 1
+
+
+def encode_block(timestamps, columns):
+    """Encode integer timestamps and a list of value columns into bytes"""
+    writer = BitWriter()
+    count = len(timestamps)
+    if count == 0:
+        return b''
+
+    writer.write(timestamps[0], 64)
+    if count > 1:
+        delta = timestamps[1] - timestamps[0]
+        writer.write(delta, 64)
+        for i in range(2, count):
+            new_delta = timestamps[i] - timestamps[i - 1]
+            _write_dod(writer, new_delta - delta)
+            delta = new_delta
+
+    for values in columns:
+        previous = _float_bits(values[0])
+        writer.write(previous, 64)
+        leading, trailing = 65, 65
+        for value in values[1:]:
+            bits = _float_bits(value)
+            xor = bits ^ previous
+            previous = bits
+            if xor == 0:
+                writer.write(0, 1)
+                continue
+            writer.write(1, 1)
+            new_leading = min(_leading_zeros(xor), 31)
+            new_trailing = _trailing_zeros(xor)
+            if new_leading >= leading and new_trailing >= trailing:
+                # Meaningful bits fit in the previous window
+                writer.write(0, 1)
+                writer.write(xor >> trailing, 64 - leading - trailing)
+            else:
+                leading, trailing = new_leading, new_trailing
+                meaningful = 64 - leading - trailing
+                writer.write(1, 1)
+                writer.write(leading, 5)
+                writer.write(meaningful - 1, 6)
+                writer.write(xor >> trailing, meaningful)
+    return writer.getvalue()
+
+
+def decode_block(data, count, ncolumns):
+    """Decode a block into (int64 timestamps, list of float64 columns)"""
+    timestamps = np.empty(count, dtype=np.int64)
+    columns = [np.empty(count, dtype=np.float64) for _ in range(ncolumns)]
+    if count == 0:
+        return timestamps, columns
+    reader = BitReader(data)
+
+    timestamps[0] = reader.read_signed(64)
+    if count > 1:
+        delta = reader.read_signed(64)
+        timestamps[1] = timestamps[0] + delta
+        for i in range(2, count):
+            delta += _read_dod(reader)
+            timestamps[i] = timestamps[i - 1] + delta
+
+    for values in columns:
+        previous = reader.read(64)
+        values[0] = _bits_float(previous)
+        leading, trailing = 0, 0
+        for i in range(1, count):
+            if reader.read(1):
+                if reader.read(1):
+                    leading = reader.read(5)
+                    meaningful = reader.read(6) + 1
+                    trailing = 64 - leading - meaningful
+                previous ^= reader.read(64 - leading - trailing) << trailing
+            values[i] = _bits_float(previous)
+    return timestamps, columns
+
+
+def _read_header(f):
+    if f.read(4) != MAGIC:
+        raise ValueError(f"{f.name} is not a Gorilla block file")
+    (length,) = struct.unpack('<I', f.read(4))
+    return json.loads(f.read(length)), 8 + length
+
+
+def read_index(path):
+    """Read the block index as an (N, 4) int64 array: first, last, offset, count"""
+    try:
+        with open(path + '.idx', 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return np.empty((0, 4), dtype=np.int64)
+    usable = len(data) - len(data) % _INDEX_RECORD.size
+    records = [_INDEX_RECORD.unpack_from(data, i) for i in range(0, usable, _INDEX_RECORD.size)]
+    return np.array(records, dtype=np.int64).reshape(-1, 4)
+
+
+class GorillaWriter:
+    """Append-only writer, samples are buffered until a block is full
+
+    With `max_age` a write also ends the block once its first sample is
+    that many seconds old, which bounds what a crash loses.
+    """
+
+    def __init__(self, path, columns, resolution=SECONDS, block_size=DEFAULT_BLOCK_SIZE,
+                 decimals=None, max_age=None):
+        self.path = path
+        self.columns = list(columns)
+        self.resolution = resolution
+        self.block_size = block_size
+        self.max_age = max_age
+        # Monotonic time the first pending sample arrived
+        self.first_at = None
+        # Values with known precision are stored scaled to integers, which
+        # leaves far fewer meaningful XOR bits than e.g. 22.02 vs 22.03
+        self.decimals = list(decimals) if decimals else [None] * len(self.columns)
+        self.scales = [None if d is None else 10 ** d for d in self.decimals]
+        self.pending_timestamps = []
+        self.pending_values = [[] for _ in self.columns]
+
+        if os.path.exists(path):
+            self._reopen()
+        else:
+            header = json.dumps({
+                'columns': self.columns,
+                'resolution': resolution,
+                'block_size': block_size,
+                'decimals': self.decimals,
+            }).encode('utf-8')
+            with open(path, 'wb') as f:
+                f.write(MAGIC + struct.pack('<I', len(header)) + header)
+            open(path + '.idx', 'wb').close()
+
+    def _reopen(self):
+        with open(self.path, 'rb') as f:
+            header, end = _read_header(f)
+        if header['columns'] != self.columns:
+            raise ValueError(f"{self.path} has columns {header['columns']}, expected {self.columns}")
+        self.resolution = header['resolution']
+        self.decimals = header.get('decimals') or [None] * len(self.columns)
+        self.scales = [None if d is None else 10 ** d for d in self.decimals]
+        # Drop a block that was written without its index entry
+        index = read_index(self.path)
+        if len(index):
+            offset = int(index[-1][2])
+            with open(self.path, 'rb') as f:
+                f.seek(offset)
+                (length, _) = _BLOCK_HEADER.unpack(f.read(_BLOCK_HEADER.size))
+            end = offset + _BLOCK_HEADER.size + length
+        with open(self.path, 'r+b') as f:
+            f.truncate(end)
+        with open(self.path + '.idx', 'r+b') as f:
+            f.truncate(len(index) * _INDEX_RECORD.size)
+
+    def write(self, timestamp_us, values):
+        """Add one sample, timestamp in epoch microseconds"""
+        if not self.pending_timestamps:
+            self.first_at = time.monotonic()
+        self.pending_timestamps.append(int(timestamp_us) // self.resolution)
+        for column, value, scale in zip(self.pending_values, values, self.scales):
+            if value is None:
+                column.append(float('nan'))
+            elif scale is None:
+                column.append(float(value))
+            else:
+                column.append(float(round(value * scale)))
+        if len(self.pending_timestamps) >= self.block_size:
+            self.flush()
+        elif self.max_age is not None and time.monotonic() - self.first_at >= self.max_age:
+            self.flush()
+
+    def flush(self):
+        """Encode the pending samples as one block"""
+        if not self.pending_timestamps:
+            return
+        payload = encode_block(self.pending_timestamps, self.pending_values)
+        count = len(self.pending_timestamps)
+        # Opened by path, so blocks follow the files expire() swapped in
+        with append_lock(self.path):
+            with open(self.path, 'ab') as f:
+                offset = f.tell()
+                f.write(_BLOCK_HEADER.pack(len(payload), count) + payload)
+            with open(self.path + '.idx', 'ab') as f:
+                f.write(_INDEX_RECORD.pack(
+                    self.pending_timestamps[0] * self.resolution,
+                    self.pending_timestamps[-1] * self.resolution,
+                    offset,
+                    count,
+                ))
+        self.pending_timestamps = []
+        self.pending_values = [[] for _ in self.columns]
+
+    def close(self):
+        self.flush()
+
+
+def read(path, start_us=None, end_us=None):
+    """Decode blocks into (int64 epoch microseconds, {column: float64 array})
+
+    Blocks entirely outside [start_us, end_us] are skipped using the index.
+    """
+    # Index and data file of the same generation, see expire()
+    with append_lock(path):
+        index = read_index(path)
+        f = open(path, 'rb')
+    with f:
+        header, _ = _read_header(f)
+        columns = header['columns']
+        resolution = header['resolution']
+        decimals = header.get('decimals') or [None] * len(columns)
+        selected = np.ones(len(index), dtype=bool)
+        if start_us is not None:
+            selected &= index[:, 1] >= start_us
+        if end_us is not None:
+            selected &= index[:, 0] <= end_us
+
+        timestamps, values = [], [[] for _ in columns]
+        for _, _, offset, count in index[selected]:
+            f.seek(offset)
+            length, count = _BLOCK_HEADER.unpack(f.read(_BLOCK_HEADER.size))
+            ts, cols = decode_block(f.read(length), count, len(columns))
+            timestamps.append(ts * resolution)
+            for acc, col in zip(values, cols):
+                acc.append(col)
+
+    if not timestamps:
+        return np.empty(0, dtype=np.int64), {c: np.empty(0) for c in columns}
+    ts = np.concatenate(timestamps)
+    data = {}
+    for column, chunks, d in zip(columns, values, decimals):
+        data[column] = np.concatenate(chunks)
+        if d is not None:
+            data[column] /= 10 ** d
+    mask = np.ones(len(ts), dtype=bool)
+    if start_us is not None:
+        mask &= ts >= start_us
+    if end_us is not None:
+        mask &= ts <= end_us
+    return ts[mask], {c: v[mask] for c, v in data.items()}
+
+
+def expire(path, cutoff, min_fraction=0.0):
+    """Drop the blocks that end before a datetime, return the samples dropped
+
+    Only whole blocks go, and only once they make up `min_fraction` of the
+    file, so it is rewritten rarely.
+    """
+    cutoff_us = int(round(cutoff.timestamp() * 1_000_000))
+    with append_lock(path, exclusive=True):
+        index = read_index(path)
+        expired = 0
+        while expired < len(index) and index[expired][1] < cutoff_us:
+            expired += 1
+        if expired == 0:
+            return 0
+        size = os.path.getsize(path)
+        first = int(index[0][2])
+        cut = int(index[expired][2]) if expired < len(index) else size
+        if cut - first < size * min_fraction:
+            return 0
+        dropped = int(index[:expired, 3].sum())
+        index = index[expired:].copy()
+        index[:, 2] -= cut - first
+        with open(path, 'rb') as src, open(path + '.tmp', 'wb') as dst:
+            dst.write(src.read(first))
+            src.seek(cut)
+            for chunk in iter(lambda: src.read(1024 * 1024), b''):
+                dst.write(chunk)
+        with open(path + '.idx.tmp', 'wb') as f:
+            f.write(b''.join(_INDEX_RECORD.pack(*(int(v) for v in record)) for record in index))
+        os.replace(path + '.tmp', path)
+        os.replace(path + '.idx.tmp', path + '.idx')
+    return dropped
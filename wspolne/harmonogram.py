@@ -0,0 +1,179 @@
+"""Drift-free periodic scheduling for the logger loops.
+
+`work(); time.sleep(10)` runs every 10 s plus the time spent working, so
+timestamps slowly walk away from each other across sensors. Scheduler fires
+on absolute time.monotonic() deadlines anchored to the wall-clock grid (for
+a 10 s period: :00, :10, :20 ...) and hands out the grid time itself as the
+timestamp, so rows from different loggers with compatible periods share
+exact timestamps and can be joined without resampling.
+
+    scheduler = Scheduler(10)
+    for timestamp in scheduler:
+        sink.write(timestamp, read())
+"""
+import bisect
+import time
+from datetime import datetime
+
+# Missed deadlines: CATCH_UP fires each of them back to back, SKIP fires
+# once for the most recent one and drops the rest
+CATCH_UP = 'catch_up'
+SKIP = 'skip'
+
+# Re-anchor to the wall clock when it jumps (NTP step, manual change)
+# further than this many seconds from the monotonic schedule
+RESYNC_THRESHOLD = 1.0
+
+# Histogram bucket upper bounds in milliseconds, the last bucket is open
+HISTOGRAM_BOUNDS_MS = [0.1, 0.2, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+
+
+class Clock:
+    """Real wall and monotonic time, wspolne.symulacja.SimClock stands in for it"""
+
+    def time(self):
+        return time.time()
+
+    def monotonic(self):
+        return time.monotonic()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def wait(self, event, timeout):
+        """event.wait(timeout) measured on this clock"""
+        return event.wait(timeout)
+
+
+CLOCK = Clock()
+
+
+def grid_delay(period, now=None):
+    """Seconds until the next wall-clock multiple of `period`"""
+    now = time.time() if now is None else now
+    remainder = now % period
+    # Float error can leave an on-grid time a hair below the next multiple
+    if period - remainder < 1e-6:
+        remainder = 0.0
+    return period - remainder
+
+
+class Histogram:
+    """Fixed log-scale latency histogram, cheap enough to update every tick"""
+
+    def __init__(self, bounds_ms=HISTOGRAM_BOUNDS_MS):
+        self.bounds = [b / 1000 for b in bounds_ms]
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.counts[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, p):
+        """Upper bound of the bucket holding the p-th percentile, in seconds"""
+        if not self.count:
+            return 0.0
+        rank = p / 100 * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self.bounds[i], self.max) if i < len(self.bounds) else self.max
+        return self.max
+
+    def summary(self):
+        mean = self.total / self.count if self.count else 0.0
+        return (f"n={self.count} mean={mean * 1000:.2f} ms p50<={self.percentile(50) * 1000:g} ms "
+                f"p99<={self.percentile(99) * 1000:g} ms max={self.max * 1000:.2f} ms")
+
+
+class Scheduler:
+    """Yields grid timestamps every `period` seconds on absolute deadlines
+
+    lateness  how late each tick was released after its deadline (jitter)
+    work      time the caller spent between ticks (read + write)
+    """
+
+    def __init__(self, period, policy=SKIP, align=True, clock=CLOCK):
+        if policy not in (CATCH_UP, SKIP):
+            raise ValueError(f"Policy must be '{CATCH_UP}' or '{SKIP}'")
+        self.clock = clock
+        self.period = period
+        self.policy = policy
+        self.align = align
+        self.lateness = Histogram()
+        self.work = Histogram()
+        self.ticks = 0
+        self.skipped = 0
+        self.resyncs = 0
+        self._anchor()
+
+    def _anchor(self):
+        # Grid index k has wall time wall0 + k * period and monotonic
+        # deadline mono0 + k * period
+        wall, mono = self.clock.time(), self.clock.monotonic()
+        delay = grid_delay(self.period, wall) if self.align else 0.0
+        self.wall0 = wall + delay
+        self.mono0 = mono + delay
+        self.index = 0
+
+    def deadline(self):
+        return self.mono0 + self.index * self.period
+
+    def timestamp(self):
+        # Round away the float error of wall0 + k * period
+        return datetime.fromtimestamp(round(self.wall0 + self.index * self.period, 6))
+
+    def wait(self):
+        """Sleep until the next deadline, return its grid timestamp"""
+        now = self.clock.monotonic()
+        delay = self.deadline() - now
+        if delay > 0:
+            self.clock.sleep(delay)
+            now = self.clock.monotonic()
+        elif self.policy == SKIP and -delay >= self.period:
+            # Jump to the most recent missed deadline
+            missed = int(-delay // self.period)
+            self.index += missed
+            self.skipped += missed
+        # A stepped wall clock would put grid timestamps off the real time
+        expected = self.wall0 + (now - self.mono0)
+        if abs(self.clock.time() - expected) > RESYNC_THRESHOLD:
+            self.resyncs += 1
+            self._anchor()
+            return self.wait()
+        self.lateness.add(max(0.0, now - self.deadline()))
+        timestamp = self.timestamp()
+        self.index += 1
+        self.ticks += 1
+        return timestamp
+
+    def set_period(self, period):
+        """Switch period, the next deadline is the following multiple of the new one"""
+        if period == self.period:
+            return
+        # Re-anchor on the last deadline handed out
+        last_wall = self.wall0 + (self.index - 1) * self.period
+        last_mono = self.mono0 + (self.index - 1) * self.period
+        step = grid_delay(period, last_wall) if self.align else period
+        self.wall0 = last_wall + step
+        self.mono0 = last_mono + step
+        self.index = 0
+        self.period = period
+
+    def __iter__(self):
+        while True:
+            timestamp = self.wait()
+            started = self.clock.monotonic()
+            yield timestamp
+            self.work.add(self.clock.monotonic() - started)
+
+    def report(self):
+        return (f"{self.ticks} ticks, {self.skipped} skipped, {self.resyncs} clock resyncs\n"
+                f"  lateness: {self.lateness.summary()}\n"
+                f"  work:     {self.work.summary()}")
@@ -0,0 +1,373 @@
+"""Persistent range-statistics index for sensor series.
+
+For every numeric column of a data file the index keeps
+
+  * prefix sums of count, value and value^2 (shifted by the first value
+    to keep the variance numerically stable), so count/mean/variance over
+    any range need two lookups, and
+  * an append-only bottom-up segment tree of min/max: level k holds the
+    min/max of aligned blocks of 2^k samples, so a range min/max walks at
+    most 2 entries per level, O(log n). It needs about 2n entries, unlike
+    a sparse table which grows as n log n.
+
+Everything lives in plain files next to the data (`<name>.stats/`) and is
+extended incrementally with the rows appended since the last update; a CSV
+is only read past the byte position reached last time. A data file that
+was replaced or rewritten (retention, rotation) is indexed from scratch:
+
+    print(range_stats('environmental_data.csv', 'Temperature_C', start, end))
+"""
+import csv
+import io
+import json
+import os
+import threading
+
+import numpy as np
+
+META_FILE = 'meta.json'
+NAT = np.iinfo(np.int64).min
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def index_path(path):
+    """Index directory for a data file ('x.csv' -> 'x.stats')"""
+    return os.path.splitext(path)[0] + '.stats'
+
+
+def _mapped_source(path):
+    """(inode, timestamps, columns) of a columnar store or record log, None for a CSV"""
+    from wspolne import kolumny, rekordy
+
+    if os.path.isdir(kolumny.store_path(path)):
+        inode = os.stat(os.path.join(kolumny.store_path(path), kolumny.TIMESTAMP_FILE)).st_ino
+        return (inode,) + kolumny.open_columns(path)
+    if os.path.exists(rekordy.record_path(path)):
+        return (os.stat(rekordy.record_path(path)).st_ino,) + rekordy.open_columns(path)
+    return None
+
+
+def _row_timestamp(row):
+    from wspolne import serie
+    return serie._timestamp_ns(row[0]) if row else NAT
+
+
+def _csv_rows(path, position):
+    """Complete CSV rows from a byte position, and the position past them"""
+    with open(path, 'rb') as f:
+        f.seek(position)
+        data = f.read()
+    end = data.rfind(b'\n') + 1
+    return list(csv.reader(io.StringIO(data[:end].decode('utf-8')))), position + end
+
+
+def _csv_head(path):
+    """Header cells and the timestamp of the first row (None while there is none)"""
+    with open(path, 'rb') as f:
+        lines = [f.readline(), f.readline()]
+    rows = list(csv.reader(io.StringIO(b''.join(l for l in lines if l.endswith(b'\n')).decode('utf-8'))))
+    return (rows[0] if rows else None), (_row_timestamp(rows[1]) if len(rows) > 1 else None)
+
+
+def _csv_row_before(path, position):
+    """Timestamp of the row that ends at a byte position"""
+    start = max(0, position - 4096)
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(position - start)
+    if not data.endswith(b'\n'):
+        return None
+    line = data[:-1].rsplit(b'\n', 1)[-1]
+    return _row_timestamp(next(csv.reader([line.decode('utf-8', 'replace')]), []))
+
+
+def _numeric_columns(header, rows):
+    """Value columns without text, like the numeric columns of wspolne.serie"""
+    from wspolne import serie
+    rows = [row for row in rows if len(row) == len(header)]
+    return [name for i, name in enumerate(header[1:], start=1)
+            if name not in serie.TEXT_COLUMNS and not any(serie._is_text(row[i]) for row in rows)]
+
+
+def _parse_rows(header, columns, rows):
+    """Timestamps and float values of the well-formed rows"""
+    from wspolne import serie
+    rows = [row for row in rows if len(row) == len(header)]
+    positions = [header.index(name) for name in columns]
+    timestamps = np.array([serie._timestamp_ns(row[0]) for row in rows], dtype=np.int64)
+    # float32 like the other sources (serie cache, kolumny, rekordy)
+    values = np.array([[serie._float(row[i]) for i in positions] for row in rows], dtype=np.float32)
+    return timestamps, values.reshape(len(rows), len(columns)).astype(np.float64)
+
+
+class RangeIndex:
+    """Prefix sums and min/max tree over all numeric columns of one file"""
+
+    def __init__(self, path):
+        self.path = path
+        self.directory = index_path(path)
+        self.lock = threading.Lock()
+        self._maps = {}
+        try:
+            with open(os.path.join(self.directory, META_FILE)) as f:
+                self.meta = json.load(f)
+        except FileNotFoundError:
+            self.meta = None
+
+    # -- storage -----------------------------------------------------------
+
+    def _file(self, name):
+        return os.path.join(self.directory, name)
+
+    def _row_shape(self, name):
+        ncols = len(self.meta['columns'])
+        if name == 'timestamp.i64':
+            return np.dtype('<i8'), ()
+        if name == 'prefix.f64':
+            return np.dtype('<f8'), (ncols, 3)
+        return np.dtype('<f4'), (ncols,)
+
+    def _read(self, name, start, stop):
+        dtype, shape = self._row_shape(name)
+        row_bytes = dtype.itemsize * int(np.prod(shape, dtype=int))
+        with open(self._file(name), 'rb') as f:
+            data = np.fromfile(f, dtype=dtype, count=(stop - start) * row_bytes // dtype.itemsize,
+                               offset=start * row_bytes)
+        return data.reshape((-1,) + shape)
+
+    def _write(self, name, start, rows):
+        dtype, shape = self._row_shape(name)
+        row_bytes = dtype.itemsize * int(np.prod(shape, dtype=int))
+        mode = 'r+b' if os.path.exists(self._file(name)) else 'wb'
+        with open(self._file(name), mode) as f:
+            f.seek(start * row_bytes)
+            f.write(np.ascontiguousarray(rows, dtype=dtype).tobytes())
+
+    def _map(self, name, length):
+        key = (name, length)
+        if key not in self._maps:
+            dtype, shape = self._row_shape(name)
+            if length == 0:
+                self._maps[key] = np.empty((0,) + shape, dtype=dtype)
+            else:
+                self._maps[key] = np.memmap(self._file(name), dtype=dtype, mode='r',
+                                            shape=(length,) + shape)
+        return self._maps[key]
+
+    def _save_meta(self):
+        tmp = self._file(META_FILE + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(self.meta, f)
+        os.replace(tmp, self._file(META_FILE))
+
+    # -- building ----------------------------------------------------------
+
+    def _reset(self, columns, **source):
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                os.remove(self._file(name))
+        os.makedirs(self.directory, exist_ok=True)
+        self.meta = dict({'columns': columns, 'count': 0, 'consumed': 0, 'offset': None}, **source)
+        self._maps = {}
+
+    def _same_source(self, inode, first, last_row):
+        """Is the indexed prefix still at the start of the data file?
+
+        Retention compaction and rotation replace the file (new inode),
+        a rewrite in place changes its first row; the last indexed row
+        must still sit where the index stopped reading.
+        """
+        meta = self.meta
+        if meta is None or meta.get('inode') != inode:
+            return False
+        if meta['consumed'] == 0:
+            return True
+        return meta.get('first') == first and last_row() == meta.get('last')
+
+    def update(self):
+        """Index the rows appended to the data file since the last update"""
+        with self.lock:
+            mapped = _mapped_source(self.path)
+            if mapped is None:
+                self._update_csv()
+            else:
+                self._update_mapped(*mapped)
+        return self
+
+    def _update_mapped(self, inode, timestamps, values):
+        columns = list(values)
+        first = int(timestamps[0]) if len(timestamps) else None
+
+        def last_row():
+            consumed = self.meta['consumed']
+            return int(timestamps[consumed - 1]) if len(timestamps) >= consumed else None
+
+        if not (self._same_source(inode, first, last_row) and self.meta['columns'] == columns):
+            self._reset(columns, inode=inode)
+        consumed = self.meta['consumed']
+        if len(timestamps) == consumed:
+            return
+        self.meta['first'] = first
+        self.meta['last'] = int(timestamps[-1])
+        self.meta['consumed'] = len(timestamps)
+        self._add(np.asarray(timestamps[consumed:], dtype=np.int64),
+                  np.column_stack([np.asarray(values[c][consumed:], dtype=np.float64) for c in columns]))
+
+    def _update_csv(self):
+        """Parse only the bytes past the position reached by the last update"""
+        inode = os.stat(self.path).st_ino
+        header, first = _csv_head(self.path)
+        if header is None:
+            return
+        if self._same_source(inode, first, lambda: _csv_row_before(self.path, self.meta['position'])) \
+                and self.meta.get('header') == header:
+            rows, position = _csv_rows(self.path, self.meta['position'])
+            if set(self.meta['columns']) - set(_numeric_columns(header, rows)):
+                # A column taken for numbers holds text, index the file again
+                self.meta = None
+                return self._update_csv()
+        else:
+            rows, position = _csv_rows(self.path, 0)
+            rows.pop(0)
+            self._reset(_numeric_columns(header, rows), inode=inode, header=header)
+        self.meta['position'] = position
+        if not rows:
+            return
+        self.meta['first'] = first
+        self.meta['last'] = _row_timestamp(rows[-1])
+        timestamps, values = _parse_rows(header, self.meta['columns'], rows)
+        self.meta['consumed'] += len(rows)
+        self._add(timestamps, values)
+
+    def _add(self, new_ts, new_values):
+        # Ranges are found by binary search, so keep timestamps sorted:
+        # drop NaT rows and rows older than an already indexed one
+        count = self.meta['count']
+        last = self._read('timestamp.i64', count - 1, count)[0] if count else NAT
+        valid = new_ts != NAT
+        running = np.maximum.accumulate(np.maximum(np.where(valid, new_ts, last), last))
+        keep = valid & (new_ts == running)
+        self._append(new_ts[keep], new_values[keep])
+        self._save_meta()
+
+    def _append(self, timestamps, values):
+        old_n = self.meta['count']
+        new_n = old_n + len(timestamps)
+        if new_n == old_n:
+            return
+        self._maps = {}
+
+        if self.meta['offset'] is None:
+            finite = values[np.isfinite(values).all(axis=1)]
+            first = finite[0] if len(finite) else np.nan_to_num(values[0])
+            self.meta['offset'] = [float(v) for v in np.nan_to_num(first)]
+        offset = np.array(self.meta['offset'])
+
+        # Prefix sums (count, sum, sum of squares), row i covers samples [0, i)
+        finite = np.isfinite(values)
+        shifted = np.where(finite, values - offset, 0.0)
+        steps = np.stack([finite.astype(np.float64), shifted, shifted * shifted], axis=-1)
+        base = self._read('prefix.f64', old_n, old_n + 1)[0] if old_n else np.zeros(steps.shape[1:])
+        if not old_n:
+            self._write('prefix.f64', 0, base[None])
+        self._write('prefix.f64', old_n + 1, base + np.cumsum(steps, axis=0))
+
+        self._write('timestamp.i64', old_n, timestamps)
+        self._write('values.f32', old_n, values)
+
+        # Min/max tree: recompute the tail of every level touched by the new rows
+        lo = old_n
+        level = 1
+        while _level_length(level - 1, new_n) > 1:
+            lo >>= 1
+            start, stop = 2 * lo, _level_length(level - 1, new_n)
+            for kind, reduce in (('min', np.fmin), ('max', np.fmax)):
+                below = 'values.f32' if level == 1 else f"{kind}_{level - 1}.f32"
+                rows = self._read(below, start, stop)
+                if len(rows) % 2:
+                    rows = np.concatenate([rows, rows[-1:]])
+                self._write(f"{kind}_{level}.f32", lo, reduce(rows[0::2], rows[1::2]))
+            level += 1
+        self.meta['count'] = new_n
+
+    # -- queries -----------------------------------------------------------
+
+    def _bounds(self, start, end):
+        count = self.meta['count']
+        timestamps = self._map('timestamp.i64', count)
+        lo = 0 if start is None else int(np.searchsorted(timestamps, start, 'left'))
+        hi = count if end is None else int(np.searchsorted(timestamps, end, 'right'))
+        return lo, max(lo, hi)
+
+    def _min_max(self, column, lo, hi):
+        """Walk the tree bottom-up, at most two entries per level"""
+        count = self.meta['count']
+        low, high = np.nan, np.nan
+        level = 0
+        while lo < hi:
+            if level == 0:
+                mins = maxs = self._map('values.f32', count)
+            else:
+                length = _level_length(level, count)
+                mins = self._map(f"min_{level}.f32", length)
+                maxs = self._map(f"max_{level}.f32", length)
+            if lo & 1:
+                low, high = np.fmin(low, mins[lo, column]), np.fmax(high, maxs[lo, column])
+                lo += 1
+            if hi & 1:
+                hi -= 1
+                low, high = np.fmin(low, mins[hi, column]), np.fmax(high, maxs[hi, column])
+            lo >>= 1
+            hi >>= 1
+            level += 1
+        return low, high
+
+    def stats(self, column, start=None, end=None):
+        """count/mean/var/std/min/max of a column between two ns timestamps (inclusive)"""
+        with self.lock:
+            i = self.meta['columns'].index(column)
+            lo, hi = self._bounds(start, end)
+            prefix = self._map('prefix.f64', self.meta['count'] + 1)
+            count, total, squares = prefix[hi, i] - prefix[lo, i]
+            if count == 0:
+                return {'count': 0, 'mean': None, 'var': None, 'std': None, 'min': None, 'max': None}
+            mean = total / count
+            var = max(squares / count - mean * mean, 0.0)
+            low, high = self._min_max(i, lo, hi)
+            return {
+                'count': int(count),
+                'mean': float(self.meta['offset'][i] + mean),
+                'var': float(var),
+                'std': float(np.sqrt(var)),
+                'min': float(low),
+                'max': float(high),
+            }
+
+
+def _level_length(level, n):
+    # ceil(n / 2**level)
+    return -(-n >> level)
+
+
+def _timestamp(value):
+    if value is None or isinstance(value, (int, np.integer)):
+        return value
+    # Naive wall-clock, like the timestamps of every source view
+    return int(np.datetime64(value, 'ns').astype(np.int64))
+
+
+def get_index(path):
+    """Shared, freshly updated index of a data file"""
+    key = os.path.abspath(path)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = RangeIndex(key)
+    return index.update()
+
+
+def range_stats(path, column, start=None, end=None):
+    """Statistics of one column between two datetimes (or ns timestamps)"""
+    return get_index(path).stats(column, _timestamp(start), _timestamp(end))
@@ -0,0 +1,203 @@
+"""Memory-mapped columnar store shared between processes.
+
+A store is a directory with one raw little-endian file per column:
+
+    environmental_data.cols/
+        meta.json        column names and dtypes
+        timestamp.i64    epoch nanoseconds (datetime.timestamp())
+        c0.f32, c1.f32   one float32 file per value column
+
+Writers append a row by writing the value files first and the timestamp
+last, so the timestamp file length is the committed row count. Readers
+np.memmap the files without parsing anything, and every process shares the
+same OS page cache instead of holding its own parsed copy. open_columns()
+and frame() turn the timestamps into naive local wall-clock, like a CSV
+parsed by pandas or wspolne.serie.
+
+Rows are written and stores mapped under wspolne.zapis.append_lock on the
+store directory; expire() swaps in shorter files under it exclusively, so
+a reader never maps column files of two generations.
+
+Convert existing history with:
+
+    python -m wspolne.kolumny temp_wilgotnosc_cisnienie/environmental_data.csv
+"""
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from wspolne import magazyn, zapis
+
+TIMESTAMP_FILE = 'timestamp.i64'
+META_FILE = 'meta.json'
+NAT = np.iinfo(np.int64).min
+
+
+def store_path(path):
+    """Columnar store directory for a CSV path ('x.csv' -> 'x.cols')"""
+    if path.endswith('.cols'):
+        return path
+    return os.path.splitext(path)[0] + '.cols'
+
+
+def timestamp_ns(timestamp):
+    """Epoch nanoseconds of a (naive, local) datetime, as stored"""
+    return magazyn.epoch_us(timestamp) * 1000
+
+
+def _column_file(i):
+    return f"c{i}.f32"
+
+
+def read_meta(path):
+    with open(os.path.join(store_path(path), META_FILE)) as f:
+        return json.load(f)
+
+
+class ColumnWriter:
+    """Single writer appending rows to a columnar store"""
+
+    def __init__(self, path, columns, timestamp_column='Timestamp'):
+        self.path = store_path(path)
+        self.columns = list(columns)
+        os.makedirs(self.path, exist_ok=True)
+        meta_path = os.path.join(self.path, META_FILE)
+        if os.path.exists(meta_path):
+            meta = read_meta(self.path)
+            if meta['columns'] != self.columns:
+                raise ValueError(f"{self.path} has columns {meta['columns']}, expected {self.columns}")
+        else:
+            with open(meta_path, 'w') as f:
+                json.dump({
+                    'timestamp_column': timestamp_column,
+                    'columns': self.columns,
+                    'timestamp': 'int64 epoch ns',
+                    'values': 'float32',
+                }, f)
+
+        names = [_column_file(i) for i in range(len(self.columns))] + [TIMESTAMP_FILE]
+        self.files = [os.path.join(self.path, name) for name in names]
+        with zapis.append_lock(self.path):
+            for name in self.files:
+                open(name, 'ab').close()
+            # Drop a row that was only partly written before a crash
+            rows = min(os.path.getsize(f) // (8 if f.endswith('.i64') else 4) for f in self.files)
+            for name in self.files:
+                with open(name, 'r+b') as f:
+                    f.truncate(rows * (8 if name.endswith('.i64') else 4))
+            self._open()
+
+    def _open(self):
+        # Unbuffered, so readers see each row as soon as write() returns
+        self.value_files = [open(name, 'ab', buffering=0) for name in self.files[:-1]]
+        self.timestamp_file = open(self.files[-1], 'ab', buffering=0)
+        self.inode = os.fstat(self.timestamp_file.fileno()).st_ino
+
+    def _append(self, values, timestamps):
+        with zapis.append_lock(self.path):
+            # expire() swapped the files, follow the paths to the new ones
+            if os.stat(self.files[-1]).st_ino != self.inode:
+                self.close()
+                self._open()
+            for f, data in zip(self.value_files, values):
+                f.write(data)
+            self.timestamp_file.write(timestamps)
+
+    def write(self, timestamp, values):
+        self._append([np.float32(np.nan if value is None else value).tobytes() for value in values],
+                     np.int64(timestamp_ns(timestamp)).tobytes())
+
+    def write_many(self, timestamps_ns, columns):
+        """Append a batch: int64 ns timestamps and one array per column"""
+        self._append([np.asarray(values, dtype='<f4').tobytes() for values in columns],
+                     np.asarray(timestamps_ns, dtype='<i8').tobytes())
+
+    def close(self):
+        for f in self.value_files + [self.timestamp_file]:
+            f.close()
+
+
+def _memmap(name, dtype, count):
+    if count == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(name, dtype=dtype, mode='r', shape=(count,))
+
+
+def open_columns(path):
+    """Map a store read-only: (int64 local wall-clock ns, {column: float32 values})"""
+    path = store_path(path)
+    meta = read_meta(path)
+    with zapis.append_lock(path):
+        count = os.path.getsize(os.path.join(path, TIMESTAMP_FILE)) // 8
+        timestamps = _memmap(os.path.join(path, TIMESTAMP_FILE), '<i8', count)
+        columns = {
+            name: _memmap(os.path.join(path, _column_file(i)), '<f4', count)
+            for i, name in enumerate(meta['columns'])
+        }
+    return magazyn.local_ns(timestamps), columns
+
+
+def expire(path, cutoff, min_fraction=0.0):
+    """Drop the rows older than a datetime, return how many
+
+    Only once they make up `min_fraction` of the store, so it is rewritten
+    rarely.
+    """
+    path = store_path(path)
+    meta = read_meta(path)
+    names = [_column_file(i) for i in range(len(meta['columns']))] + [TIMESTAMP_FILE]
+    with zapis.append_lock(path, exclusive=True):
+        timestamp_file = os.path.join(path, TIMESTAMP_FILE)
+        count = os.path.getsize(timestamp_file) // 8
+        expired = int(np.searchsorted(_memmap(timestamp_file, '<i8', count), timestamp_ns(cutoff)))
+        if expired == 0 or expired < count * min_fraction:
+            return 0
+        for name in names:
+            size = 8 if name.endswith('.i64') else 4
+            with open(os.path.join(path, name), 'rb') as src, \
+                    open(os.path.join(path, name + '.tmp'), 'wb') as dst:
+                src.seek(expired * size)
+                dst.write(src.read((count - expired) * size))
+        for name in names:
+            os.replace(os.path.join(path, name + '.tmp'), os.path.join(path, name))
+    return expired
+
+
+def frame(path, columns=None):
+    """DataFrame over the mapped columns, timestamps as datetime64[ns]"""
+    timestamp_column = read_meta(path).get('timestamp_column', 'Timestamp')
+    timestamps, values = open_columns(path)
+    data = {timestamp_column: timestamps.view('datetime64[ns]')}
+    for name in columns or list(values):
+        if name == timestamp_column:
+            continue
+        if name not in values:
+            raise KeyError(f"Column '{name}' not found in {store_path(path)}")
+        data[name] = values[name]
+    return pd.DataFrame(data, copy=False)
+
+
+def import_csv(csv_path, chunk_rows=100_000):
+    """Append the rows of an existing CSV file to its columnar store"""
+    writer = None
+    try:
+        for chunk in pd.read_csv(csv_path, chunksize=chunk_rows):
+            header = list(chunk.columns)
+            if writer is None:
+                writer = ColumnWriter(csv_path, header[1:], timestamp_column=header[0])
+            stamps = pd.to_datetime(chunk[header[0]], errors='coerce')
+            ns = magazyn.from_local_ns(stamps.to_numpy(dtype='datetime64[ns]').view('int64'))
+            values = [pd.to_numeric(chunk[c], errors='coerce').to_numpy() for c in header[1:]]
+            writer.write_many(ns, values)
+    finally:
+        if writer is not None:
+            writer.close()
+    return store_path(csv_path)
+
+
+if __name__ == '__main__':
+    for name in sys.argv[1:]:
+        print(f"{name} -> {import_csv(name)}")
@@ -0,0 +1,170 @@
+"""Source-side compression: drop rows a reader can reconstruct within an error.
+
+Two methods, each with a maximum error per value column:
+
+    deadband       write a row once a value moves more than the error away
+                   from the last written one; read back by holding the last
+                   value (reconstruct(..., method='hold'))
+    swinging_door  write the turning points of a piecewise linear trend;
+                   read back by linear interpolation between rows
+                   (reconstruct(..., method='linear'))
+
+A heartbeat forces a row at least every `heartbeat` seconds so readers can
+tell a flat signal from a dead logger. Wrap any sink with
+
+    sink = open_sink('csv', path, headers, compression={'method': 'swinging_door',
+                     'error': [0.05], 'heartbeat': 600})
+"""
+import numpy as np
+
+DEADBAND = 'deadband'
+SWINGING_DOOR = 'swinging_door'
+
+
+class Deadband:
+    """Absolute error, or relative to the last written value with relative=True"""
+
+    def __init__(self, error, relative=False):
+        self.error = error
+        self.relative = relative
+        self.reference = None
+
+    def reset(self, t, value):
+        self.reference = value
+
+    def accepts(self, t, value):
+        if value is None or self.reference is None:
+            return value is None and self.reference is None
+        band = self.error * abs(self.reference) if self.relative else self.error
+        return abs(value - self.reference) <= band
+
+
+class SwingingDoor:
+    """Swinging door trending with a strict error bound
+
+    A point is dropped only if the line from the last archived point to it
+    stays within the error of every point in between, so linear
+    interpolation between written rows never misses by more than `error`.
+    """
+
+    def __init__(self, error):
+        self.error = error
+        self.origin = None
+        # Slopes from the origin every line has to stay between
+        self.low = -np.inf
+        self.high = np.inf
+
+    def reset(self, t, value):
+        self.origin = (t, value)
+        self.low = -np.inf
+        self.high = np.inf
+
+    def accepts(self, t, value):
+        t0, v0 = self.origin
+        if value is None or v0 is None:
+            return value is None and v0 is None
+        dt = t - t0
+        if dt <= 0:
+            return value == v0
+        slope = (value - v0) / dt
+        if not self.low <= slope <= self.high:
+            return False
+        # Narrow the door so later lines still pass within the error of this point
+        self.low = max(self.low, (value - v0 - self.error) / dt)
+        self.high = min(self.high, (value - v0 + self.error) / dt)
+        return True
+
+
+class CompressingSink:
+    """Filters rows before they reach `sink`, same write()/close() interface
+
+    error  per value column, None leaves the column out of the decision
+    """
+
+    def __init__(self, sink, method=SWINGING_DOOR, error=None, relative=False, heartbeat=None):
+        if method not in (DEADBAND, SWINGING_DOOR):
+            raise ValueError(f"Compression method must be '{DEADBAND}' or '{SWINGING_DOOR}'")
+        if error is None:
+            raise ValueError("Compression needs a maximum error per value column")
+        self.sink = sink
+        self.method = method
+        self.heartbeat = heartbeat
+        self.channels = []
+        for i, e in enumerate(error):
+            if e is None:
+                continue
+            channel = Deadband(e, relative) if method == DEADBAND else SwingingDoor(e)
+            self.channels.append((i, channel))
+        self.written_at = None
+        # Swinging door writes the last row inside the door, held until then
+        self.held = None
+        self.received = 0
+        self.written = 0
+
+    def _write(self, timestamp, values):
+        self.sink.write(timestamp, values)
+        self.written += 1
+        self.written_at = timestamp.timestamp()
+        for i, channel in self.channels:
+            channel.reset(self.written_at, values[i])
+
+    def _accepts(self, t, values):
+        # Every channel sees the point so all doors narrow together
+        results = [channel.accepts(t, values[i]) for i, channel in self.channels]
+        return all(results)
+
+    def write(self, timestamp, values):
+        self.received += 1
+        t = timestamp.timestamp()
+        if self.written_at is None:
+            self._write(timestamp, values)
+            return
+        if self.method == DEADBAND:
+            if not self._accepts(t, values) or self._heartbeat_due(t):
+                self._write(timestamp, values)
+            return
+
+        if not self._accepts(t, values):
+            # The previous row ends the segment, the door restarts from it
+            if self.held is not None:
+                self._write(*self.held)
+                self.held = None
+                if self._accepts(t, values):
+                    self.held = (timestamp, values)
+                    return
+            self._write(timestamp, values)
+            return
+        if self._heartbeat_due(t):
+            self._write(timestamp, values)
+            self.held = None
+        else:
+            self.held = (timestamp, values)
+
+    def _heartbeat_due(self, t):
+        return self.heartbeat is not None and t - self.written_at >= self.heartbeat
+
+    def flush(self):
+        """Write the held row so the stored series ends at the last sample"""
+        if self.held is not None:
+            self._write(*self.held)
+            self.held = None
+
+    def close(self):
+        self.flush()
+        self.sink.close()
+
+
+def reconstruct(times, values, at, method='linear'):
+    """Values at times `at` from compressed rows (times ascending, as numbers)
+
+    method  'linear' for swinging door, 'hold' for deadband
+    """
+    times = np.asarray(times, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    at = np.asarray(at, dtype=np.float64)
+    if method == 'linear':
+        return np.interp(at, times, values)
+    if method == 'hold':
+        index = np.searchsorted(times, at, side='right') - 1
+        return values[np.clip(index, 0, len(values) - 1)]
+    raise ValueError("Method must be 'linear' or 'hold'")
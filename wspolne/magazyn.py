@@ -0,0 +1,334 @@
+"""Storage sinks shared by the sensor loggers and the ingest server.
+
+Every sink takes a datetime and a list of values per row:
+
+    sink = open_sink('csv', 'light_readings.csv', ['Timestamp', 'Light_Level_lx'], decimals=[2])
+    sink.write(datetime.now(), [light_level])
+    sink.close()
+
+open_sink() puts optional stages (filtering, compression, uplink,
+rotation, buffering, background persistence) around a sink; its
+docstring is the one place their settings are described, the loggers'
+config constants point there.
+"""
+import csv
+import io
+import os
+from datetime import datetime
+
+import numpy as np
+
+from wspolne import zapis
+
+# Format used by the Pi loggers, None means datetime.isoformat() (server)
+LOGGER_TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def _format_value(value, decimals):
+    if value is None:
+        return ''
+    if decimals is None or isinstance(value, str):
+        return value
+    return f"{value:.{decimals}f}"
+
+
+def format_row(timestamp, values, decimals, timestamp_format=LOGGER_TIMESTAMP_FORMAT):
+    """CSV cells of one row: formatted timestamp, then the rounded values"""
+    if timestamp_format is None:
+        stamp = timestamp.isoformat()
+    else:
+        stamp = timestamp.strftime(timestamp_format)
+    return [stamp] + [_format_value(v, d) for v, d in zip(values, decimals)]
+
+
+def epoch_us(timestamp):
+    """Epoch microseconds of a (naive, local) datetime"""
+    return int(round(timestamp.timestamp() * 1_000_000))
+
+
+# The binary stores (gorilla, kolumny, rekordy) keep epoch timestamps;
+# their array views use naive local wall-clock datetime64, like a parsed CSV
+_EPOCH = datetime(1970, 1, 1)
+_DAY = 86400
+_NAT = np.iinfo(np.int64).min
+
+
+def _utc_offset(seconds):
+    return round((datetime.fromtimestamp(seconds) - _EPOCH).total_seconds()) - seconds
+
+
+def _utc_offsets_ns(ns):
+    """Local UTC offset in ns at every epoch ns timestamp"""
+    seconds = ns // 1_000_000_000
+    valid = seconds[ns != _NAT]
+    if len(valid) == 0:
+        return np.zeros(len(ns), dtype=np.int64)
+    # Offsets only change at DST switches: probe every day, bisect the changes
+    t, end = int(valid.min()), int(valid.max())
+    edges, offsets = [], [_utc_offset(t)]
+    while t < end:
+        step = min(t + _DAY, end)
+        if _utc_offset(step) != offsets[-1]:
+            lo, hi = t, step
+            while hi - lo > 1:
+                mid = (lo + hi) // 2
+                lo, hi = (mid, hi) if _utc_offset(mid) == offsets[-1] else (lo, mid)
+            edges.append(hi)
+            offsets.append(_utc_offset(hi))
+        t = step
+    index = np.searchsorted(np.array(edges, dtype=np.int64), seconds, 'right')
+    return np.array(offsets, dtype=np.int64)[index] * 1_000_000_000
+
+
+def local_ns(epoch_ns):
+    """Naive local wall-clock ns of epoch ns timestamps (NaT stays NaT)"""
+    epoch_ns = np.asarray(epoch_ns, dtype=np.int64)
+    return np.where(epoch_ns == _NAT, _NAT, epoch_ns + _utc_offsets_ns(epoch_ns))
+
+
+def from_local_ns(local):
+    """Epoch ns of naive local wall-clock ns timestamps (NaT stays NaT)"""
+    local = np.asarray(local, dtype=np.int64)
+    guess = local - _utc_offsets_ns(local)
+    return np.where(local == _NAT, _NAT, local - _utc_offsets_ns(guess))
+
+
+class CsvSink:
+    """Plain CSV rows, the historical format
+
+    Without `buffering` the file is opened for every row; with it (options
+    of wspolne.zapis.BufferedWriter) it stays open and rows go out in blocks.
+    """
+
+    def __init__(self, path, headers, decimals=None, timestamp_format=LOGGER_TIMESTAMP_FORMAT,
+                 buffering=None):
+        self.path = path
+        self.headers = list(headers)
+        self.decimals = decimals or [None] * (len(self.headers) - 1)
+        self.timestamp_format = timestamp_format
+        # Create CSV file with headers if it doesn't exist
+        if not os.path.exists(path):
+            with open(path, 'w', newline='') as file:
+                csv.writer(file).writerow(self.headers)
+        self.writer = None
+        if buffering is not None:
+            self.writer = zapis.BufferedWriter(path, **buffering)
+
+    def format_row(self, timestamp, values):
+        return format_row(timestamp, values, self.decimals, self.timestamp_format)
+
+    def write(self, timestamp, values):
+        if self.writer is not None:
+            line = io.StringIO(newline='')
+            csv.writer(line).writerow(self.format_row(timestamp, values))
+            self.writer.append(line.getvalue().encode('utf-8'))
+            return
+        # Retention compaction swaps the file, see zapis.append_lock
+        with zapis.append_lock(self.path), open(self.path, 'a', newline='') as file:
+            csv.writer(file).writerow(self.format_row(timestamp, values))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+class GorillaSink:
+    """Delta-of-delta / XOR compressed blocks, see wspolne.gorilla"""
+
+    def __init__(self, path, headers, decimals=None, timestamp_format=LOGGER_TIMESTAMP_FORMAT,
+                 block_size=None, buffering=None):
+        # Already buffered: rows are kept until a block is full or its
+        # first row is max_age old (BUFFERING's, else zapis' default)
+        from wspolne import gorilla
+
+        self.path = gorilla.block_path(path)
+        self.headers = list(headers)
+        self.decimals = decimals or [None] * (len(self.headers) - 1)
+        # Loggers only keep whole seconds, the server keeps microseconds
+        resolution = gorilla.MICROSECONDS if timestamp_format is None else gorilla.SECONDS
+        self.writer = gorilla.GorillaWriter(
+            self.path,
+            self.headers[1:],
+            resolution=resolution,
+            block_size=block_size or gorilla.DEFAULT_BLOCK_SIZE,
+            decimals=self.decimals,
+            max_age=(buffering or {}).get('max_age', zapis.DEFAULT_MAX_AGE),
+        )
+
+    def write(self, timestamp, values):
+        self.writer.write(epoch_us(timestamp), values)
+
+    def close(self):
+        self.writer.close()
+
+
+class ColumnarSink:
+    """Memory-mapped columnar store shared between processes, see wspolne.kolumny"""
+
+    def __init__(self, path, headers, decimals=None, timestamp_format=LOGGER_TIMESTAMP_FORMAT,
+                 buffering=None):
+        # Column files stay open, rows are written as they come so other
+        # processes see them at once; buffering doesn't apply
+        from wspolne import kolumny
+
+        self.path = kolumny.store_path(path)
+        self.headers = list(headers)
+        self.writer = kolumny.ColumnWriter(path, self.headers[1:], timestamp_column=self.headers[0])
+
+    def write(self, timestamp, values):
+        self.writer.write(timestamp, values)
+
+    def close(self):
+        self.writer.close()
+
+
+class RecordSink:
+    """Fixed-width binary records readable with np.memmap, see wspolne.rekordy"""
+
+    def __init__(self, path, headers, decimals=None, timestamp_format=LOGGER_TIMESTAMP_FORMAT,
+                 buffering=None):
+        from wspolne import rekordy
+
+        self.path = rekordy.record_path(path)
+        self.headers = list(headers)
+        self.writer = rekordy.RecordWriter(
+            path,
+            self.headers[1:],
+            timestamp_column=self.headers[0],
+            decimals=decimals,
+            timestamp_format=timestamp_format,
+            buffering=buffering,
+        )
+
+    def write(self, timestamp, values):
+        self.writer.write(timestamp, values)
+
+    def close(self):
+        self.writer.close()
+
+
+SINKS = {
+    'csv': CsvSink,
+    'gorilla': GorillaSink,
+    'kolumny': ColumnarSink,
+    'rekordy': RecordSink,
+}
+
+
+class SinkRouter:
+    """One shared writer for several series, each routed to its own sink"""
+
+    def __init__(self, storage='csv', root='.', **options):
+        self.storage = storage
+        self.root = root
+        # Passed to every sink, e.g. buffering={...}
+        self.options = options
+        self.sinks = {}
+
+    def register(self, series, path, headers, decimals=None, **options):
+        """Open the sink of one series, `options` override the shared ones"""
+        self.sinks[series] = open_sink(
+            self.storage,
+            os.path.join(self.root, path),
+            headers,
+            decimals=decimals,
+            **dict(self.options, **options)
+        )
+
+    def write(self, series, timestamp, values):
+        self.sinks[series].write(timestamp, values)
+
+    def close(self):
+        for sink in self.sinks.values():
+            sink.close()
+
+    def report(self):
+        """Persistence report of every series written in the background"""
+        from wspolne import utrwalanie
+        return '\n'.join(f"{series}: {sink.report()}" for series, sink in self.sinks.items()
+                         if isinstance(sink, utrwalanie.BackgroundSink))
+
+
+def open_sink(storage, path, headers, compression=None, background=None, uplink=None,
+              rotation=None, filtering=None, **options):
+    """Open a sink of the given storage format, with optional stages around it
+
+    storage      'csv' (plain rows), 'gorilla' (compressed blocks, see
+                 wspolne.gorilla), 'kolumny' (memory-mapped columns shared
+                 between processes, wspolne.kolumny) or 'rekordy'
+                 (fixed-width binary records, wspolne.rekordy); gorilla
+                 keeps a block in memory until it has block_size rows or
+                 its first row is buffering's max_age (default 60 s) old,
+                 a crash loses at most that block
+
+    Every stage is off with None. A written row passes them in this order:
+
+    background   {'capacity': rows, 'when_full': 'block' | 'drop'}: rows go
+                 through a ring to a persistence thread so disk stalls don't
+                 delay readings; a full ring makes the caller wait, or drops
+                 the row and counts it (wspolne.utrwalanie)
+    filtering    {'filters': [...], 'keep_raw': bool, 'separate': bool}:
+                 per value column a chain of 'median', 'hampel', 'ewma' or
+                 'kalman' filters, see wspolne.filtry; keep_raw also stores
+                 the readings in <name>_raw<ext>, separate leaves them in
+                 the file and writes the filtered rows to <name>_filtered<ext>
+    compression  {'method': 'deadband' | 'swinging_door', 'error': [...],
+                 'heartbeat': s}: drops rows that can be rebuilt within
+                 'error' per value column (None: every row), with a forced
+                 row every 'heartbeat' seconds (wspolne.kompresja)
+    uplink       {'url': ..., 'series': ...}: stored rows are spooled next to
+                 the data file and forwarded to serwer.py, so nothing is lost
+                 while the server or Wi-Fi is down (wspolne.przesyl)
+    rotation     {'period': 'day' | 'hour', 'max_bytes': n}: CSV only, the
+                 file moves into a .segments directory and closed segments
+                 are gzipped (wspolne.segmenty); serie, the dashboards and
+                 serwer.py /stats then only see the current segment
+    buffering    {'max_age': s, 'max_bytes': n}: the file stays open and
+                 rows are appended in blocks, on exit and on SIGUSR1
+                 (wspolne.zapis); None opens the file for every row
+    """
+    try:
+        sink_class = SINKS[storage]
+    except KeyError:
+        raise ValueError(f"Unknown storage format '{storage}', expected one of {sorted(SINKS)}")
+    if rotation:
+        if storage != 'csv':
+            raise ValueError(f"Rotation is only supported for CSV files, not '{storage}'")
+        from wspolne import segmenty
+        sink = segmenty.RotatingSink(sink_class, path, headers, **rotation, **options)
+    else:
+        sink = sink_class(path, headers, **options)
+    if uplink:
+        # Inside the compression stage, so only stored rows are forwarded
+        from wspolne import przesyl
+        sink = przesyl.UplinkSink(
+            sink, path, headers,
+            decimals=options.get('decimals'),
+            timestamp_format=options.get('timestamp_format', LOGGER_TIMESTAMP_FORMAT),
+            **uplink
+        )
+    if compression:
+        from wspolne import kompresja
+        sink = kompresja.CompressingSink(sink, **compression)
+    if filtering:
+        # Outside compression, so spikes never force a stored row
+        from wspolne import filtry
+        filtering = dict(filtering)
+        keep_raw = filtering.pop('keep_raw', False)
+        if filtering.pop('separate', False):
+            if keep_raw:
+                raise ValueError("Filtering takes 'keep_raw' or 'separate', not both")
+            # The readings go through the stages above, the filtered rows
+            # are stored beside them
+            filtered_sink = open_sink(storage, filtry.filtered_path(path), headers, rotation=rotation,
+                                      **options)
+            sink = filtry.FilteringSink(filtered_sink, raw_sink=sink, **filtering)
+        else:
+            raw_sink = None
+            if keep_raw:
+                raw_sink = open_sink(storage, filtry.raw_path(path), headers, rotation=rotation, **options)
+            sink = filtry.FilteringSink(sink, raw_sink=raw_sink, **filtering)
+    if background is not None:
+        from wspolne import utrwalanie
+        sink = utrwalanie.BackgroundSink(sink, **background)
+    return sink
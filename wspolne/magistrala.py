@@ -0,0 +1,281 @@
+"""Shared I2C bus and timer wheel for the acquisition daemon.
+
+One process owns bus 1 behind a lock and polls every sensor from a single
+timer wheel, instead of one interpreter with its own sleep loop per sensor.
+Sensors due on the same tick have their conversions triggered first and
+collected as each becomes ready, so a tick takes about as long as the
+slowest conversion instead of the sum of all of them.
+
+Ticks fall on the wall-clock grid (see wspolne.harmonogram) and each batch
+is stamped with its tick's grid time, so sensors sampled at compatible
+periods share exact timestamps. Daemon.combine() also writes every batch
+as one wide row holding all sensors' columns (see TickRecords), so
+cross-sensor queries read columns of one file instead of joining three.
+"""
+import threading
+from datetime import datetime
+
+from wspolne.harmonogram import CLOCK, grid_delay
+
+DEFAULT_TICK = 0.1
+DEFAULT_SLOTS = 128
+
+# Series name of the wide rows in the sink router
+COMBINED = 'combined'
+# Cells of sensors not read on a tick: left empty, or the last reading
+# repeated until the sensor is due again
+NULL = 'null'
+CARRY = 'carry'
+
+
+class SharedBus:
+    """I2C bus whose transactions are serialised by one lock"""
+
+    def __init__(self, number=1, device=None):
+        if device is None:
+            import smbus2
+            device = smbus2.SMBus(number)
+        self.device = device
+        # Re-entrant, so a driver can hold it across a multi-step read
+        self.lock = threading.RLock()
+
+    def __getattr__(self, name):
+        attr = getattr(self.device, name)
+        if not callable(attr):
+            return attr
+
+        def locked(*args, **kwargs):
+            with self.lock:
+                return attr(*args, **kwargs)
+        return locked
+
+    def close(self):
+        with self.lock:
+            self.device.close()
+
+
+class TimerWheel:
+    """Hashed timer wheel: O(1) scheduling, one sleep per tick for all timers"""
+
+    def __init__(self, tick=DEFAULT_TICK, slots=DEFAULT_SLOTS, clock=CLOCK):
+        self.clock = clock
+        self.tick = tick
+        self.slots = [[] for _ in range(slots)]
+        self.current = 0
+        self.ticks = 0
+        # Set by run(): monotonic and wall time of tick 0, on the tick grid
+        self.start = None
+        self.start_wall = None
+        self.wall_time = None
+        self.unanchored = []
+
+    def schedule(self, period, callback, delay=None):
+        """Call callback() every `period` seconds, first after `delay`
+
+        Without a delay the first call lands on the next wall-clock
+        multiple of `period`.
+        """
+        timer = {
+            'period_ticks': self.period_ticks(period),
+            'callback': callback,
+        }
+        if delay is not None:
+            self._insert(timer, max(0, round(delay / self.tick)))
+        elif self.start_wall is None:
+            # Aligned once run() knows the wall time of tick 0
+            self.unanchored.append((timer, period))
+        else:
+            self._insert(timer, self._grid_ticks(period))
+        return timer
+
+    def period_ticks(self, period):
+        return max(1, round(period / self.tick))
+
+    def _grid_ticks(self, period):
+        """Ticks from the current one to the next wall-clock multiple of `period`"""
+        now = self.start_wall + self.ticks * self.tick
+        return round((-now % period) / self.tick) % self.period_ticks(period)
+
+    def _insert(self, timer, ticks, fired=False):
+        slot = (self.current + ticks) % len(self.slots)
+        if fired:
+            # The current slot is done, it is next visited a full turn
+            # later: count the rounds from the slot after it
+            timer['rounds'] = (ticks - 1) // len(self.slots)
+        else:
+            timer['rounds'] = ticks // len(self.slots)
+        self.slots[slot].append(timer)
+
+    def anchor(self):
+        """Put tick 0 on the next wall-clock multiple of the tick"""
+        wall, mono = self.clock.time(), self.clock.monotonic()
+        delay = grid_delay(self.tick, wall)
+        self.start_wall = wall + delay
+        self.start = mono + delay
+        for timer, period in self.unanchored:
+            self._insert(timer, self._grid_ticks(period))
+        self.unanchored = []
+
+    def advance(self):
+        """Fire the timers due in the current slot and move to the next one"""
+        self.wall_time = self.start_wall + self.ticks * self.tick if self.start_wall is not None else self.clock.time()
+        due, waiting = [], []
+        for timer in self.slots[self.current]:
+            if timer['rounds'] == 0:
+                due.append(timer)
+            else:
+                timer['rounds'] -= 1
+                waiting.append(timer)
+        self.slots[self.current] = waiting
+        for timer in due:
+            try:
+                timer['callback']()
+            finally:
+                self._insert(timer, timer['period_ticks'], fired=True)
+        self.current = (self.current + 1) % len(self.slots)
+        self.ticks += 1
+
+    def run(self, stop_event, on_tick=None):
+        """Advance once per tick until stop_event is set"""
+        if self.start is None:
+            self.anchor()
+        while not stop_event.is_set():
+            # Sleep to the absolute tick time so slow callbacks don't add up
+            delay = self.start + self.ticks * self.tick - self.clock.monotonic()
+            if delay > 0 and self.clock.wait(stop_event, delay):
+                break
+            self.advance()
+            if on_tick is not None:
+                on_tick()
+
+
+class TickRecords:
+    """Builds one wide row per tick from the readings of the sensors read on it
+
+    With fill='carry' a reading is repeated until its sensor's next
+    scheduled read, so a failed read shows up as empty cells instead of a
+    stale value.
+    """
+
+    def __init__(self, fill=NULL):
+        if fill not in (NULL, CARRY):
+            raise ValueError(f"Fill must be '{NULL}' or '{CARRY}'")
+        self.fill = fill
+        # (sensor, period in ticks) in column order
+        self.sensors = []
+        # Sensor name -> (tick, values) of its last reading
+        self.last = {}
+
+    def add(self, sensor, period_ticks):
+        self.sensors.append((sensor, period_ticks))
+
+    def headers(self):
+        """Timestamp, then every sensor's value columns, prefixed only where names clash"""
+        names = [h for sensor, _ in self.sensors for h in sensor.headers[1:]]
+        headers = ['Timestamp']
+        for sensor, _ in self.sensors:
+            for header in sensor.headers[1:]:
+                headers.append(header if names.count(header) == 1 else f"{sensor.name}_{header}")
+        return headers
+
+    def decimals(self):
+        return [d for sensor, _ in self.sensors for d in sensor.decimals]
+
+    def row(self, tick, readings):
+        """Values of one tick, `readings` maps sensor name -> values read on it"""
+        row = []
+        for sensor, period_ticks in self.sensors:
+            values = readings.get(sensor.name)
+            if values is not None:
+                self.last[sensor.name] = (tick, values)
+            elif self.fill == CARRY and sensor.name in self.last:
+                read_at, last = self.last[sensor.name]
+                if tick - read_at < period_ticks:
+                    values = last
+            row.extend(values if values is not None else [None] * (len(sensor.headers) - 1))
+        return row
+
+
+class Daemon:
+    """Polls sensors on one bus and writes every reading through one sink router"""
+
+    def __init__(self, bus, router, tick=DEFAULT_TICK, clock=CLOCK):
+        self.bus = bus
+        self.router = router
+        self.clock = clock
+        self.wheel = TimerWheel(tick, clock=clock)
+        self.stop_event = threading.Event()
+        self.errors = {}
+        self.due = []
+        self.last_batch_time = 0.0
+        self.sensors = []
+        self.combined = None
+
+    def add(self, sensor, period, delay=None, **sink_options):
+        """Sample `sensor` every `period` seconds, on the wall-clock grid by default
+
+        sink_options (e.g. filtering={...}) apply to this sensor's sink only.
+        """
+        self.router.register(sensor.name, sensor.filename, sensor.headers, sensor.decimals,
+                             **sink_options)
+        self.errors[sensor.name] = 0
+        self.sensors.append((sensor, period))
+        return self.wheel.schedule(period, lambda: self.due.append(sensor), delay)
+
+    def combine(self, filename, fill=NULL, **sink_options):
+        """Also write each tick's readings as one wide row to `filename`
+
+        Call after add(): the columns are those of the sensors added so far.
+        """
+        self.combined = TickRecords(fill)
+        for sensor, period in self.sensors:
+            self.combined.add(sensor, self.wheel.period_ticks(period))
+        self.router.register(COMBINED, filename, self.combined.headers(), self.combined.decimals(),
+                             **sink_options)
+
+    def _error(self, sensor, e):
+        self.errors[sensor.name] += 1
+        print(f"Error reading {sensor.name}: {e}")
+
+    def sample_due(self):
+        """Trigger every due sensor, then collect each result once it is ready"""
+        if not self.due:
+            return
+        due, self.due = self.due, []
+        # Grid time of the tick, not the time the reads happen to run
+        timestamp = datetime.fromtimestamp(round(self.wheel.wall_time, 6))
+        started = self.clock.monotonic()
+
+        pending = []
+        for sensor in due:
+            try:
+                with self.bus.lock:
+                    ready_at = self.clock.monotonic() + sensor.start()
+            except Exception as e:
+                self._error(sensor, e)
+                continue
+            pending.append((ready_at, sensor))
+
+        readings = {}
+        pending.sort(key=lambda item: item[0])
+        for ready_at, sensor in pending:
+            delay = ready_at - self.clock.monotonic()
+            if delay > 0:
+                self.clock.sleep(delay)
+            try:
+                with self.bus.lock:
+                    values = sensor.collect()
+            except Exception as e:
+                self._error(sensor, e)
+                continue
+            self.router.write(sensor.name, timestamp, values)
+            readings[sensor.name] = values
+        if self.combined is not None and readings:
+            self.router.write(COMBINED, timestamp, self.combined.row(self.wheel.ticks, readings))
+        self.last_batch_time = self.clock.monotonic() - started
+
+    def run(self):
+        self.wheel.run(self.stop_event, on_tick=self.sample_due)
+
+    def stop(self):
+        self.stop_event.set()
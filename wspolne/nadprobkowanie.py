@@ -0,0 +1,61 @@
+"""Continuous high-rate sampling reduced to one statistics row per interval.
+
+A background thread reads the sensor at a fixed data rate into one of two
+preallocated ring buffers. reduce() swaps the buffers and turns the
+finished one into mean/min/max/std, so one stored row summarises every
+conversion of the interval instead of a single noisy sample.
+"""
+import threading
+import time
+
+from wspolne.bufor import RingBuffer, summarize
+
+
+class ContinuousSampler:
+    def __init__(self, read, rate, interval):
+        self.read = read
+        self.rate = rate
+        # Room for a full interval plus some slack for a late reduce()
+        capacity = int(rate * interval * 1.5) + 1
+        self.buffers = [RingBuffer(capacity), RingBuffer(capacity)]
+        self.active = 0
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.errors = 0
+        self.thread = threading.Thread(target=self._run, name='continuous-sampler', daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def _run(self):
+        period = 1.0 / self.rate
+        next_read = time.monotonic()
+        while not self.stop_event.is_set():
+            try:
+                value = self.read()
+            except Exception:
+                self.errors += 1
+            else:
+                with self.lock:
+                    self.buffers[self.active].append(value)
+            # Pace reads at the data rate, a new conversion is ready each period
+            next_read += period
+            delay = next_read - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_read = time.monotonic()
+
+    def reduce(self):
+        """Statistics of every sample since the previous call"""
+        with self.lock:
+            finished = self.buffers[self.active]
+            self.active ^= 1
+        stats = summarize(finished.values())
+        finished.clear()
+        return stats
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
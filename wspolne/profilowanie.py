@@ -0,0 +1,206 @@
+"""Per-device I2C transaction profiling.
+
+ProfiledBus stands in front of an smbus/smbus2 handle or a Blinka
+busio.I2C and times every call that addresses a device (the first
+argument is the address, or an smbus2 i2c_msg). Per device and method it
+keeps a latency histogram, the failed attempts and the retries, and over
+all devices the time the bus was busy, so a report shows how much of a
+sampling tick is bus traffic and how close the bus is to saturation:
+
+    bus = profilowanie.profile(smbus2.SMBus(1), interval=300)
+
+Each bus is reported every `interval` seconds of its own (never with
+None), all of them on SIGUSR1. The duty cycle only covers this process:
+add up the loggers' numbers when several of them share the bus.
+"""
+import signal
+import threading
+import time
+
+from wspolne import czujniki
+from wspolne.harmonogram import Histogram
+
+# Transactions at 100 kHz take 0.1 .. 2 ms, finer buckets than the
+# scheduler's
+TRANSACTION_BOUNDS_MS = [0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 1.5, 2, 3, 5, 10, 20, 50, 100]
+# Pause before repeating a failed transaction
+DEFAULT_RETRY_DELAY = 0.001
+
+DEVICE_NAMES = {
+    czujniki.BH1750_ADDRESS: 'bh1750',
+    czujniki.BME280_ADDRESS: 'bme280',
+    czujniki.BME280_ADDRESS + 1: 'bme280',
+    czujniki.ADS1115_ADDRESS: 'ads1115',
+}
+
+_buses = []
+_dump_requested = threading.Event()
+# Wakes the reporter for a dump or a newly profiled bus
+_wakeup = threading.Event()
+_reporter = None
+
+
+def _address(args):
+    """Device address of a bus call, None for calls like try_lock() or scan()"""
+    if not args:
+        return None
+    if isinstance(args[0], int):
+        return args[0]
+    return getattr(args[0], 'addr', None)
+
+
+class ProfiledBus:
+    """Same interface as the bus it wraps, every transaction is measured
+
+    retries      how many times a transaction failing with OSError (NACK,
+                 arbitration lost) is repeated before the error reaches the
+                 driver
+    errors       failed attempts, retried or not
+    """
+
+    def __init__(self, device, retries=0, retry_delay=DEFAULT_RETRY_DELAY, names=None,
+                 interval=None):
+        self.device = device
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.names = dict(DEVICE_NAMES, **(names or {}))
+        self.stats = {}
+        self.lock = threading.Lock()
+        self.busy = 0.0
+        self.started = time.monotonic()
+        # Busy time and start of the current report window
+        self.window_busy = 0.0
+        self.window_started = self.started
+        # Seconds between periodic reports, None for SIGUSR1 only
+        self.interval = interval
+        self.next_report = None if interval is None else self.started + interval
+
+    def _stats(self, address, method):
+        key = (address, method)
+        stats = self.stats.get(key)
+        if stats is None:
+            with self.lock:
+                stats = self.stats.setdefault(key, {
+                    'latency': Histogram(TRANSACTION_BOUNDS_MS),
+                    'errors': 0,
+                    'retries': 0,
+                })
+        return stats
+
+    def _record(self, stats, seconds, failed=False, retried=False):
+        with self.lock:
+            stats['latency'].add(seconds)
+            self.busy += seconds
+            self.window_busy += seconds
+            if failed:
+                stats['errors'] += 1
+            if retried:
+                stats['retries'] += 1
+
+    def __getattr__(self, name):
+        attr = getattr(self.device, name)
+        if not callable(attr):
+            return attr
+
+        def profiled(*args, **kwargs):
+            address = _address(args)
+            if address is None:
+                return attr(*args, **kwargs)
+            stats = self._stats(address, name)
+            attempt = 0
+            while True:
+                started = time.monotonic()
+                try:
+                    result = attr(*args, **kwargs)
+                except OSError:
+                    retry = attempt < self.retries
+                    # A failed attempt held the bus too
+                    self._record(stats, time.monotonic() - started, failed=True, retried=retry)
+                    if not retry:
+                        raise
+                    attempt += 1
+                    time.sleep(self.retry_delay)
+                    continue
+                self._record(stats, time.monotonic() - started)
+                return result
+        # Later lookups skip __getattr__
+        setattr(self, name, profiled)
+        return profiled
+
+    def close(self):
+        self.device.close()
+
+    def report(self):
+        """Per-device table and duty cycle, starts a new report window"""
+        now = time.monotonic()
+        with self.lock:
+            total = now - self.started
+            window = now - self.window_started
+            duty = self.busy / total if total > 0 else 0.0
+            window_duty = self.window_busy / window if window > 0 else 0.0
+            self.window_busy = 0.0
+            self.window_started = now
+            lines = [f"bus busy {self.busy:.3f} s, duty cycle {duty * 100:.3f} % "
+                     f"({window_duty * 100:.3f} % over the last {window:.0f} s)"]
+            for (address, method), s in sorted(self.stats.items(), key=lambda item: item[0]):
+                name = self.names.get(address, 'device')
+                lines.append(f"  {name} 0x{address:02x} {method}: {s['latency'].summary()}, "
+                             f"{s['errors']} errors, {s['retries']} retries")
+        return '\n'.join(lines)
+
+
+def report():
+    """Reports of every bus profiled by this process"""
+    return '\n'.join(bus.report() for bus in _buses)
+
+
+def _report_loop():
+    while True:
+        due = [bus.next_report for bus in _buses if bus.interval is not None]
+        _wakeup.wait(max(0.0, min(due) - time.monotonic()) if due else None)
+        _wakeup.clear()
+        requested = _dump_requested.is_set()
+        _dump_requested.clear()
+        now = time.monotonic()
+        for bus in list(_buses):
+            if bus.interval is not None and now >= bus.next_report:
+                bus.next_report = now + bus.interval
+            elif not requested:
+                continue
+            print(f"Bus: {bus.report()}")
+
+
+def request_report():
+    """Ask the reporter thread to print now, safe in signal handlers"""
+    _dump_requested.set()
+    _wakeup.set()
+
+
+def install_signal_handler():
+    """SIGUSR1 also prints the bus report, after whatever it did before"""
+    previous = signal.getsignal(signal.SIGUSR1)
+
+    def handler(signum, frame):
+        request_report()
+        if callable(previous):
+            previous(signum, frame)
+    signal.signal(signal.SIGUSR1, handler)
+
+
+def profile(device, interval=None, **options):
+    """ProfiledBus around `device`, reported every `interval` seconds and on SIGUSR1
+
+    Options go to ProfiledBus. Call it from the main thread, it installs the
+    signal handler.
+    """
+    global _reporter
+    bus = ProfiledBus(device, interval=interval, **options)
+    _buses.append(bus)
+    if _reporter is None:
+        _reporter = threading.Thread(target=_report_loop, name='bus-report', daemon=True)
+        _reporter.start()
+        install_signal_handler()
+    else:
+        # Its interval may come up before the one being waited for
+        _wakeup.set()
+    return bus
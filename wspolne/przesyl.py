@@ -0,0 +1,357 @@
+"""Store-and-forward uplink from the Pi loggers to the ingest server.
+
+Every row a logger stores is also appended to a local spool with a
+sequence number. One forwarder thread per process sends unacknowledged
+rows to serwer.py's /ingest endpoint as gzip JSON batches over a single
+keep-alive HTTP connection (the Flask development server closes it after
+every response, a WSGI server such as gunicorn keeps it open). The server
+answers with its cursor (last sequence number stored per source and
+series), which is the only thing that moves the spool forward, so:
+
+    - a dropped connection or a restart resends from the server's cursor,
+      rows the server already has are skipped there (no duplicates)
+    - the server refuses to skip ahead (no gaps) unless the spool itself
+      no longer has the missing rows, which the server then records
+
+While the server is unreachable rows pile up in the spool; after a
+reconnect they drain at most `rate` rows per second so the backlog doesn't
+swamp the server or the Wi-Fi link.
+
+    sink = open_sink('csv', path, headers, uplink={'url': 'http://server:5000', 'series': 'light'})
+"""
+import gzip
+import http.client
+import json
+import os
+import socket
+import threading
+from urllib.parse import urlencode, urlparse
+
+SEGMENT_RECORDS = 10000
+# Spooled rows are written out in batches of this many bytes, or when the
+# forwarder reads the spool (at least every POLL_INTERVAL)
+FLUSH_BYTES = 16 * 1024
+DEFAULT_BATCH = 500
+# Rows per second when draining a backlog
+DEFAULT_RATE = 500
+# How often an idle forwarder looks for new rows
+POLL_INTERVAL = 2.0
+MAX_BACKOFF = 60.0
+TIMEOUT = 10.0
+
+_uplinks = {}
+_uplinks_lock = threading.Lock()
+
+
+class Spool:
+    """Append-only on-disk queue of (seq, row) records for one series
+
+    Records are JSON lines in segment files named after their first
+    sequence number; a segment is deleted once all of it is acknowledged.
+    The directory is only listed on start: the segments are tracked in
+    memory, the newest one stays open for appending and reads continue
+    from the byte offset after the last acknowledged record. Appends are
+    batched like zapis.BufferedWriter: a crash loses at most the unflushed
+    rows, which are still in the logger's own file.
+    """
+
+    def __init__(self, directory, series, headers):
+        self.directory = directory
+        self.series = series
+        self.headers = list(headers)
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.acked = self._load_cursor()
+        # Re-synced with the server before anything is sent
+        self.synced = False
+        # [first seq, path] of every segment, oldest first
+        self.segments = self._list_segments()
+        self.segment_count = 0
+        self.next_seq = max(self.acked, self._last_seq()) + 1
+        self.file = None
+        self.unflushed = 0
+        # (seq, path, offset): where the record after `seq` starts
+        self.resume = None
+
+    def _cursor_path(self):
+        return os.path.join(self.directory, 'cursor')
+
+    def _load_cursor(self):
+        try:
+            with open(self._cursor_path()) as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _list_segments(self):
+        segments = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.log'):
+                segments.append([int(name[:-4]), os.path.join(self.directory, name)])
+        return sorted(segments)
+
+    def _last_seq(self):
+        if not self.segments:
+            return 0
+        first, path = self.segments[-1]
+        last = first - 1
+        count = 0
+        complete = 0
+        with open(path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                last = json.loads(line)[0]
+                count += 1
+                complete += len(line)
+        if complete < os.path.getsize(path):
+            # Torn record from a crash, appends must start on a new line
+            os.truncate(path, complete)
+        self.segment_count = count
+        return last
+
+    def append(self, row):
+        with self.lock:
+            if self.file is None or self.segment_count >= SEGMENT_RECORDS:
+                if self.file is not None:
+                    self.file.close()
+                    self.unflushed = 0
+                if not self.segments or self.segment_count >= SEGMENT_RECORDS:
+                    path = os.path.join(self.directory, f'{self.next_seq:012d}.log')
+                    self.segments.append([self.next_seq, path])
+                    self.segment_count = 0
+                self.file = open(self.segments[-1][1], 'ab')
+            line = json.dumps([self.next_seq] + row, separators=(',', ':')) + '\n'
+            self.file.write(line.encode('utf-8'))
+            self.unflushed += len(line)
+            if self.unflushed >= FLUSH_BYTES:
+                self._flush()
+            self.next_seq += 1
+            self.segment_count += 1
+
+    def _flush(self):
+        if self.file is not None and self.unflushed:
+            self.file.flush()
+            self.unflushed = 0
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+                self.unflushed = 0
+
+    def pending(self):
+        return self.next_seq - 1 - self.acked
+
+    def read(self, limit):
+        """Up to `limit` records after the acknowledged cursor"""
+        records = []
+        with self.lock:
+            # The forwarder has to see the buffered rows
+            self._flush()
+            segments = [tuple(segment) for segment in self.segments]
+            acked = self.acked
+        resume = self.resume
+        for i, (first, path) in enumerate(segments):
+            following = segments[i + 1][0] if i + 1 < len(segments) else None
+            if following is not None and following <= acked + 1:
+                continue
+            offset = 0
+            if resume is not None and resume[0] == acked and resume[1] == path:
+                # Everything before the offset is acknowledged
+                offset = resume[2]
+            with open(path, 'rb') as f:
+                f.seek(offset)
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break
+                    offset += len(line)
+                    record = json.loads(line)
+                    if record[0] > acked:
+                        records.append(record)
+                        if len(records) >= limit:
+                            break
+            if records:
+                self.resume = (records[-1][0], path, offset)
+            if len(records) >= limit:
+                break
+        return records
+
+    def ack(self, cursor):
+        """Move the cursor to what the server has stored, drop finished segments"""
+        with self.lock:
+            self.acked = cursor
+            # A server ahead of us (spool lost) must not see reused numbers
+            self.next_seq = max(self.next_seq, cursor + 1)
+            tmp = self._cursor_path() + '.tmp'
+            with open(tmp, 'w') as f:
+                f.write(str(cursor))
+            os.replace(tmp, self._cursor_path())
+            # The newest segment is never removed, appends go there
+            while len(self.segments) > 1 and self.segments[1][0] <= cursor + 1:
+                os.remove(self.segments.pop(0)[1])
+
+
+class Uplink:
+    """Forwards every registered spool over one persistent HTTP connection"""
+
+    def __init__(self, url, source=None, batch=DEFAULT_BATCH, rate=DEFAULT_RATE):
+        parsed = urlparse(url)
+        self.host = parsed.hostname
+        self.port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+        self.https = parsed.scheme == 'https'
+        self.prefix = parsed.path.rstrip('/')
+        self.source = source or socket.gethostname()
+        self.batch = batch
+        self.rate = rate
+        self.spools = []
+        self.connection = None
+        self.stop_event = threading.Event()
+        self.thread = None
+        # Metrics
+        self.sent = 0
+        self.requests = 0
+        self.failures = 0
+        self.gaps = 0
+        self.connects = 0
+
+    def add(self, spool):
+        self.spools.append(spool)
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name='uplink', daemon=True)
+            self.thread.start()
+
+    def _connect(self):
+        if self.connection is None:
+            connection_class = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            self.connection = connection_class(self.host, self.port, timeout=TIMEOUT)
+            self.connects += 1
+        return self.connection
+
+    def _disconnect(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def _request(self, method, path, body=None, headers=None):
+        connection = self._connect()
+        connection.request(method, self.prefix + path, body=body, headers=headers or {})
+        response = connection.getresponse()
+        # Read the whole body so the connection can be reused
+        data = response.read()
+        if response.getheader('Connection', '').lower() == 'close':
+            self._disconnect()
+        if response.status not in (200, 409):
+            raise OSError(f"{method} {path}: HTTP {response.status} {data[:200]!r}")
+        return response.status, json.loads(data)
+
+    def _sync(self, spool):
+        query = urlencode({'source': self.source, 'series': spool.series})
+        _, reply = self._request('GET', f'/ingest/cursor?{query}')
+        spool.ack(reply['cursor'])
+        spool.synced = True
+
+    def _send(self, spool):
+        """Send one batch, return the number of records the server took"""
+        records = spool.read(self.batch)
+        if not records:
+            return 0
+        # The spool no longer has the rows right after the cursor
+        allow_gap = records[0][0] > spool.acked + 1
+        payload = {
+            'source': self.source,
+            'series': spool.series,
+            'headers': spool.headers,
+            'allow_gap': allow_gap,
+            'records': records,
+        }
+        body = gzip.compress(json.dumps(payload, separators=(',', ':')).encode('utf-8'))
+        status, reply = self._request('POST', '/ingest', body, {
+            'Content-Type': 'application/json',
+            'Content-Encoding': 'gzip',
+        })
+        self.requests += 1
+        if allow_gap and status == 200:
+            self.gaps += 1
+        taken = max(0, reply['cursor'] - spool.acked)
+        spool.ack(reply['cursor'])
+        self.sent += taken
+        return taken
+
+    def _run(self):
+        backoff = 1.0
+        while not self.stop_event.is_set():
+            busy = False
+            try:
+                for spool in list(self.spools):
+                    if not spool.synced:
+                        self._sync(spool)
+                    taken = self._send(spool)
+                    if taken:
+                        busy = True
+                        # Bounded drain rate for backlogs
+                        self.stop_event.wait(taken / self.rate)
+                backoff = 1.0
+            except (OSError, http.client.HTTPException, ValueError, KeyError) as e:
+                self.failures += 1
+                self._disconnect()
+                for spool in self.spools:
+                    spool.synced = False
+                print(f"Uplink to {self.host}:{self.port} failed ({e}), retrying in {backoff:.0f} s")
+                self.stop_event.wait(backoff)
+                backoff = min(backoff * 2, MAX_BACKOFF)
+                continue
+            if not busy:
+                self.stop_event.wait(POLL_INTERVAL)
+
+    def close(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+        self._disconnect()
+
+    def report(self):
+        pending = sum(spool.pending() for spool in self.spools)
+        return (f"{self.sent} rows sent in {self.requests} requests, {pending} pending, "
+                f"{self.failures} failures, {self.connects} connections, {self.gaps} gaps")
+
+
+def report():
+    """Metrics of every uplink opened by this process"""
+    with _uplinks_lock:
+        return '\n'.join(uplink.report() for uplink in _uplinks.values())
+
+
+def get_uplink(url, source=None, **options):
+    """Shared uplink per server, so every series of a process uses one connection"""
+    key = (url, source)
+    with _uplinks_lock:
+        if key not in _uplinks:
+            _uplinks[key] = Uplink(url, source, **options)
+        return _uplinks[key]
+
+
+class UplinkSink:
+    """Writes to `sink` and spools the same row for the server"""
+
+    def __init__(self, sink, path, headers, url, series, source=None, decimals=None,
+                 timestamp_format=None, spool_dir=None, **options):
+        from wspolne.magazyn import format_row
+
+        self.sink = sink
+        self.format_row = format_row
+        self.decimals = decimals or [None] * (len(headers) - 1)
+        self.timestamp_format = timestamp_format
+        self.spool = Spool(spool_dir or path + '.spool', series, headers)
+        self.uplink = get_uplink(url, source, **options)
+        self.uplink.add(self.spool)
+
+    def write(self, timestamp, values):
+        self.sink.write(timestamp, values)
+        self.spool.append(self.format_row(timestamp, values, self.decimals, self.timestamp_format))
+
+    def close(self):
+        # Unsent rows stay in the spool and go out after the next start
+        self.sink.close()
+        self.spool.close()
@@ -0,0 +1,280 @@
+"""Fixed-width binary record logs for the sensor loggers.
+
+A CSV row like '2024-11-14 08:46:33,22.02,71.64,1004.99,42.24' costs about
+45 bytes and a parse on every read. A record log stores the same row in
+8 + 4 * channels bytes:
+
+    environmental_data.rec
+        b'REC1', u32 header length, JSON header (channels, dtypes, CSV
+        formatting), padded to 8 bytes
+        records: int64 epoch microseconds, then one float32 per channel,
+                 little-endian
+
+Every record has the same size, so record i sits at a known offset and
+np.memmap gives O(1) random access without reading the rest of the file.
+A partial record at the end (crash, buffered block cut) is ignored.
+Records are appended under wspolne.zapis.append_lock, expire() cuts old
+ones from the front under it exclusively.
+
+Convert between the formats, e.g. to keep the vis.py scripts working:
+
+    python -m wspolne.rekordy to-csv temp_wilgotnosc_cisnienie/environmental_data.rec
+    python -m wspolne.rekordy to-rec temp_wilgotnosc_cisnienie/environmental_data.csv
+"""
+import csv
+import json
+import os
+import struct
+import sys
+from datetime import timedelta
+
+import numpy as np
+
+from wspolne import magazyn, zapis
+
+MAGIC = b'REC1'
+EXTENSION = '.rec'
+ALIGNMENT = 8
+# Rows per chunk when converting
+CHUNK_ROWS = 100_000
+
+def record_path(path):
+    """Record log for a CSV path ('x.csv' -> 'x.rec')"""
+    if path.endswith(EXTENSION):
+        return path
+    return os.path.splitext(path)[0] + EXTENSION
+
+
+def timestamp_us(timestamp):
+    """Epoch microseconds of a (naive, local) datetime, as stored"""
+    return magazyn.epoch_us(timestamp)
+
+
+def record_dtype(channels):
+    """numpy dtype of one record: 't' (int64 us) and one float32 per channel"""
+    return np.dtype([('t', '<i8')] + [(f"c{i}", '<f4') for i in range(len(channels))])
+
+
+def _encode_header(header):
+    data = json.dumps(header).encode('utf-8')
+    # Records start on an 8 byte boundary
+    padding = -(len(MAGIC) + 4 + len(data)) % ALIGNMENT
+    data += b' ' * padding
+    return MAGIC + struct.pack('<I', len(data)) + data
+
+
+def read_header(path):
+    """(header dict, offset of the first record)"""
+    with open(record_path(path), 'rb') as f:
+        if f.read(4) != MAGIC:
+            raise ValueError(f"{record_path(path)} is not a record log")
+        (length,) = struct.unpack('<I', f.read(4))
+        return json.loads(f.read(length)), 8 + length
+
+
+class RecordWriter:
+    """Single writer appending records to a log
+
+    Without `buffering` every record is one unbuffered write, so readers
+    see it at once; with it (options of wspolne.zapis.BufferedWriter) the
+    records go out in blocks.
+    """
+
+    def __init__(self, path, channels, timestamp_column='Timestamp', decimals=None,
+                 timestamp_format=None, buffering=None):
+        self.path = record_path(path)
+        self.channels = list(channels)
+        self.record = struct.Struct('<q' + 'f' * len(self.channels))
+        if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+            header, offset = read_header(self.path)
+            if header['channels'] != self.channels:
+                raise ValueError(f"{self.path} has channels {header['channels']}, expected {self.channels}")
+            # Drop a record that was only partly written
+            size = os.path.getsize(self.path)
+            with open(self.path, 'r+b') as f:
+                f.truncate(size - (size - offset) % self.record.size)
+        else:
+            with open(self.path, 'wb') as f:
+                f.write(_encode_header({
+                    'timestamp_column': timestamp_column,
+                    'channels': self.channels,
+                    'timestamp': 'int64 epoch us',
+                    'values': 'float32',
+                    'record_size': self.record.size,
+                    # Only used to turn records back into the original CSV
+                    'decimals': decimals or [None] * len(self.channels),
+                    'timestamp_format': timestamp_format,
+                }))
+        if buffering is not None:
+            self.writer = zapis.BufferedWriter(self.path, **buffering)
+            self.file = None
+        else:
+            self.writer = None
+            self.file = open(self.path, 'ab', buffering=0)
+
+    def _append(self, data):
+        if self.writer is not None:
+            self.writer.append(data)
+            return
+        with zapis.append_lock(self.path):
+            # expire() swapped the file, follow the path to the new one
+            if os.stat(self.path).st_ino != os.fstat(self.file.fileno()).st_ino:
+                self.file.close()
+                self.file = open(self.path, 'ab', buffering=0)
+            self.file.write(data)
+
+    def write(self, timestamp, values):
+        data = self.record.pack(
+            timestamp_us(timestamp),
+            *[np.nan if value is None else value for value in values]
+        )
+        self._append(data)
+
+    def write_many(self, timestamps_us, columns):
+        """Append a batch: int64 epoch us timestamps and one array per channel"""
+        records = np.empty(len(timestamps_us), dtype=record_dtype(self.channels))
+        records['t'] = timestamps_us
+        for i, values in enumerate(columns):
+            records[f"c{i}"] = values
+        self._append(records.tobytes())
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        else:
+            self.file.close()
+
+
+def open_records(path):
+    """Map a log read-only: (header, structured array with 't', 'c0', 'c1', ...)"""
+    header, offset = read_header(path)
+    dtype = record_dtype(header['channels'])
+    count = (os.path.getsize(record_path(path)) - offset) // dtype.itemsize
+    if count == 0:
+        return header, np.empty(0, dtype=dtype)
+    return header, np.memmap(record_path(path), dtype=dtype, mode='r', offset=offset, shape=(count,))
+
+
+def open_columns(path):
+    """Same shape as kolumny.open_columns: (int64 local ns timestamps, {channel: float32 values})"""
+    header, records = open_records(path)
+    columns = {name: records[f"c{i}"] for i, name in enumerate(header['channels'])}
+    return magazyn.local_ns(records['t'] * 1000), columns
+
+
+def frame(path, columns=None):
+    """DataFrame over the mapped records, timestamps as datetime64[ns]"""
+    import pandas as pd
+
+    header, records = open_records(path)
+    timestamp_column = header.get('timestamp_column', 'Timestamp')
+    data = {timestamp_column: magazyn.local_ns(records['t'] * 1000).view('datetime64[ns]')}
+    for name in columns or header['channels']:
+        if name == timestamp_column:
+            continue
+        if name not in header['channels']:
+            raise KeyError(f"Channel '{name}' not found in {record_path(path)}")
+        data[name] = np.asarray(records[f"c{header['channels'].index(name)}"])
+    return pd.DataFrame(data)
+
+
+def find(path, timestamp):
+    """Index of the first record at or after a datetime (binary search)"""
+    _, records = open_records(path)
+    return int(np.searchsorted(records['t'], timestamp_us(timestamp)))
+
+
+def expire(path, cutoff, min_fraction=0.0):
+    """Drop the records older than a datetime, return how many
+
+    Only once they make up `min_fraction` of the log, so it is rewritten
+    rarely.
+    """
+    path = record_path(path)
+    with zapis.append_lock(path, exclusive=True):
+        header, records = open_records(path)
+        _, offset = read_header(path)
+        expired = int(np.searchsorted(records['t'], timestamp_us(cutoff)))
+        if expired == 0 or expired * records.itemsize < os.path.getsize(path) * min_fraction:
+            return 0
+        with open(path, 'rb') as src, open(path + '.tmp', 'wb') as dst:
+            dst.write(src.read(offset))
+            src.seek(offset + expired * records.itemsize)
+            for chunk in iter(lambda: src.read(1024 * 1024), b''):
+                dst.write(chunk)
+        del records
+        os.replace(path + '.tmp', path)
+    return expired
+
+
+def import_csv(csv_path, chunk_rows=CHUNK_ROWS, decimals=None, timestamp_format=None):
+    """Append the rows of a CSV file to its record log"""
+    import pandas as pd
+
+    writer = None
+    try:
+        for chunk in pd.read_csv(csv_path, chunksize=chunk_rows):
+            header = list(chunk.columns)
+            if writer is None:
+                if timestamp_format is None and len(chunk):
+                    # Keep the loggers' format unless the file has sub-second stamps
+                    sample = str(chunk[header[0]].iloc[0])
+                    timestamp_format = None if 'T' in sample or '.' in sample else '%Y-%m-%d %H:%M:%S'
+                writer = RecordWriter(csv_path, header[1:], timestamp_column=header[0],
+                                      decimals=decimals or _guess_decimals(chunk, header[1:]),
+                                      timestamp_format=timestamp_format)
+            stamps = pd.to_datetime(chunk[header[0]], errors='coerce')
+            ns = magazyn.from_local_ns(stamps.to_numpy(dtype='datetime64[ns]').view('int64'))
+            values = [pd.to_numeric(chunk[c], errors='coerce').to_numpy() for c in header[1:]]
+            # Rows without a valid timestamp can't be stored
+            valid = ns != np.iinfo(np.int64).min
+            writer.write_many(ns[valid] // 1000, [v[valid] for v in values])
+    finally:
+        if writer is not None:
+            writer.close()
+    return record_path(csv_path)
+
+
+def _guess_decimals(chunk, columns):
+    """Decimal places of each column written with a fixed precision, else None"""
+    decimals = []
+    for column in columns:
+        text = chunk[column].dropna().astype(str)
+        places = text.str.partition('.')[2].str.len().unique()
+        decimals.append(int(places[0]) if len(places) == 1 else None)
+    return decimals
+
+
+def export_csv(path, csv_path=None, chunk_rows=CHUNK_ROWS):
+    """Write a record log back out as CSV with its original header and formatting"""
+    header, records = open_records(path)
+    csv_path = csv_path or os.path.splitext(record_path(path))[0] + '.csv'
+    decimals = header.get('decimals') or [None] * len(header['channels'])
+    timestamp_format = header.get('timestamp_format')
+    with open(csv_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow([header.get('timestamp_column', 'Timestamp')] + header['channels'])
+        for start in range(0, len(records), chunk_rows):
+            chunk = records[start:start + chunk_rows]
+            local_us = magazyn.local_ns(chunk['t'] * 1000) // 1000
+            stamps = [magazyn._EPOCH + timedelta(microseconds=int(t)) for t in local_us]
+            stamps = [s.isoformat() if timestamp_format is None else s.strftime(timestamp_format)
+                      for s in stamps]
+            cells = []
+            for i, d in enumerate(decimals):
+                values = chunk[f"c{i}"].astype(np.float64)
+                if d is None:
+                    cells.append(['' if np.isnan(v) else str(np.float32(v)) for v in values])
+                else:
+                    cells.append(['' if np.isnan(v) else f"{v:.{d}f}" for v in values])
+            writer.writerows(zip(stamps, *cells))
+    return csv_path
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3 or sys.argv[1] not in ('to-rec', 'to-csv'):
+        print("Usage: python -m wspolne.rekordy to-rec|to-csv FILE...")
+        sys.exit(1)
+    convert = import_csv if sys.argv[1] == 'to-rec' else export_csv
+    for name in sys.argv[2:]:
+        print(f"{name} -> {convert(name)}")
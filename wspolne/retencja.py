@@ -0,0 +1,435 @@
+"""Retention and downsampling policies for the raw sensor CSV files.
+
+The binary stores a logger may keep instead (wspolne.gorilla, rekordy,
+kolumny) lose their rows after the same raw_days; they get no rollups.
+
+Run from the repository root as a standalone job:
+
+    python -m wspolne.retencja
+
+or start it next to a logger with start_background().
+"""
+import csv
+import glob
+import gzip
+import importlib
+import io
+import json
+import math
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from wspolne import zapis
+
+# Repository root, policy paths are relative to it
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MINUTE = 60
+HOUR = 3600
+DAY = 24 * HOUR
+
+# Declarative retention policies per sensor file (glob patterns allowed):
+#   raw_days  - how long raw samples are kept (None = forever)
+#   rollups   - list of (bucket size in seconds, days to keep or None = forever)
+#   group_by  - optional column that splits one file into several series
+POLICIES = {
+    'swiatlo/light_readings.csv': {
+        'raw_days': 30,
+        'rollups': [(MINUTE, 365), (HOUR, None)],
+    },
+    'temp_wilgotnosc_cisnienie/environmental_data.csv': {
+        'raw_days': 30,
+        'rollups': [(MINUTE, 365), (HOUR, None)],
+    },
+    'jakosc_powietrza/mq135_readings.csv': {
+        'raw_days': 30,
+        'rollups': [(MINUTE, 365), (HOUR, None)],
+    },
+    'jakosc_powietrza/gas_readings.csv': {
+        'raw_days': 30,
+        'rollups': [(MINUTE, 365), (HOUR, None)],
+        'group_by': 'Series',
+    },
+    # demon.py with COMBINED set
+    'combined_readings.csv': {
+        'raw_days': 30,
+        'rollups': [(MINUTE, 365), (HOUR, None)],
+    },
+    # Unfiltered readings next to a filtered file (filtering with keep_raw)
+    'swiatlo/light_readings_raw.csv': {
+        'raw_days': 30,
+        'rollups': [],
+    },
+    'temp_wilgotnosc_cisnienie/environmental_data_raw.csv': {
+        'raw_days': 30,
+        'rollups': [],
+    },
+    'jakosc_powietrza/mq135_readings_raw.csv': {
+        'raw_days': 30,
+        'rollups': [],
+    },
+    # Filtered rows next to the readings (filtering with separate)
+    'swiatlo/light_readings_filtered.csv': {
+        'raw_days': 30,
+        'rollups': [],
+    },
+    'temp_wilgotnosc_cisnienie/environmental_data_filtered.csv': {
+        'raw_days': 30,
+        'rollups': [],
+    },
+    'jakosc_powietrza/mq135_readings_filtered.csv': {
+        'raw_days': 30,
+        'rollups': [],
+    },
+    'voltage_readings_server.csv': {
+        'raw_days': 30,
+        'rollups': [(MINUTE, 365), (HOUR, None)],
+        'group_by': 'device_id',
+    },
+    # Rows forwarded by the loggers (serwer.py /ingest), rolled up at the source
+    'ingest/*/*.csv': {
+        'raw_days': 30,
+        'rollups': [],
+    },
+}
+
+# Expired rows are only cut once they make up this much of a file, so a
+# file is rewritten rarely and the cost stays proportional to new data
+COMPACT_MIN_BYTES = 1024 * 1024
+COMPACT_MIN_FRACTION = 0.25
+
+DEFAULT_INTERVAL = 300
+
+_EPOCH = datetime(1970, 1, 1)
+_lock = threading.Lock()
+
+
+def parse_timestamp(value):
+    """Parse both logger ('2024-11-14 08:46:07') and server (ISO) timestamps"""
+    return datetime.fromisoformat(value)
+
+
+def _to_seconds(dt):
+    # Naive wall-clock seconds, so buckets line up with the CSV timestamps
+    return (dt - _EPOCH).total_seconds()
+
+
+def _bucket_label(bucket):
+    if bucket % DAY == 0:
+        return f"{bucket // DAY}d"
+    if bucket % HOUR == 0:
+        return f"{bucket // HOUR}h"
+    if bucket % MINUTE == 0:
+        return f"{bucket // MINUTE}min"
+    return f"{bucket}s"
+
+
+def rollup_path(path, bucket):
+    """Path of the rollup file for a raw file and bucket size"""
+    base, ext = os.path.splitext(path)
+    return f"{base}_{_bucket_label(bucket)}{ext}"
+
+
+def _state_path(path):
+    return path + '.retention.json'
+
+
+def _load_state(path):
+    try:
+        with open(_state_path(path)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'offset': 0, 'header': None, 'buckets': {}}
+
+
+def _save_state(path, state):
+    tmp = _state_path(path) + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp, _state_path(path))
+
+
+def _rollup_headers(header, group_by):
+    columns = [c for c in header[1:] if c != group_by]
+    headers = [header[0]]
+    if group_by:
+        headers.append(group_by)
+    headers.append('count')
+    for column in columns:
+        headers += [f"{column}_mean", f"{column}_min", f"{column}_max"]
+    return headers
+
+
+def _bucket_row(start, group, acc, group_by):
+    row = [(_EPOCH + timedelta(seconds=start)).strftime('%Y-%m-%d %H:%M:%S')]
+    if group_by:
+        row.append(group)
+    row.append(acc['count'])
+    for total, low, high in zip(acc['sum'], acc['min'], acc['max']):
+        if acc['count'] == 0 or low is None:
+            row += ['', '', '']
+        else:
+            row += [f"{total / acc['count']:.4f}", f"{low:.4f}", f"{high:.4f}"]
+    return row
+
+
+def _append_rows(path, headers, rows):
+    if not rows:
+        return
+    new_file = not os.path.exists(path)
+    with zapis.append_lock(path), open(path, 'a', newline='') as f:
+        writer = csv.writer(f)
+        if new_file:
+            writer.writerow(headers)
+        writer.writerows(rows)
+
+
+def _read_new_rows(path, state, opener=open):
+    """Read complete rows appended since the last pass"""
+    with opener(path, 'rb') as f:
+        f.seek(state['offset'])
+        data = f.read()
+    end = data.rfind(b'\n') + 1
+    if end == 0:
+        return []
+    state['offset'] += end
+    rows = list(csv.reader(io.StringIO(data[:end].decode('utf-8'))))
+    if state['header'] is None and rows:
+        state['header'] = rows.pop(0)
+    return rows
+
+
+def _accumulate(state, policy, rows):
+    """Fold new rows into the open buckets, return closed rollup rows per tier"""
+    header = state['header']
+    group_by = policy.get('group_by')
+    group_index = header.index(group_by) if group_by else None
+    value_indexes = [i for i in range(1, len(header)) if i != group_index]
+    closed = {bucket: [] for bucket, _ in policy['rollups']}
+
+    for row in rows:
+        if len(row) != len(header):
+            continue
+        try:
+            seconds = _to_seconds(parse_timestamp(row[0]))
+        except ValueError:
+            continue
+        group = row[group_index] if group_by else ''
+        values = []
+        for i in value_indexes:
+            try:
+                value = float(row[i])
+                values.append(value if math.isfinite(value) else None)
+            except ValueError:
+                values.append(None)
+
+        for bucket, _ in policy['rollups']:
+            tier = state['buckets'].setdefault(str(bucket), {})
+            start = seconds - seconds % bucket
+            acc = tier.get(group)
+            if acc is not None and acc['start'] != start:
+                closed[bucket].append(_bucket_row(acc['start'], group, acc, group_by))
+                acc = None
+            if acc is None:
+                acc = {
+                    'start': start,
+                    'count': 0,
+                    'sum': [0.0] * len(values),
+                    'min': [None] * len(values),
+                    'max': [None] * len(values),
+                }
+                tier[group] = acc
+            acc['count'] += 1
+            for i, value in enumerate(values):
+                if value is None:
+                    continue
+                acc['sum'][i] += value
+                acc['min'][i] = value if acc['min'][i] is None else min(acc['min'][i], value)
+                acc['max'][i] = value if acc['max'][i] is None else max(acc['max'][i], value)
+    return closed
+
+
+def _expired_offset(path, cutoff, limit):
+    """Byte offset of the first row newer than cutoff (never past limit)"""
+    with open(path, 'rb') as f:
+        header = f.readline()
+        offset = len(header)
+        while offset < limit:
+            line = f.readline()
+            if not line.endswith(b'\n'):
+                break
+            try:
+                ts = parse_timestamp(line.split(b',', 1)[0].decode('utf-8'))
+            except ValueError:
+                ts = None
+            if ts is not None and ts >= cutoff:
+                break
+            offset += len(line)
+    return len(header), min(offset, limit)
+
+
+def _last_row_start(path, size):
+    """Byte offset of the last complete row"""
+    start = max(0, size - 4096)
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read()
+    end = data.rfind(b'\n')
+    return start + data.rfind(b'\n', 0, max(end, 0)) + 1
+
+
+def _compact(path, header_len, cut):
+    """Drop bytes [header_len, cut), writers only wait for the last chunk and the swap"""
+    tmp = path + '.compact'
+    with open(path, 'rb') as src, open(tmp, 'wb') as dst:
+        dst.write(src.read(header_len))
+        src.seek(cut)
+        # Bulk of the copy while the loggers keep appending
+        for chunk in iter(lambda: src.read(1024 * 1024), b''):
+            dst.write(chunk)
+        # Writers hold the lock shared while they append, so once it is
+        # held exclusively nothing more lands in the old file; they follow
+        # the path to the new inode when they get it back
+        with zapis.append_lock(path, exclusive=True):
+            for chunk in iter(lambda: src.read(1024 * 1024), b''):
+                dst.write(chunk)
+            dst.flush()
+            os.replace(tmp, path)
+    return cut - header_len
+
+
+def _expire(path, days, now, processed=None):
+    """Cut rows older than `days` once enough of them have piled up"""
+    if days is None or not os.path.exists(path):
+        return 0
+    size = os.path.getsize(path)
+    # The newest row always stays, serwer.py recovers its ingest cursor from it
+    limit = min(size if processed is None else processed, _last_row_start(path, size))
+    header_len, cut = _expired_offset(path, now - timedelta(days=days), limit)
+    expired = cut - header_len
+    if expired <= 0 or expired < max(COMPACT_MIN_BYTES, size * COMPACT_MIN_FRACTION):
+        return 0
+    return _compact(path, header_len, cut)
+
+
+def _roll_up(path, policy, state, rows):
+    if state['header'] is None:
+        return
+    closed = _accumulate(state, policy, rows)
+    headers = _rollup_headers(state['header'], policy.get('group_by'))
+    for bucket, rollup_rows in closed.items():
+        _append_rows(rollup_path(path, bucket), headers, rollup_rows)
+
+
+def _finish_rotated(path, policy, state):
+    """Roll up the rest of a file that wspolne.segmenty moved away
+
+    The rename keeps the inode, so the manifest tells which segment the
+    last pass was reading; segments closed after it are read whole.
+    """
+    from wspolne import segmenty
+
+    closed = segmenty.read_manifest(path)['segments']
+    inodes = [segment.get('inode') for segment in closed]
+    if state['inode'] not in inodes:
+        return False
+    for segment in closed[inodes.index(state['inode']):]:
+        name = segmenty.resolve(os.path.join(segmenty.segments_dir(path), segment['file']))
+        opener = gzip.open if name.endswith('.gz') else open
+        _roll_up(path, policy, state, _read_new_rows(name, state, opener))
+        # Same header in the next file, the open buckets carry over
+        state['offset'] = 0
+        state['header'] = None
+    return True
+
+
+def _store_paths(path):
+    """Binary stores a logger may keep instead of the CSV file (magazyn.SINKS)"""
+    base = os.path.splitext(path)[0]
+    return [('gorilla', base + '.gor'), ('rekordy', base + '.rec'), ('kolumny', base + '.cols')]
+
+
+def _expire_stores(path, days, now):
+    if days is None:
+        return
+    for module, store in _store_paths(path):
+        if os.path.exists(store):
+            # Imported on demand, kolumny pulls in pandas
+            importlib.import_module(f"wspolne.{module}").expire(
+                store, now - timedelta(days=days), COMPACT_MIN_FRACTION)
+
+
+def enforce(path, policy, now=None):
+    """Run one incremental retention pass for a single raw file and its binary stores"""
+    now = now or datetime.now()
+    with _lock:
+        if os.path.exists(path):
+            _enforce_csv(path, policy, now)
+        _expire_stores(path, policy.get('raw_days'), now)
+
+
+def _enforce_csv(path, policy, now):
+    state = _load_state(path)
+    inode = os.stat(path).st_ino
+    replaced = state.get('inode') not in (None, inode) and not _finish_rotated(path, policy, state)
+    if replaced or state['offset'] > os.path.getsize(path):
+        # File was replaced or truncated behind our back, start over
+        state = {'offset': 0, 'header': None, 'buckets': {}}
+
+    _roll_up(path, policy, state, _read_new_rows(path, state))
+
+    # Raw rows are only expired once they have been rolled up. A
+    # rotated file is never rewritten, it loses whole closed segments
+    from wspolne import segmenty
+    if os.path.isdir(segmenty.segments_dir(path)):
+        if policy.get('raw_days') is not None:
+            segmenty.expire(path, now - timedelta(days=policy['raw_days']))
+    else:
+        state['offset'] -= _expire(path, policy.get('raw_days'), now, state['offset'])
+    for bucket, days in policy['rollups']:
+        _expire(rollup_path(path, bucket), days, now)
+    state['inode'] = os.stat(path).st_ino
+    _save_state(path, state)
+
+
+def enforce_all(policies=POLICIES, root=ROOT, now=None):
+    """Run one pass over every configured sensor file"""
+    for pattern, policy in policies.items():
+        if glob.has_magic(pattern):
+            paths = sorted(glob.glob(os.path.join(root, pattern)))
+        else:
+            paths = [os.path.join(root, pattern)]
+        for path in paths:
+            try:
+                enforce(path, policy, now)
+            except Exception as e:
+                print(f"Retention pass failed for {os.path.relpath(path, root)}: {e}")
+
+
+def run_forever(policies=POLICIES, root=ROOT, interval=DEFAULT_INTERVAL):
+    """Enforce the policies every `interval` seconds"""
+    while True:
+        enforce_all(policies, root)
+        time.sleep(interval)
+
+
+def start_background(policies=POLICIES, root=ROOT, interval=DEFAULT_INTERVAL):
+    """Start the retention job in a daemon thread"""
+    thread = threading.Thread(
+        target=run_forever,
+        args=(policies, root, interval),
+        name='retention',
+        daemon=True,
+    )
+    thread.start()
+    return thread
+
+
+if __name__ == '__main__':
+    print("Enforcing retention policies, press CTRL+C to stop")
+    try:
+        run_forever()
+    except KeyboardInterrupt:
+        print("\nRetention job stopped by user")
@@ -0,0 +1,305 @@
+"""Time- and size-based rotation of the logger CSV files.
+
+The active file keeps its usual name (light_readings.csv), so every
+existing reader sees today's rows only. When a day (or hour) ends, or the
+file reaches `max_bytes`, it is moved into a segments directory and a new
+file with the same header is started:
+
+    light_readings.segments/
+        manifest.json                  closed segments: file, first and
+                                       last timestamp, size, inode
+        2024-11-14_084607.csv.gz       closed segments, gzip compressed
+        2024-11-15_000007.csv          (not compressed yet)
+
+Closed segments are compressed by one background thread running at the
+lowest CPU priority, so gzip never competes with the acquisition loops.
+segments() and load_range() give readers only the files that overlap a
+time range. wspolne.retencja drops whole expired segments. Every change
+of the manifest holds wspolne.zapis.append_lock on it exclusively, since
+the logger, its compression thread and retention may all rewrite it.
+
+Only these two functions look into the segments: serie, the dashboards
+and serwer.py's /stats still read just the active file, so with rotation
+on they show the current day (or hour) only.
+
+    sink = open_sink('csv', path, headers, rotation={'period': 'day'})
+"""
+import contextlib
+import gzip
+import json
+import os
+import queue
+import shutil
+import threading
+from datetime import datetime
+
+from wspolne import zapis
+
+MANIFEST = 'manifest.json'
+PERIODS = ('hour', 'day')
+# Nice value of the compression thread (19 = lowest priority)
+COMPRESS_NICE = 19
+COMPRESS_LEVEL = 6
+NAME_FORMAT = '%Y-%m-%d_%H%M%S'
+
+_manifest_lock = threading.Lock()
+_compress_queue = queue.Queue()
+_compressor = None
+
+
+def segments_dir(path):
+    """Segments directory of a data file ('x.csv' -> 'x.segments')"""
+    return os.path.splitext(path)[0] + '.segments'
+
+
+def manifest_path(path):
+    return os.path.join(segments_dir(path), MANIFEST)
+
+
+def read_manifest(path):
+    try:
+        with open(manifest_path(path)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'segments': []}
+
+
+@contextlib.contextmanager
+def _manifest_update(path):
+    """Lock for a read-modify-write of the manifest, across threads and processes"""
+    with _manifest_lock, zapis.append_lock(manifest_path(path), exclusive=True):
+        yield
+
+
+def _write_manifest(path, manifest):
+    name = manifest_path(path)
+    with open(name + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(name + '.tmp', name)
+
+
+def _row_timestamp(line):
+    try:
+        return datetime.fromisoformat(line.split(b',', 1)[0].decode('utf-8'))
+    except (UnicodeDecodeError, ValueError):
+        return None
+
+
+def _time_span(path):
+    """First and last row timestamp of an existing CSV, (None, None) if empty"""
+    first = last = None
+    with open(path, 'rb') as f:
+        f.readline()
+        for line in f:
+            first = _row_timestamp(line)
+            if first is not None:
+                break
+        f.seek(max(0, os.path.getsize(path) - 4096))
+        for line in reversed(f.read().split(b'\n')):
+            last = _row_timestamp(line)
+            if last is not None:
+                break
+    return first, last
+
+
+def period_start(timestamp, period):
+    if period == 'hour':
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+class RotatingSink:
+    """CSV sink that moves its file into the segments directory when it's full
+
+    `period` is 'day', 'hour' or None and `max_bytes` an optional size
+    limit; other options go to the CSV sink.
+    """
+
+    def __init__(self, sink_class, path, headers, period='day', max_bytes=None, compress=True,
+                 **options):
+        if period is not None and period not in PERIODS:
+            raise ValueError(f"Unknown rotation period '{period}', expected one of {PERIODS}")
+        self.sink_class = sink_class
+        self.path = path
+        self.headers = list(headers)
+        self.options = options
+        self.period = period
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.rotations = 0
+        os.makedirs(segments_dir(path), exist_ok=True)
+        self.start, self.end = _time_span(path) if os.path.exists(path) else (None, None)
+        self.sink = sink_class(path, headers, **options)
+        if compress:
+            # Segments closed before a restart that never got compressed
+            for segment in read_manifest(path)['segments']:
+                if not segment['file'].endswith('.gz'):
+                    _queue_compression(path, segment['file'])
+
+    def _due(self, timestamp):
+        if self.start is None:
+            return False
+        if self.period is not None and period_start(timestamp, self.period) != period_start(self.start, self.period):
+            return True
+        if self.max_bytes is None:
+            return False
+        size = os.path.getsize(self.path)
+        writer = getattr(self.sink, 'writer', None)
+        if writer is not None:
+            # Rows still buffered by wspolne.zapis count too
+            size += len(writer.buffer)
+        return size >= self.max_bytes
+
+    def rotate(self):
+        """Close the active file and move it into the segments directory"""
+        self.sink.close()
+        if self.start is not None:
+            stat = os.stat(self.path)
+            name = self.start.strftime(NAME_FORMAT) + os.path.splitext(self.path)[1]
+            os.replace(self.path, os.path.join(segments_dir(self.path), name))
+            with _manifest_update(self.path):
+                manifest = read_manifest(self.path)
+                manifest['segments'].append({
+                    'file': name,
+                    'start': self.start.isoformat(),
+                    'end': self.end.isoformat(),
+                    'bytes': stat.st_size,
+                    # Survives the rename, lets retention finish a rotated file
+                    'inode': stat.st_ino,
+                })
+                _write_manifest(self.path, manifest)
+            self.rotations += 1
+            if self.compress:
+                _queue_compression(self.path, name)
+        self.start = self.end = None
+        self.sink = self.sink_class(self.path, self.headers, **self.options)
+
+    def write(self, timestamp, values):
+        if self._due(timestamp):
+            self.rotate()
+        self.sink.write(timestamp, values)
+        if self.start is None:
+            self.start = timestamp
+        self.end = timestamp
+
+    def close(self):
+        self.sink.close()
+
+
+def _queue_compression(path, name):
+    global _compressor
+    with _manifest_lock:
+        if _compressor is None:
+            _compressor = threading.Thread(target=_compress_loop, name='segment-compression', daemon=True)
+            _compressor.start()
+    _compress_queue.put((path, name))
+
+
+def _compress_loop():
+    try:
+        # Only this thread: on Linux the priority is per native thread id
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), COMPRESS_NICE)
+    except (AttributeError, OSError):
+        pass
+    while True:
+        path, name = _compress_queue.get()
+        try:
+            compress_segment(path, name)
+        except OSError as e:
+            print(f"Error compressing {name}: {e}")
+
+
+def compress_segment(path, name):
+    """gzip one closed segment and point the manifest at the .gz file"""
+    directory = segments_dir(path)
+    source = os.path.join(directory, name)
+    if not os.path.exists(source):
+        return
+    with open(source, 'rb') as src, gzip.open(source + '.gz.tmp', 'wb', COMPRESS_LEVEL) as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+    os.replace(source + '.gz.tmp', source + '.gz')
+    with _manifest_update(path):
+        manifest = read_manifest(path)
+        for segment in manifest['segments']:
+            if segment['file'] == name:
+                segment['file'] = name + '.gz'
+                segment['compressed_bytes'] = os.path.getsize(source + '.gz')
+        _write_manifest(path, manifest)
+    os.remove(source)
+
+
+def segments(path, start=None, end=None):
+    """Files holding rows between start and end (datetimes), oldest first
+
+    Closed segments come from the manifest, the active file is last.
+    """
+    directory = segments_dir(path)
+    files = []
+    for segment in read_manifest(path)['segments']:
+        if start is not None and datetime.fromisoformat(segment['end']) < start:
+            continue
+        if end is not None and datetime.fromisoformat(segment['start']) > end:
+            continue
+        files.append(os.path.join(directory, segment['file']))
+    if os.path.exists(path):
+        files.append(path)
+    return files
+
+
+def resolve(name):
+    """Current name of a listed segment, it may have been compressed since"""
+    if not os.path.exists(name) and os.path.exists(name + '.gz'):
+        return name + '.gz'
+    return name
+
+
+def open_segment(name):
+    """Binary file object of a segment, compressed or not"""
+    name = resolve(name)
+    if name.endswith('.gz'):
+        return gzip.open(name, 'rb')
+    return open(name, 'rb')
+
+
+def load_range(path, start=None, end=None, columns=None):
+    """DataFrame of the rows between start and end, reading only overlapping segments"""
+    import pandas as pd
+
+    frames = []
+    for name in segments(path, start, end):
+        with open_segment(name) as f:
+            frame = pd.read_csv(f, usecols=columns)
+        frames.append(frame)
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    data = pd.concat(frames, ignore_index=True)
+    stamps = pd.to_datetime(data.iloc[:, 0], errors='coerce')
+    selected = stamps.notna()
+    if start is not None:
+        selected &= stamps >= start
+    if end is not None:
+        selected &= stamps <= end
+    data = data[selected].copy()
+    data[data.columns[0]] = stamps[selected]
+    return data.reset_index(drop=True)
+
+
+def expire(path, cutoff):
+    """Delete closed segments whose last row is older than cutoff"""
+    removed = 0
+    with _manifest_update(path):
+        manifest = read_manifest(path)
+        kept = []
+        for segment in manifest['segments']:
+            if datetime.fromisoformat(segment['end']) < cutoff:
+                try:
+                    os.remove(os.path.join(segments_dir(path), segment['file']))
+                except FileNotFoundError:
+                    pass
+                removed += segment['bytes']
+            else:
+                kept.append(segment)
+        if len(kept) != len(manifest['segments']):
+            manifest['segments'] = kept
+            _write_manifest(path, manifest)
+    return removed
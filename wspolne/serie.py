@@ -0,0 +1,239 @@
+"""Process-wide columnar cache of the sensor CSV files.
+
+Each file is parsed once into compact arrays (int64 nanosecond timestamps,
+float32 values, int32 codes for text columns such as device_id) and then
+refreshed incrementally from the bytes appended since the last refresh.
+Consumers get zero-copy views, so N dashboard sessions share one copy:
+
+    series = get_series('environmental_data.csv')
+    timestamps, columns = series.view()
+    df = series.frame()
+"""
+import csv
+import io
+import os
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+INITIAL_CAPACITY = 1024
+NAT = np.iinfo(np.int64).min
+# Columns that always hold text (stored as category codes), even when the
+# values look numeric; other columns turn into text on their first
+# non-numeric value
+TEXT_COLUMNS = {'device_id'}
+
+_EPOCH = datetime(1970, 1, 1)
+_series = {}
+_series_lock = threading.Lock()
+
+
+def _timestamp_ns(value):
+    # Naive timestamps, same values as pd.to_datetime() on the CSV column
+    try:
+        delta = datetime.fromisoformat(value) - _EPOCH
+    except ValueError:
+        return NAT
+    return (delta.days * 86400 + delta.seconds) * 1_000_000_000 + delta.microseconds * 1000
+
+
+def _float(value):
+    try:
+        return float(value)
+    except ValueError:
+        return np.nan
+
+
+def _is_text(value):
+    if not value:
+        return False
+    try:
+        float(value)
+    except ValueError:
+        return True
+    return False
+
+
+class Series:
+    """Columnar copy of one CSV file, grown in place as the file grows"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        # Text columns found so far, survive a re-parse
+        self.known_text = set(TEXT_COLUMNS)
+        self._reset()
+
+    def _reset(self):
+        self.offset = 0
+        self.inode = None
+        self.count = 0
+        self.header = None
+        self.text_columns = set()
+        self.timestamps = np.empty(0, dtype=np.int64)
+        self.columns = {}
+        self.categories = {}
+
+    def _setup_columns(self, header):
+        self.header = header
+        # Text columns (device_id) are stored as category codes
+        self.text_columns = {name for name in header[1:] if name in self.known_text}
+        self._grow(INITIAL_CAPACITY)
+
+    def _new_text_columns(self, rows):
+        """Float columns that got a non-numeric value in `rows`"""
+        found = set()
+        for i, name in enumerate(self.header[1:], start=1):
+            if name in self.text_columns:
+                continue
+            if any(_is_text(row[i]) for row in rows if len(row) == len(self.header)):
+                found.add(name)
+        return found
+
+    def _grow(self, capacity):
+        timestamps = np.empty(capacity, dtype=np.int64)
+        timestamps[:self.count] = self.timestamps[:self.count]
+        self.timestamps = timestamps
+        for name in self.header[1:]:
+            dtype = np.int32 if name in self.text_columns else np.float32
+            column = np.empty(capacity, dtype=dtype)
+            if name in self.columns:
+                column[:self.count] = self.columns[name][:self.count]
+            self.columns[name] = column
+            self.categories.setdefault(name, {})
+
+    def _code(self, name, value):
+        codes = self.categories[name]
+        if value not in codes:
+            codes[value] = len(codes)
+        return codes[value]
+
+    def refresh(self):
+        """Parse rows appended since the last refresh"""
+        with self.lock:
+            self._refresh()
+        return self
+
+    def _refresh(self):
+        stat = os.stat(self.path)
+        if stat.st_ino != self.inode or stat.st_size < self.offset:
+            # File was rotated or compacted, parse it again from scratch
+            self._reset()
+            self.inode = stat.st_ino
+        if stat.st_size == self.offset:
+            return
+
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            data = f.read(stat.st_size - self.offset)
+        end = data.rfind(b'\n') + 1
+        if end == 0:
+            return
+        rows = list(csv.reader(io.StringIO(data[:end].decode('utf-8'))))
+        if self.header is None:
+            self._setup_columns(rows.pop(0))
+        new_text = self._new_text_columns(rows)
+        if new_text:
+            # A column taken for numbers holds text, parse the file again
+            # (views handed out so far keep the old arrays)
+            self.known_text |= new_text
+            self._reset()
+            self._refresh()
+            return
+        self.offset += end
+        self._append(rows)
+
+    def _append(self, rows):
+        rows = [row for row in rows if len(row) == len(self.header)]
+        needed = self.count + len(rows)
+        if needed > len(self.timestamps):
+            capacity = max(len(self.timestamps), INITIAL_CAPACITY)
+            while capacity < needed:
+                capacity *= 2
+            self._grow(capacity)
+
+        # Fill the slots past the visible end, views handed out stay valid
+        start, stop = self.count, needed
+        self.timestamps[start:stop] = [_timestamp_ns(row[0]) for row in rows]
+        for i, name in enumerate(self.header[1:], start=1):
+            if name in self.text_columns:
+                values = [self._code(name, row[i]) for row in rows]
+            else:
+                values = [_float(row[i]) for row in rows]
+            self.columns[name][start:stop] = values
+        self.count = needed
+
+    def view(self):
+        """Zero-copy (timestamps, {column: values}) views of the cached rows"""
+        with self.lock:
+            count = self.count
+            return self.timestamps[:count], {
+                name: column[:count] for name, column in self.columns.items()
+            }
+
+    def labels(self, name):
+        """Text values of a category-coded column, indexed by code"""
+        with self.lock:
+            codes = self.categories[name]
+            labels = [None] * len(codes)
+            for value, code in codes.items():
+                labels[code] = value
+            return labels
+
+    def rows(self, indices):
+        """Selected rows as dicts of strings, like csv.DictReader would return"""
+        timestamps, values = self.view()
+        labels = {name: self.labels(name) for name in self.text_columns}
+        stamps = np.datetime_as_string(timestamps[indices].view('datetime64[ns]'), unit='us')
+        rows = []
+        for stamp, i in zip(stamps, indices):
+            row = {self.header[0]: '' if stamp == 'NaT' else str(stamp)}
+            for name, column in values.items():
+                if name in labels:
+                    row[name] = labels[name][column[i]]
+                elif np.isnan(column[i]):
+                    row[name] = ''
+                else:
+                    row[name] = f"{column[i]:.7g}"
+            rows.append(row)
+        return rows
+
+    def frame(self, columns=None):
+        """DataFrame over the cached arrays, timestamps as datetime64[ns]"""
+        timestamps, values = self.view()
+        names = columns or list(values)
+        timestamp_column = self.header[0] if self.header else 'Timestamp'
+        data = {timestamp_column: timestamps.view('datetime64[ns]')}
+        for name in names:
+            if name == timestamp_column:
+                continue
+            if name not in values:
+                raise KeyError(f"Column '{name}' not found in {self.path}")
+            if name in self.text_columns:
+                data[name] = pd.Categorical.from_codes(values[name], self.labels(name))
+            else:
+                data[name] = values[name]
+        return pd.DataFrame(data, copy=False)
+
+
+def get_series(path):
+    """Shared, freshly refreshed cache entry for a CSV file"""
+    key = os.path.abspath(path)
+    with _series_lock:
+        series = _series.get(key)
+        if series is None:
+            series = _series[key] = Series(key)
+    return series.refresh()
+
+
+def load_frame(path, columns=None):
+    """DataFrame for a sensor file, mapped from its columnar store or record log when one exists"""
+    from wspolne import kolumny, rekordy
+
+    if os.path.isdir(kolumny.store_path(path)):
+        return kolumny.frame(path, columns)
+    if os.path.exists(rekordy.record_path(path)):
+        return rekordy.frame(path, columns)
+    return get_series(path).frame(columns)
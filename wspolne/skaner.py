@@ -0,0 +1,188 @@
+"""Round-robin scanning of analog channels on one or more ADS1115 devices.
+
+Each channel has its own gain, data rate and sampling interval. On every
+pass the due channels are grouped per device and ordered so consecutive
+reads share as much configuration as possible (same mux input first, then
+same gain/data rate), and their results are returned as one batch.
+
+A device has one converter behind its mux, so its channels convert one
+after the other, but the devices convert at the same time: each round
+starts one conversion per device, sleeps until the slowest is ready and
+collects them all (start()/collect() like wspolne.czujniki). Only
+SmbusADC overlaps conversions, BlinkaADC has just a blocking read. Channels
+switch the mux on every read, so continuous mode (wspolne.nadprobkowanie)
+does not apply here.
+
+Failed reads are counted per channel; each pass keeps its failures in
+`failed` for the caller's batch summary instead of printing every one.
+"""
+import time
+
+# Single-ended inputs P0..P3
+CHANNELS_PER_DEVICE = 4
+
+
+class BlinkaADC:
+    """ADS1115 access through the Adafruit Blinka driver
+
+    Blinka only has a blocking read, so its conversions don't overlap with
+    other devices': a round takes the sum of their conversion times. Use
+    SmbusADC for overlap.
+    """
+
+    def __init__(self, i2c, address):
+        import adafruit_ads1x15.ads1115 as ADS
+        from adafruit_ads1x15.analog_in import AnalogIn
+
+        self.ads = ADS.ADS1115(i2c, address=address)
+        pins = [ADS.P0, ADS.P1, ADS.P2, ADS.P3]
+        self.inputs = [AnalogIn(self.ads, pin) for pin in pins]
+        self.config = None
+        # Blinka rewrites the mux on every single-shot read, nothing to track
+        self.mux = None
+        self.pending = None
+
+    def start(self, channel, gain, data_rate):
+        """Blinka only has a blocking read, it runs in collect()"""
+        self.pending = (channel, gain, data_rate)
+        return 0.0
+
+    def collect(self):
+        return self.read(*self.pending)
+
+    def read(self, channel, gain, data_rate):
+        """Single-ended voltage of one channel"""
+        if self.config != (gain, data_rate):
+            self.ads.gain = gain
+            self.ads.data_rate = data_rate
+            self.config = (gain, data_rate)
+        return self.inputs[channel].voltage
+
+
+class SmbusADC:
+    """ADS1115 access through the lightweight smbus2 driver (wspolne/ads1115.py)"""
+
+    def __init__(self, bus, address):
+        from wspolne import ads1115
+
+        self.adc = ads1115.ADS1115(bus, address)
+
+    @property
+    def mux(self):
+        return self.adc.mux
+
+    def start(self, channel, gain, data_rate):
+        """Start a single-shot conversion, return seconds until it is ready"""
+        self.adc.gain = gain
+        self.adc.data_rate = data_rate
+        return self.adc.start(channel)
+
+    def collect(self):
+        return self.adc.collect()
+
+    def read(self, channel, gain, data_rate):
+        """Single-ended voltage of one channel"""
+        self.adc.gain = gain
+        self.adc.data_rate = data_rate
+        return self.adc.voltage(channel)
+
+
+class ChannelScanner:
+    """Schedules channel reads across devices, one batch per pass"""
+
+    def __init__(self, devices, channels):
+        # devices: address -> ADC object with read(channel, gain, data_rate)
+        self.devices = devices
+        self.channels = []
+        now = time.monotonic()
+        for config in channels:
+            if not 0 <= config['channel'] < CHANNELS_PER_DEVICE:
+                raise ValueError(f"Channel {config['channel']} of {config['series']} is not P0..P3")
+            if config['address'] not in devices:
+                raise ValueError(f"No ADS1115 at address 0x{config['address']:02x} for {config['series']}")
+            channel = dict(config)
+            channel.setdefault('gain', 1)
+            channel.setdefault('data_rate', 128)
+            channel.setdefault('interval', 10)
+            channel['next'] = now
+            channel['errors'] = 0
+            self.channels.append(channel)
+        self.reads = 0
+        self.errors = 0
+        # Series -> last error message of the channels that failed in the last pass
+        self.failed = {}
+
+    def next_due(self):
+        return min(channel['next'] for channel in self.channels)
+
+    def _order(self, due):
+        """Per device, stay on the current mux input, then match configs"""
+        groups = []
+        for address in sorted({c['address'] for c in due}):
+            group = [c for c in due if c['address'] == address]
+            current = self.devices[address].mux
+            group.sort(key=lambda c: (c['channel'] != current, c['gain'], c['data_rate'], c['channel']))
+            groups.append(group)
+        return groups
+
+    def _error(self, channel, e):
+        self.errors += 1
+        channel['errors'] += 1
+        self.failed[channel['series']] = str(e)
+
+    def report(self):
+        """Failed reads per channel since the start"""
+        failing = [f"{c['series']} {c['errors']}" for c in self.channels if c['errors']]
+        return f"{self.reads} readings, {self.errors} errors" + (f" ({', '.join(failing)})" if failing else '')
+
+    def scan(self, now=None):
+        """Read every due channel, return a list of (series, voltage)"""
+        now = time.monotonic() if now is None else now
+        due = [c for c in self.channels if c['next'] <= now]
+        self.failed = {}
+        for channel in due:
+            # Next slot on the channel's own grid, skipping missed ones
+            missed = int((now - channel['next']) // channel['interval'])
+            channel['next'] += (missed + 1) * channel['interval']
+        groups = self._order(due)
+        results = []
+        # One conversion per device per round, all devices at once
+        for step in range(max((len(group) for group in groups), default=0)):
+            pending = []
+            for group in groups:
+                if step >= len(group):
+                    continue
+                channel = group[step]
+                try:
+                    ready_at = time.monotonic() + self.devices[channel['address']].start(
+                        channel['channel'], channel['gain'], channel['data_rate'])
+                except Exception as e:
+                    self._error(channel, e)
+                    continue
+                pending.append((ready_at, channel))
+            for ready_at, channel in sorted(pending, key=lambda item: item[0]):
+                delay = ready_at - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                try:
+                    voltage = self.devices[channel['address']].collect()
+                except Exception as e:
+                    self._error(channel, e)
+                    continue
+                self.reads += 1
+                results.append((channel['series'], voltage))
+        return results
+
+    def run(self, handle, stop_event):
+        """Scan until stop_event is set, pass each batch to handle(results)
+
+        Also called for a pass where every read failed, see `failed`.
+        """
+        while not stop_event.is_set():
+            delay = self.next_due() - time.monotonic()
+            if delay > 0:
+                stop_event.wait(delay)
+                continue
+            results = self.scan()
+            if results or self.failed:
+                handle(results)
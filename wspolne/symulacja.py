@@ -0,0 +1,295 @@
+"""Simulated BH1750, BME280 and ADS1115 for running the loggers off the Pi.
+
+The simulated drivers have the same start()/collect() interface, names,
+headers and decimals as the real ones in wspolne.czujniki, so the daemon,
+the loggers, the sinks and the uplink run unchanged on any Linux box.
+Values come from one of two signals:
+
+    'replay'     rows of the recorded CSVs (swiatlo/light_readings.csv ...)
+                 played back on their own timeline, looping at the end
+    'synthetic'  a daily sine per channel plus seeded Gaussian noise,
+                 `noise` scales it (0 gives the clean sine)
+
+Every bus transaction costs `latency` seconds (plus seeded exponential
+jitter) and a conversion takes as long as on the chip. All waiting goes
+through a SimClock, which runs `speed` times faster than real time, or
+with speed=None only advances when something sleeps: the run is then
+deterministic and as fast as the code allows.
+
+    SIMULATION = {'signal': 'replay', 'speed': 1000}
+    SIMULATION = {'signal': 'synthetic', 'speed': None, 'noise': 2.0, 'seed': 7}
+
+in a logger or demon.py switches it to these drivers. Output goes to
+sim_<file> next to the real data file, so recorded data is never mixed
+with simulated rows. The virtual clock easily outruns the disk, so
+background persistence waits for room instead of dropping rows (see
+background_options).
+"""
+import inspect
+import math
+import os
+import random
+import threading
+import time
+from datetime import datetime
+
+from wspolne import czujniki
+from wspolne.harmonogram import Clock
+
+# Repository root, replayed files are relative to it
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+OUTPUT_PREFIX = 'sim_'
+# Seconds per I2C transaction at 100 kHz (a few bytes each)
+DEFAULT_LATENCY = 0.0005
+DAY = 86400
+
+# Synthetic signal per driver: mean, daily amplitude and noise per value
+# column (Temperature_F is derived from Temperature_C)
+SYNTHETIC = {
+    'bh1750': {'base': [150.0], 'amplitude': [150.0], 'noise': [2.0]},
+    'bme280': {'base': [21.0, 0.0, 1005.0, 40.0], 'amplitude': [2.0, 0.0, 3.0, 8.0],
+               'noise': [0.02, 0.0, 0.05, 0.2]},
+    'ads1115': {'base': [0.2], 'amplitude': [0.05], 'noise': [0.005]},
+}
+
+
+def output_path(path):
+    """Where a simulated run writes instead of `path`"""
+    directory, name = os.path.split(path)
+    return os.path.join(directory, OUTPUT_PREFIX + name)
+
+
+def background_options(background):
+    """BACKGROUND setting for a simulated run: the producer waits when the ring is full"""
+    if background is None:
+        return None
+    from wspolne import utrwalanie
+    return dict(background, when_full=utrwalanie.BLOCK)
+
+
+class SimClock(Clock):
+    """Simulated wall and monotonic time
+
+    speed  multiple of real time; None runs on virtual time that only moves
+           when sleep()/wait() is called
+    start  wall time (datetime or epoch seconds) the clock starts at,
+           the real current time by default
+    """
+
+    def __init__(self, speed=None, start=None):
+        if isinstance(start, datetime):
+            start = start.timestamp()
+        self.speed = speed
+        self.start = time.time() if start is None else start
+        self.elapsed = 0.0
+        self.real_start = time.monotonic()
+        self.lock = threading.Lock()
+
+    def monotonic(self):
+        if self.speed is None:
+            return self.elapsed
+        return (time.monotonic() - self.real_start) * self.speed
+
+    def time(self):
+        return self.start + self.monotonic()
+
+    def sleep(self, seconds):
+        if seconds <= 0:
+            return
+        if self.speed is None:
+            with self.lock:
+                self.elapsed += seconds
+        else:
+            time.sleep(seconds / self.speed)
+
+    def wait(self, event, timeout):
+        if self.speed is None:
+            if not event.is_set():
+                self.sleep(timeout)
+            return event.is_set()
+        return event.wait(timeout / self.speed)
+
+
+class Synthetic:
+    """Daily sine plus Gaussian noise per value column, repeatable per seed"""
+
+    def __init__(self, base, amplitude=None, noise=None, period=DAY, seed=0):
+        self.base = list(base)
+        self.amplitude = list(amplitude or [0.0] * len(self.base))
+        self.noise = list(noise or [0.0] * len(self.base))
+        self.period = period
+        self.random = random.Random(seed)
+
+    def values(self, t):
+        # Peak in the early afternoon, like daylight and temperature
+        phase = math.sin(2 * math.pi * ((t % self.period) / self.period - 0.3))
+        return [b + a * phase + (self.random.gauss(0.0, n) if n else 0.0)
+                for b, a, n in zip(self.base, self.amplitude, self.noise)]
+
+
+class Replay:
+    """Rows of a recorded CSV played back on their own timeline, looping
+
+    The first values() call maps to the first row; later calls get the row
+    recorded the same time after it.
+    """
+
+    def __init__(self, path):
+        import pandas as pd
+
+        data = pd.read_csv(path)
+        stamps = pd.to_datetime(data.iloc[:, 0], errors='coerce')
+        values = data.iloc[:, 1:].apply(pd.to_numeric, errors='coerce')
+        # Rows broken by power cuts (NUL bytes, half lines) are dropped
+        valid = stamps.notna() & values.notna().all(axis=1)
+        if not valid.any():
+            raise ValueError(f"No rows to replay in {path}")
+        seconds = (stamps[valid] - stamps[valid].iloc[0]).dt.total_seconds().to_numpy()
+        self.offsets = seconds
+        self.rows = values[valid].to_numpy().tolist()
+        step = float(seconds[-1] - seconds[-2]) if len(seconds) > 1 else 1.0
+        self.duration = seconds[-1] + max(step, 1e-3)
+        self.first = None
+
+    def values(self, t):
+        import numpy as np
+
+        if self.first is None:
+            self.first = t
+        offset = (t - self.first) % self.duration
+        return list(self.rows[int(np.searchsorted(self.offsets, offset, side='right')) - 1])
+
+
+class SimBus:
+    """Stands in for magistrala.SharedBus, the daemon only needs its lock"""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+
+    def close(self):
+        pass
+
+
+class SimulatedSensor(czujniki.Sensor):
+    """Base of the simulated drivers, see the module docstring
+
+    Takes and ignores the real driver's bus and options, so a SENSORS entry
+    of demon.py works for both; an option the real driver doesn't have is
+    a TypeError, like on the Pi.
+    """
+    driver = None
+    conversion = 0.0
+
+    def __init__(self, bus=None, signal='synthetic', clock=None, latency=DEFAULT_LATENCY,
+                 jitter=None, path=None, seed=0, noise=1.0, **options):
+        accepted = inspect.signature(self.real.__init__).parameters
+        unknown = [name for name in options if name not in accepted]
+        if unknown:
+            raise TypeError(f"{type(self).__name__} got unexpected options {unknown}")
+        self.clock = clock or SimClock()
+        self.latency = latency
+        # Mean extra delay per transaction, exponentially distributed
+        self.jitter = latency / 2 if jitter is None else jitter
+        self.random = random.Random(seed)
+        self.transactions = 0
+        if signal == 'replay':
+            self.signal = Replay(path or os.path.join(ROOT, self.real.filename))
+        elif signal == 'synthetic':
+            synthetic = SYNTHETIC[self.driver]
+            self.signal = Synthetic(synthetic['base'], synthetic['amplitude'],
+                                    [n * noise for n in synthetic['noise']], seed=seed)
+        else:
+            raise ValueError(f"Unknown signal '{signal}', expected 'replay' or 'synthetic'")
+
+    def _transfer(self):
+        self.transactions += 1
+        delay = self.latency
+        if self.jitter:
+            delay += self.random.expovariate(1 / self.jitter)
+        self.clock.sleep(delay)
+
+    def conversion_time(self):
+        return self.conversion
+
+    def start(self):
+        self._transfer()
+        return self.conversion
+
+    def collect(self):
+        self._transfer()
+        return self.shape(self.signal.values(self.clock.time()))
+
+    def read(self):
+        """Blocking start, wait and collect, for the single-sensor loggers"""
+        self.clock.sleep(self.start())
+        return self.collect()
+
+    def shape(self, values):
+        return values
+
+
+class SimBH1750(SimulatedSensor):
+    driver = 'bh1750'
+    real = czujniki.BH1750
+    name = real.name
+    filename = output_path(real.filename)
+    headers = real.headers
+    decimals = real.decimals
+    conversion = czujniki.BH1750_HIGH_RES_TIME
+
+    def shape(self, values):
+        # Whole counts of the 16-bit register
+        raw = min(max(int(values[0] * 1.2), 0), czujniki.BH1750_SATURATED)
+        return [czujniki.bh1750_lux(raw)]
+
+
+class SimBME280(SimulatedSensor):
+    driver = 'bme280'
+    real = czujniki.BME280
+    name = real.name
+    filename = output_path(real.filename)
+    headers = real.headers
+    decimals = real.decimals
+    # Oversampling x1 on all three channels
+    conversion = (1.25 + 2.3 * 3 + 0.575 * 2) / 1000
+
+    def shape(self, values):
+        celsius, _, pressure, humidity = values
+        return [celsius, czujniki.celsius_to_fahrenheit(celsius), pressure,
+                min(max(humidity, 0.0), 100.0)]
+
+
+class SimADS1115(SimulatedSensor):
+    driver = 'ads1115'
+    real = czujniki.ADS1115
+    name = real.name
+    filename = output_path(real.filename)
+    headers = real.headers
+    decimals = real.decimals
+    # One conversion at 128 SPS
+    conversion = 1 / 128
+    # Full scale at gain 1, counts go through the same conversion as
+    # wspolne.ads1115.ADS1115.to_voltage
+    full_scale = 4.096
+
+    def shape(self, values):
+        raw = min(max(round(values[0] * 32767 / self.full_scale), -32768), 32767)
+        return [raw * self.full_scale / 32767]
+
+
+DRIVERS = {
+    'bh1750': SimBH1750,
+    'bme280': SimBME280,
+    'ads1115': SimADS1115,
+    'ads1115_blinka': SimADS1115,
+}
+
+
+def simulate(driver, signal='synthetic', speed=None, start=None, noise=1.0, seed=0, **options):
+    """(clock, sensor) for a logger's SIMULATION setting
+
+    The same seed (and speed=None) gives the same rows on every run.
+    """
+    clock = SimClock(speed, start)
+    return clock, DRIVERS[driver](signal=signal, clock=clock, noise=noise, seed=seed, **options)
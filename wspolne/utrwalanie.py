@@ -0,0 +1,111 @@
+"""Persistence thread between a logger loop and its storage sink.
+
+The loop pushes (timestamp, values) into a lock-free ring and returns at
+once; a background thread drains the ring in batches into the real sink,
+so a slow write (SD card stall, retention compaction, buffered flush)
+never delays the next sensor read. When the ring fills up faster than
+the disk keeps up the loop waits for room (when_full='block', the
+default, no row is lost) or drops the row and counts it ('drop').
+
+    sink = open_sink('csv', path, headers, background={'capacity': 1024})
+"""
+import threading
+import time
+
+from wspolne.bufor import SpscRing
+from wspolne.harmonogram import Histogram
+
+DEFAULT_CAPACITY = 1024
+DEFAULT_BATCH = 256
+# How often the persistence thread looks for new rows
+DEFAULT_POLL_INTERVAL = 0.5
+BLOCK = 'block'
+DROP = 'drop'
+
+
+class BackgroundSink:
+    """Same write()/close() interface as the sink it wraps"""
+
+    def __init__(self, sink, capacity=DEFAULT_CAPACITY, batch=DEFAULT_BATCH,
+                 poll_interval=DEFAULT_POLL_INTERVAL, when_full=BLOCK):
+        if when_full not in (BLOCK, DROP):
+            raise ValueError(f"when_full must be '{BLOCK}' or '{DROP}'")
+        self.sink = sink
+        self.ring = SpscRing(capacity)
+        self.batch = batch
+        self.poll_interval = poll_interval
+        self.when_full = when_full
+        self.stop_event = threading.Event()
+        # Set by a producer waiting for room, so the ring is drained at once
+        self.wake = threading.Event()
+        # Set by the persistence thread after taking rows out of the ring
+        self.room = threading.Event()
+        self.written = 0
+        self.errors = 0
+        self.batches = 0
+        # Times the producer waited for room and how long in total
+        self.waits = 0
+        self.wait_time = 0.0
+        # Time spent writing one batch into the sink
+        self.latency = Histogram()
+        self.thread = threading.Thread(target=self._run, name='persistence', daemon=True)
+        self.thread.start()
+
+    def write(self, timestamp, values):
+        """Queue a row, waiting for room only when the ring is full; False if it was dropped"""
+        if self.when_full == BLOCK and self.ring.full():
+            self._wait_for_room()
+        if self.ring.push((timestamp, list(values))):
+            return True
+        if self.ring.dropped == 1:
+            print(f"Persistence ring full ({self.ring.capacity} rows), dropping rows")
+        return False
+
+    def _wait_for_room(self):
+        started = time.monotonic()
+        self.waits += 1
+        while self.ring.full() and self.thread.is_alive():
+            # Cleared before the check, so a drain in between is not missed
+            self.room.clear()
+            self.wake.set()
+            if self.ring.full():
+                self.room.wait(self.poll_interval)
+        self.wait_time += time.monotonic() - started
+
+    def _drain(self):
+        while True:
+            batch = self.ring.pop_batch(self.batch)
+            self.room.set()
+            if not batch:
+                return
+            started = time.monotonic()
+            for timestamp, values in batch:
+                try:
+                    self.sink.write(timestamp, values)
+                    self.written += 1
+                except Exception as e:
+                    self.errors += 1
+                    print(f"Error writing row: {e}")
+            self.batches += 1
+            self.latency.add(time.monotonic() - started)
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            self.wake.wait(self.poll_interval)
+            self.wake.clear()
+            self._drain()
+        self._drain()
+
+    def close(self):
+        """Write everything still queued, then close the wrapped sink"""
+        self.stop_event.set()
+        self.wake.set()
+        self.thread.join()
+        self.sink.close()
+
+    def report(self):
+        ring = self.ring
+        return (f"{ring.pushed} rows queued, {self.written} written in {self.batches} batches, "
+                f"{ring.dropped} dropped (ring {ring.capacity}, peak {ring.high_water}), "
+                f"{self.waits} waits for room ({self.wait_time:.3f} s), "
+                f"{self.errors} errors, batch latency {self.latency.summary()}")
@@ -0,0 +1,221 @@
+"""Persistent buffered append writers for the logger files.
+
+Opening a CSV for every row costs the SD card a metadata update and a
+partial-block write every 10 s per sensor. BufferedWriter keeps the file
+open, collects rows in memory and appends them in one write:
+
+    - once `max_bytes` are buffered, cut at a `block_size` boundary of the
+      file so the card sees whole blocks (the remainder waits)
+    - once the oldest buffered row is `max_age` seconds old
+    - on close, at exit and on SIGUSR1 (see install_signal_handlers)
+
+Readers (wspolne.serie, wspolne.retencja) already ignore a partial last
+row, so a block cut in the middle of a row is harmless.
+
+Everything that appends to a logger file holds append_lock(path) shared
+while it writes; retention compaction holds it exclusively while it
+copies the last rows and swaps the file, so no row lands in the old
+inode. After taking the lock the writer follows the path to the new file.
+"""
+import atexit
+import contextlib
+import os
+import signal
+import sys
+import threading
+import time
+
+from wspolne.harmonogram import Histogram
+
+try:
+    import fcntl
+except ImportError:
+    # No flock on Windows (serwer.py), appends there are not coordinated
+    fcntl = None
+
+BLOCK_SIZE = 4096
+DEFAULT_MAX_BYTES = 16 * BLOCK_SIZE
+DEFAULT_MAX_AGE = 60.0
+# How often the background thread looks for buffers past their max_age
+CHECK_INTERVAL = 1.0
+
+_writers = []
+_writers_lock = threading.Lock()
+_flush_requested = threading.Event()
+_flusher = None
+
+
+def lock_path(path):
+    return path + '.lock'
+
+
+@contextlib.contextmanager
+def append_lock(path, exclusive=False):
+    """flock on <path>.lock: shared for appends, exclusive for rewriting the file"""
+    if fcntl is None:
+        yield
+        return
+    fd = os.open(lock_path(path), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield
+    finally:
+        # Closing the descriptor releases the lock
+        os.close(fd)
+
+
+class BufferedWriter:
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES, max_age=DEFAULT_MAX_AGE,
+                 block_size=BLOCK_SIZE, fsync=False):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.block_size = block_size
+        self.fsync = fsync
+        self.buffer = bytearray()
+        # Monotonic time the oldest buffered row arrived
+        self.first_at = None
+        # Re-entrant: close() from a signal-triggered exit may interrupt append()
+        self.lock = threading.RLock()
+        self.fd = None
+        self.inode = None
+        # Metrics
+        self.rows = 0
+        self.writes = 0
+        self.bytes_written = 0
+        self.reopens = 0
+        self.latency = Histogram()
+        self._open()
+        _register(self)
+
+    def _open(self):
+        self.fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self.inode = os.fstat(self.fd).st_ino
+
+    def _follow_path(self):
+        # Retention compaction replaces the file, write to the new one
+        try:
+            inode = os.stat(self.path).st_ino
+        except FileNotFoundError:
+            inode = None
+        if inode != self.inode:
+            os.close(self.fd)
+            self._open()
+            self.reopens += 1
+
+    def append(self, data):
+        with self.lock:
+            if not self.buffer:
+                self.first_at = time.monotonic()
+            self.buffer += data
+            self.rows += 1
+            if len(self.buffer) >= self.max_bytes:
+                self._flush(aligned=True)
+
+    def due(self):
+        with self.lock:
+            return bool(self.buffer) and time.monotonic() - self.first_at >= self.max_age
+
+    def flush(self, aligned=False):
+        with self.lock:
+            self._flush(aligned)
+
+    def _flush(self, aligned):
+        if not self.buffer or self.fd is None:
+            return
+        started = time.monotonic()
+        with append_lock(self.path):
+            self._follow_path()
+            size = len(self.buffer)
+            if aligned:
+                # End the write on a block boundary of the file
+                position = os.fstat(self.fd).st_size
+                size = (position + size) // self.block_size * self.block_size - position
+                if size <= 0:
+                    return
+            with memoryview(self.buffer) as view:
+                written = 0
+                while written < size:
+                    written += os.write(self.fd, view[written:size])
+            if self.fsync:
+                os.fsync(self.fd)
+        del self.buffer[:size]
+        if not self.buffer:
+            self.first_at = None
+        self.writes += 1
+        self.bytes_written += size
+        self.latency.add(time.monotonic() - started)
+
+    def close(self):
+        with self.lock:
+            self._flush(aligned=False)
+            if self.fd is not None:
+                os.close(self.fd)
+                self.fd = None
+
+    def report(self):
+        return (f"{self.path}: {self.rows} rows in {self.writes} writes, "
+                f"{self.bytes_written} bytes, {self.reopens} reopens, "
+                f"flush latency {self.latency.summary()}")
+
+
+def _register(writer):
+    global _flusher
+    with _writers_lock:
+        _writers.append(writer)
+        if _flusher is None:
+            _flusher = threading.Thread(target=_flush_loop, name='buffered-writer-flush', daemon=True)
+            _flusher.start()
+
+
+def _flush_loop():
+    while True:
+        forced = _flush_requested.wait(CHECK_INTERVAL)
+        _flush_requested.clear()
+        with _writers_lock:
+            writers = list(_writers)
+        for writer in writers:
+            if writer.fd is None:
+                continue
+            try:
+                if forced or writer.due():
+                    writer.flush()
+            except OSError as e:
+                print(f"Error flushing {writer.path}: {e}")
+
+
+def request_flush():
+    """Ask the flusher thread to write every buffer now, safe in signal handlers"""
+    _flush_requested.set()
+
+
+def flush_all():
+    with _writers_lock:
+        writers = list(_writers)
+    for writer in writers:
+        writer.flush()
+
+
+def report():
+    """Metrics of every writer opened by this process"""
+    with _writers_lock:
+        return '\n'.join(writer.report() for writer in _writers)
+
+
+def install_signal_handlers(terminate=True):
+    """SIGUSR1 flushes every buffer; SIGTERM exits through finally blocks
+
+    A SIGUSR1 handler installed before (wspolne.profilowanie) still runs.
+    """
+    previous = signal.getsignal(signal.SIGUSR1)
+
+    def flush(signum, frame):
+        request_flush()
+        if callable(previous):
+            previous(signum, frame)
+    signal.signal(signal.SIGUSR1, flush)
+    if terminate:
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+
+atexit.register(flush_all)